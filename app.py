@@ -1,17 +1,36 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
-from linebot.models import MessageEvent, TextMessage, TextSendMessage
+from fastapi.responses import PlainTextResponse
 import os
 import json
 import logging
 from datetime import datetime, timedelta
 import asyncio
 from typing import Dict, Optional
-import openai
-from supabase import create_client, Client
 from dotenv import load_dotenv
+from app.services.client_service import clients, startup_profile
+from app.services.event_queue_service import EventQueue
+from app.services.dedup_service import NEW, EventDeduplicator
+from app.services.relevance_service import RelevanceFilter
+from app.services.cache_service import response_cache
+from app.services.context_service import ContextStore, without_history
+from app.services.database_service import (
+    message_writer, get_user_tasks, iter_tasks, get_cache_stats, task_stat_pages,
+    get_due_tasks, claim_task_reminders, save_tasks, task_search_pages,
+    get_user_settings as fetch_user_settings
+)
+from app.services.db_client_service import bind_loop, close_client, get_query_stats
+from app.services.task_stats_service import task_aggregates
+from app.services.search_service import task_search
+from app.services.push_service import get_fanout
+from app.services.reminder_service import reminder_scheduler
+from app.services.scheduler_service import CronTrigger, scheduler, setup_scheduler
+from app.services.openai_service import summarizer, analyze_messages
+from app.services.task_batch_service import ExtractionBatcher, trivial_prefilter
+from app.services.stream_service import StreamingReply
+from app.services.llm_service import llm_client
+from app.services.router_service import Intent, Router
+from app.services.metrics_service import metrics
 
 # 載入環境變數
 load_dotenv()
@@ -32,21 +51,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 初始化 LINE Bot
-line_bot_api = LineBotApi(os.getenv("LINE_CHANNEL_ACCESS_TOKEN"))
-handler = WebhookHandler(os.getenv("LINE_CHANNEL_SECRET"))
+# 初始化 LINE Bot：SDK 在第一次使用（或暖機）時才匯入並建立客戶端
+line_bot_api = clients.proxy("line_bot_api")
+handler = clients.proxy("webhook_handler")
 
-# 初始化 OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# 啟動時在背景預先匯入 SDK 並建立客戶端
+CLIENT_WARMUP = os.getenv("CLIENT_WARMUP", "true").lower() == "true"
 
-# 初始化 Supabase
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
-)
+# 用戶上下文儲存
+context_store = ContextStore()
+
+# Webhook 事件去重（LINE 重送時以 webhookEventId 判斷）
+event_dedup = EventDeduplicator()
+
+# 本地相關性預先過濾
+relevance_filter = RelevanceFilter()
+
+# 群組訊息的任務提取：依群組緩衝後批次分析，只略過空白或極短的訊息
+extraction_batcher = ExtractionBatcher(analyze_messages, save_tasks, prefilter=trivial_prefilter)
 
-# 用戶上下文快取
-user_contexts: Dict[str, Dict] = {}
+# LLM 呼叫時限與降級回覆
+RELEVANCE_DEADLINE = float(os.getenv("LLM_RELEVANCE_DEADLINE", "5"))
+BUSY_REPLY = "抱歉，目前服務繁忙，請稍後再試。"
+
+# 串流回覆：第一段以 reply 送出，其餘以 push 送出
+STREAMING_ENABLED = os.getenv("LLM_STREAMING_ENABLED", "true").lower() == "true"
+streaming_reply = StreamingReply(line_bot_api)
 
 # 系統提示詞
 SYSTEM_PROMPT = """你是一個專案管理助手，負責：
@@ -82,62 +112,104 @@ RELEVANCE_PROMPT = """請判斷以下訊息是否與專案管理、任務追蹤
 - 與專案無關的詢問
 - 其他非工作相關話題"""
 
+@metrics.stage("get_user_settings")
 async def get_user_settings(user_id: str) -> dict:
     """獲取用戶設定"""
     try:
-        response = await supabase.table("settings").select("*").eq("user_id", user_id).execute()
-        if response.data:
-            return response.data[0]
-        return {"notification_enabled": True, "language": "zh-TW"}
+        return await fetch_user_settings(user_id)
     except Exception as e:
         logger.error(f"Error getting user settings: {e}")
         return {"notification_enabled": True, "language": "zh-TW"}
 
+@metrics.stage("is_relevant_message")
 async def is_relevant_message(message: str) -> bool:
     """判斷訊息是否與專案管理相關"""
+    # 本地能明確判定時不呼叫 LLM
+    decision = relevance_filter.classify(message)
+    if decision is not None:
+        return decision
+    
     try:
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4-turbo-preview",
-            messages=[
+        # 短回答可開啟 hedging；失敗或斷路時預設為相關，避免遺漏重要訊息
+        response = await llm_client.complete(
+            [
                 {"role": "system", "content": RELEVANCE_PROMPT},
                 {"role": "user", "content": message}
             ],
+            purpose="relevance",
+            deadline=RELEVANCE_DEADLINE,
+            hedge=True,
+            fallback="yes",
+            model="gpt-4-turbo-preview",
             temperature=0.3,
             max_tokens=10
         )
         
-        result = response.choices[0].message.content.strip().lower()
+        result = response.text.strip().lower()
         return result == 'yes'
     except Exception as e:
         logger.error(f"Error checking message relevance: {e}")
         return True  # 發生錯誤時預設為相關，避免遺漏重要訊息
 
+async def show_commands(user_id: str) -> dict:
+    """列出可用指令"""
+    return {"type": "success", "content": "📋 可用指令：\n/tasks - 查看任務列表\n/report - 生成週報\n/settings - 查看設定\n/status - 查看專案狀態"}
+
+async def list_tasks(user_id: str) -> dict:
+    """列出任務"""
+    tasks = await get_user_tasks(columns="id,title,description,status,created_at", limit=20)
+    if not tasks:
+        return {"type": "success", "content": "目前沒有任務。"}
+    lines = [f"- {task.get('title') or task.get('description')}（{task.get('status')}）" for task in tasks]
+    return {"type": "success", "content": "📋 任務列表\n\n" + "\n".join(lines)}
+
+async def broadcast_weekly_report(user_id: str) -> dict:
+    """生成並廣播週報"""
+    await generate_weekly_report()
+    return {"type": "success", "content": "已發送本週專案進度報告。"}
+
+async def show_settings(user_id: str) -> dict:
+    """顯示用戶設定"""
+    settings = await get_user_settings(user_id)
+    lines = [f"{key}：{value}" for key, value in settings.items()]
+    return {"type": "success", "content": "⚙️ 目前設定\n\n" + "\n".join(lines)}
+
+@metrics.stage("handle_command")
 async def handle_command(message: str, user_id: str) -> Optional[dict]:
     """處理指令"""
-    commands = {
-        '/help': lambda: {"type": "success", "content": "📋 可用指令：\n/tasks - 查看任務列表\n/report - 生成週報\n/settings - 查看設定\n/status - 查看專案狀態"},
-        '/tasks': lambda: get_user_tasks(),
-        '/report': lambda: generate_weekly_report(),
-        '/settings': lambda: get_user_settings(user_id),
-        '/status': lambda: get_project_status()
-    }
-    
-    if message in commands:
-        try:
-            return await commands[message]()
-        except Exception as e:
-            logger.error(f"Error handling command {message}: {e}")
-            return {"type": "error", "content": f"執行指令 {message} 時發生錯誤"}
-    
-    return None
+    match = command_router.match(message)
+    if match is None:
+        return None
+    try:
+        return await match.intent.handler(user_id)
+    except Exception as e:
+        logger.error(f"Error handling command {match.intent.name}: {e}")
+        return {"type": "error", "content": f"執行指令 {message} 時發生錯誤"}
+
+async def count_task_status(created_after: Optional[str] = None) -> Dict[str, int]:
+    """逐頁讀取任務狀態並計數，記憶體用量與任務總數無關"""
+    counts: Dict[str, int] = {}
+    async for page in iter_tasks(created_after=created_after, columns="id,status,created_at"):
+        for task in page:
+            counts[task["status"]] = counts.get(task["status"], 0) + 1
+    return counts
 
 async def get_project_status() -> dict:
     """獲取專案狀態"""
     try:
-        tasks = await get_user_tasks()
-        total = len(tasks)
-        completed = sum(1 for task in tasks if task['status'] == 'completed')
-        pending = sum(1 for task in tasks if task['status'] == 'pending')
+        if task_aggregates.loaded:
+            # 直接讀取增量聚合，不掃描任務表。聚合只即時反映本 worker 的寫入，
+            # 其他 worker 建立或更新的任務要到下次每小時校正才計入，最多落後約一小時
+            counts = task_aggregates.status_counts()
+            total = sum(counts.values())
+            completed = counts.get('completed', 0)
+            pending = counts.get('pending', 0)
+        else:
+            # 聚合尚未載入時逐頁計數，只讀取狀態欄位
+            counts = await count_task_status()
+            total = sum(counts.values())
+            completed = counts.get('completed', 0)
+            pending = counts.get('pending', 0)
         
         return {
             "type": "success",
@@ -147,8 +219,18 @@ async def get_project_status() -> dict:
         logger.error(f"Error getting project status: {e}")
         return {"type": "error", "content": "獲取專案狀態時發生錯誤"}
 
-async def analyze_message(message: str, user_id: str, context: Optional[Dict] = None) -> dict:
-    """分析用戶訊息"""
+# 斜線指令註冊表：新增指令時只需在此加入一筆
+command_router = Router([
+    Intent('help', ['/help'], show_commands, command=True),
+    Intent('tasks', ['/tasks'], list_tasks, command=True),
+    Intent('report', ['/report'], broadcast_weekly_report, command=True),
+    Intent('settings', ['/settings'], show_settings, command=True),
+    Intent('status', ['/status'], lambda user_id: get_project_status(), command=True)
+])
+
+@metrics.stage("analyze_message")
+async def analyze_message(message: str, user_id: str, context: Optional[Dict] = None, stream: bool = False) -> dict:
+    """分析用戶訊息，stream 為 True 時回傳逐段產生的回覆"""
     try:
         # 檢查是否為指令
         command_result = await handle_command(message, user_id)
@@ -163,162 +245,324 @@ async def analyze_message(message: str, user_id: str, context: Optional[Dict] =
                 "content": "抱歉，我主要負責專案管理相關事務。如果您有任務管理、進度追蹤等需求，我很樂意為您服務。"
             }
         
-        # 獲取用戶設定
-        settings = await get_user_settings(user_id)
-        
         # 準備上下文
         if context is None:
             context = {}
         
-        # 調用 OpenAI API
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4-turbo-preview",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": message}
-            ],
-            temperature=0.7
-        )
+        # 相同或近似的問題直接使用快取
+        cache_params = {"model": "gpt-4-turbo-preview", "temperature": 0.7, "system": SYSTEM_PROMPT}
+        with metrics.stage("response_cache").span():
+            cached = response_cache.get(message, cache_params)
+        if cached:
+            return {"type": "success", "content": cached}
+        
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": message}
+        ]
         
-        result = response.choices[0].message.content
+        if stream:
+            async def cached_stream():
+                parts = []
+                try:
+                    async for delta in llm_client.stream(messages, purpose="chat", model="gpt-4-turbo-preview", temperature=0.7):
+                        parts.append(delta)
+                        yield delta
+                except Exception as e:
+                    if parts:
+                        raise
+                    # 上游異常、連線錯誤或斷路時回覆預設內容，不寫入快取
+                    logger.error(f"Error streaming chat response: {e!r}")
+                    yield BUSY_REPLY
+                    return
+                if parts:
+                    response_cache.set(message, cache_params, "".join(parts))
+            return {"type": "stream", "stream": cached_stream()}
+        
+        # 調用 LLM
+        with metrics.stage("chat_completion").span():
+            response = await llm_client.complete(
+                messages,
+                purpose="chat",
+                fallback=BUSY_REPLY,
+                model="gpt-4-turbo-preview",
+                temperature=0.7
+            )
+        result = response.text
         
         if not result:
             return {"type": "error", "content": "抱歉，我無法理解，請再試一次。"}
         
+        if not response.degraded:
+            response_cache.set(message, cache_params, result)
         return {"type": "success", "content": result}
     except Exception as e:
         logger.error(f"Error analyzing message: {e}")
         return {"type": "error", "content": "抱歉，發生錯誤，請稍後再試。"}
 
+@metrics.stage("log_message")
 async def log_message(user_id: str, message: str, response: str, status: str = "processed", context: Optional[Dict] = None):
-    """記錄訊息"""
+    """記錄訊息（放入緩衝，由背景批次寫入）"""
     try:
-        await supabase.table("messages").insert({
+        message_writer.add("messages", {
             "user_id": user_id,
             "message": message,
             "response": response,
             "timestamp": datetime.now().isoformat(),
             "status": status,
             "context": context or {}
-        }).execute()
+        })
     except Exception as e:
         logger.error(f"Error logging message: {e}")
 
-async def check_tasks_due():
-    """檢查即將到期的任務"""
-    try:
-        # 獲取所有未完成的任務
-        response = await supabase.table("tasks").select("*").eq("status", "pending").execute()
-        tasks = response.data
-        
-        for task in tasks:
-            if task.get("due_date"):
-                due_date = datetime.fromisoformat(task["due_date"])
-                if due_date - datetime.now() < timedelta(days=1):
-                    # 發送提醒
-                    await line_bot_api.push_message(
-                        task["assigned_to"],
-                        TextSendMessage(text=f"提醒：任務「{task['title']}」即將在24小時內到期！")
-                    )
-    except Exception as e:
-        logger.error(f"Error checking tasks due: {e}")
-
 async def generate_weekly_report():
     """生成週報"""
     try:
         # 獲取過去一週的任務
-        last_week = datetime.now() - timedelta(days=7)
-        response = await supabase.table("tasks").select("*").gte("created_at", last_week.isoformat()).execute()
-        tasks = response.data
+        if task_aggregates.loaded:
+            # 與 /status 相同，其他 worker 的寫入最多落後約一小時（下次校正前）
+            counts = task_aggregates.created_since(days=7)
+            total = sum(counts.values())
+            completed = counts.get("completed", 0)
+        else:
+            counts = await count_task_status(created_after=(datetime.now() - timedelta(days=7)).isoformat())
+            total = sum(counts.values())
+            completed = counts.get("completed", 0)
         
         # 生成週報
         report = "📊 本週專案進度報告\n\n"
-        report += f"總任務數：{len(tasks)}\n"
-        completed = sum(1 for task in tasks if task["status"] == "completed")
+        report += f"總任務數：{total}\n"
         report += f"已完成：{completed}\n"
-        report += f"進行中：{len(tasks) - completed}\n\n"
+        report += f"進行中：{total - completed}\n\n"
         
         # 發送週報
-        await line_bot_api.broadcast(TextSendMessage(text=report))
+        from linebot.models import TextSendMessage
+        await asyncio.to_thread(line_bot_api.broadcast, TextSendMessage(text=report))
     except Exception as e:
         logger.error(f"Error generating weekly report: {e}")
 
 @app.post("/webhook")
 async def line_webhook(request: Request):
-    """處理 LINE Webhook"""
+    """處理 LINE Webhook：驗證簽名後放入事件佇列，立即回應"""
+    startup_profile.mark("first_request")
+    from linebot.exceptions import InvalidSignatureError
     try:
         signature = request.headers["X-Line-Signature"]
         body = await request.body()
         
         try:
-            handler.handle(body.decode(), signature)
+            events = handler.parser.parse(body.decode(), signature)
         except InvalidSignatureError:
             raise HTTPException(status_code=400, detail="Invalid signature")
         
+        # 佇列容量不足時整批拒絕，交由 LINE 重送
+        if not event_queue.has_capacity(len(events)):
+            logger.warning(f"Event queue full, rejecting {len(events)} events")
+            raise HTTPException(status_code=503, detail="Event queue full")
+        
+        # 同一用戶或群組的事件依序處理，不同對話並行
+        rejected = 0
+        for event in events:
+            # 已處理過或正在處理的重送不再放入佇列
+            if event_dedup.claim(event) != NEW:
+                continue
+            if not event_queue.put_nowait(event):
+                event_dedup.release(event)
+                rejected += 1
+        
+        # 單一對話的佇列已滿時要求 LINE 重送；已接受的事件會被去重略過
+        if rejected:
+            logger.warning(f"Rejected {rejected} of {len(events)} events: conversation queue full")
+            raise HTTPException(status_code=503, detail="Conversation queue full")
+        
+        startup_profile.mark("first_request_served")
         return {"status": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in webhook: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@handler.add(MessageEvent, message=TextMessage)
+@app.get("/stats")
+async def get_stats():
+    """查看事件佇列等執行狀態"""
+    return {
+        "stages": metrics.snapshot(),
+        "startup": startup_profile.report(),
+        "event_queue": event_queue.stats(),
+        "webhook_dedup": event_dedup.stats(),
+        "relevance_filter": relevance_filter.stats(),
+        "response_cache": response_cache.stats(),
+        "context_store": context_store.stats(),
+        "message_writer": message_writer.stats(),
+        "db_queries": get_query_stats(),
+        "user_cache": get_cache_stats(),
+        "task_aggregates": task_aggregates.stats(),
+        "task_search": task_search.stats(),
+        "push_fanout": get_fanout(line_bot_api).stats(),
+        "reminders": reminder_scheduler.stats(),
+        "scheduler": scheduler.stats(),
+        "summaries": summarizer.stats(),
+        "streaming": streaming_reply.stats(),
+        "llm": llm_client.stats(),
+        "commands": command_router.stats(),
+        "task_extraction": extraction_batcher.stats()
+    }
+
+@app.get("/warmup")
+async def warmup():
+    """預先匯入 SDK 並建立客戶端（可由部署平台在冷啟動後呼叫），回傳啟動時間紀錄"""
+    timings = await clients.warm_up()
+    return {"warmup_seconds": timings, **startup_profile.report()}
+
+@app.get("/metrics")
+async def get_metrics():
+    """以 Prometheus 文字格式輸出處理階段、資料庫、LLM 與排程指標"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@metrics.stage("reply_message")
+async def reply_text(reply_token: str, text: str):
+    """在執行緒中回覆文字訊息，避免阻塞事件迴圈"""
+    from linebot.models import TextSendMessage
+    await asyncio.to_thread(
+        line_bot_api.reply_message,
+        reply_token,
+        TextSendMessage(text=text)
+    )
+
+async def dispatch_event(event):
+    """將事件分派給對應的處理函式，完成後記錄事件已處理"""
+    from linebot.models import MessageEvent, TextMessage
+    try:
+        if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+            await handle_message(event)
+    except Exception:
+        event_dedup.release(event)
+        raise
+    event_dedup.complete(event)
+
+@metrics.stage("handle_message")
 async def handle_message(event):
     """處理文字訊息"""
     try:
         user_id = event.source.user_id
         message = event.message.text
         
+        # 群組與聊天室的訊息交由批次提取任務
+        group_id = getattr(event.source, "group_id", None) or getattr(event.source, "room_id", None)
+        if group_id:
+            extraction_batcher.add(group_id, event.message.id, message, user_id)
+        
         # 獲取用戶上下文
-        context = user_contexts.get(user_id, {})
+        context = await context_store.get(user_id)
         
         # 分析訊息
-        result = await analyze_message(message, user_id, context)
-        
-        # 更新上下文
-        user_contexts[user_id] = {
-            "last_message": message,
-            "last_response": result["content"],
-            "timestamp": datetime.now().isoformat()
-        }
+        result = await analyze_message(message, user_id, context, stream=STREAMING_ENABLED)
         
-        # 記錄訊息
-        await log_message(user_id, message, result["content"], "processed", context)
+        if result["type"] == "stream":
+            # 邊生成邊回覆，群組與聊天室的後續內容推播到原對話
+            target = getattr(event.source, "group_id", None) or getattr(event.source, "room_id", None) or user_id
+            with metrics.stage("stream_reply").span():
+                content = await streaming_reply.deliver(event.reply_token, target, result["stream"])
+            if not content:
+                content = "抱歉，我無法理解，請再試一次。"
+                await reply_text(event.reply_token, content)
+            await context_store.append_turn(user_id, message, content)
+        else:
+            content = result["content"]
+            
+            # 更新上下文
+            await context_store.append_turn(user_id, message, content)
+            
+            # 回覆訊息
+            await reply_text(event.reply_token, content)
         
-        # 回覆訊息
-        await line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text=result["content"])
-        )
+        # 記錄訊息，只附上上一段對話，不把完整歷史寫進每一筆紀錄
+        await log_message(user_id, message, content, "processed", without_history(context))
     except Exception as e:
         logger.error(f"Error handling message: {e}")
-        await line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text="抱歉，發生錯誤，請稍後再試。")
-        )
+        await reply_text(event.reply_token, "抱歉，發生錯誤，請稍後再試。")
+
+# Webhook 事件佇列
+event_queue = EventQueue(dispatch_event)
+metrics.register(event_queue.collect)
+metrics.register(event_dedup.collect)
+
+# 背景暖機的工作，保留參照避免被回收
+warmup_task: Optional[asyncio.Task] = None
 
 # 定時任務
 @app.on_event("startup")
 async def startup_event():
-    """啟動定時任務"""
-    asyncio.create_task(run_scheduled_tasks())
+    """啟動事件佇列與定時任務"""
+    global warmup_task
+    bind_loop(asyncio.get_running_loop())
+    await event_queue.start()
+    await message_writer.start()
+    await start_reminders()
+    await start_scheduler()
+    if CLIENT_WARMUP:
+        warmup_task = asyncio.create_task(clients.warm_up())
+    startup_profile.mark("startup_complete")
 
-async def run_scheduled_tasks():
-    """執行定時任務"""
-    while True:
-        try:
-            # 檢查任務到期
-            await check_tasks_due()
-            
-            # 每週一早上9點生成週報
-            now = datetime.now()
-            if now.weekday() == 0 and now.hour == 9:
-                await generate_weekly_report()
-            
-            # 每小時執行一次
-            await asyncio.sleep(3600)
-        except Exception as e:
-            logger.error(f"Error in scheduled tasks: {e}")
-            await asyncio.sleep(60)  # 發生錯誤時等待1分鐘後重試
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+@app.on_event("shutdown")
+async def shutdown_event():
+    """關閉前處理完佇列中的事件並寫出訊息紀錄"""
+    await event_queue.drain()
+    await extraction_batcher.close()
+    await scheduler.stop()
+    await reminder_scheduler.stop()
+    await message_writer.close()
+    await close_client()
+
+async def start_reminders():
+    """載入即將到期的任務並啟動到期提醒"""
+    async def send(reminders):
+        # 同一人的多則提醒合併發送
+        await get_fanout(line_bot_api).deliver(reminders)
+
+    try:
+        await reminder_scheduler.start(get_due_tasks, claim_task_reminders, send)
+    except Exception as e:
+        logger.error(f"Error starting reminder scheduler: {e}")
+
+async def reconcile_task_aggregates():
+    """以完整任務資料重新校正狀態聚合"""
+    try:
+        await task_aggregates.reconcile(task_stat_pages)
+    except Exception as e:
+        logger.error(f"Error reconciling task aggregates: {e}")
+
+async def rebuild_task_search():
+    """以完整任務資料重建全文索引"""
+    try:
+        await task_search.rebuild(task_search_pages)
+    except Exception as e:
+        logger.error(f"Error rebuilding task search index: {e}")
+
+async def start_scheduler():
+    """註冊定時任務並啟動排程引擎"""
+    # 每個 worker 各自維護聚合與索引，因此每個 worker 都要校正；
+    # 各 worker 在整點後隨機延後固定秒數，N 個 worker 的全表掃描分散在一小時內
+    jitter = float(os.getenv("TASK_REFRESH_JITTER", "1800"))
+    scheduler.add_job(
+        "reconcile_task_aggregates", reconcile_task_aggregates,
+        CronTrigger(minute="0"), leader_only=False, jitter=jitter
+    )
+    scheduler.add_job(
+        "rebuild_task_search", rebuild_task_search,
+        CronTrigger(minute="30"), leader_only=False, jitter=jitter
+    )
+    # 每週一早上9點生成週報
+    scheduler.add_job(
+        "project_weekly_report", generate_weekly_report,
+        CronTrigger(minute="0", hour="9", day_of_week="mon")
+    )
+    setup_scheduler(line_bot_api)
+    await scheduler.start()
+    # 啟動時先校正並建立索引一次
+    asyncio.create_task(reconcile_task_aggregates())
+    asyncio.create_task(rebuild_task_search())
+
+# app 模組載入完成（冷啟動的匯入階段結束）
+startup_profile.mark("app_imported")
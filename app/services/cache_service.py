@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+# 正規化時移除的標點與空白
+_STRIP_PATTERN = re.compile(r'[\s\W_]+', re.UNICODE)
+
+# SimHash 切成 8 段，漢明距離 <= 7 時至少有一段完全相同
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 8
+_BAND_WIDTH = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_WIDTH) - 1
+
+# 每筆快取的固定開銷估計（位元組）
+ENTRY_OVERHEAD = 200
+
+def normalize_prompt(text: str) -> str:
+    """全半形統一、轉小寫並移除標點與空白"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    return _STRIP_PATTERN.sub('', text)
+
+def simhash(text: str) -> int:
+    """以字元 unigram 與 bigram 計算 64 位元 SimHash"""
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    vector = [0] * SIMHASH_BITS
+    for gram in grams:
+        h = int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            vector[bit] += 1 if h >> bit & 1 else -1
+    fingerprint = 0
+    for bit, weight in enumerate(vector):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def _bands(fingerprint: int):
+    return [(i, fingerprint >> (i * _BAND_WIDTH) & _BAND_MASK) for i in range(SIMHASH_BANDS)]
+
+class CacheEntry:
+    """
+    單筆快取資料
+    """
+    __slots__ = ('value', 'expires_at', 'size', 'fingerprint', 'params_key')
+
+    def __init__(self, value: str, expires_at: float, size: int, fingerprint: Optional[int], params_key: str):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.fingerprint = fingerprint
+        self.params_key = params_key
+
+class ResponseCache:
+    """
+    LLM 回應快取，以正規化後的提示詞與模型參數為鍵
+
+    支援 TTL、LRU 淘汰、記憶體上限，以及以 SimHash 尋找近似重複的提示詞。
+    近似比對預設關閉：一兩個字的差異（例如加上「不」）就可能讓意思相反，
+    啟用時也只比對正規化後至少 min_length 個字的提示詞，較短的只接受完全相同。
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_distance: Optional[int] = None,
+        min_length: Optional[int] = None
+    ):
+        self.ttl = ttl if ttl is not None else float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+        self.max_entries = max_entries or int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2048'))
+        self.max_bytes = max_bytes or int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+        self.max_distance = max_distance if max_distance is not None else \
+            int(os.getenv('RESPONSE_CACHE_SIMHASH_DISTANCE', '0'))
+        self.min_length = min_length if min_length is not None else \
+            int(os.getenv('RESPONSE_CACHE_SIMHASH_MIN_LENGTH', '40'))
+        self.enabled = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._bands: Dict[Tuple[str, int, int], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+        # 統計
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _fuzzy(self, normalized: str, near_duplicate: bool) -> bool:
+        """是否對這個提示詞做近似比對"""
+        return near_duplicate and self.max_distance > 0 and len(normalized) >= self.min_length
+
+    @staticmethod
+    def _params_key(params: Dict[str, Any]) -> str:
+        return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    @staticmethod
+    def _key(normalized: str, params_key: str) -> str:
+        return hashlib.sha1(f"{params_key}\0{normalized}".encode()).hexdigest()
+
+    def get(self, prompt: str, params: Dict[str, Any], near_duplicate: bool = True) -> Optional[str]:
+        """
+        查詢快取，找不到完全相同的鍵時可再以 SimHash 查近似提示詞
+        """
+        if not self.enabled:
+            return None
+        normalized = normalize_prompt(prompt)
+        params_key = self._params_key(params)
+        key = self._key(normalized, params_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is not None:
+                self.hits += 1
+                return entry.value
+            if self._fuzzy(normalized, near_duplicate):
+                fingerprint = simhash(normalized)
+                for band in _bands(fingerprint):
+                    for candidate in list(self._bands.get((params_key,) + band, ())):
+                        entry = self._lookup(candidate, now)
+                        if entry is not None and \
+                                bin(entry.fingerprint ^ fingerprint).count('1') <= self.max_distance:
+                            self.near_hits += 1
+                            return entry.value
+            self.misses += 1
+            return None
+
+    def set(self, prompt: str, params: Dict[str, Any], value: str, near_duplicate: bool = True) -> None:
+        """寫入快取，必要時依 LRU 淘汰舊資料"""
+        if not self.enabled or not value:
+            return
+        normalized = normalize_prompt(prompt)
+        params_key = self._params_key(params)
+        key = self._key(normalized, params_key)
+        fingerprint = simhash(normalized) if self._fuzzy(normalized, near_duplicate) else None
+        size = len(value.encode()) + len(normalized.encode()) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(value, time.monotonic() + self.ttl, size, fingerprint, params_key)
+            self.bytes += size
+            if fingerprint is not None:
+                for band in _bands(fingerprint):
+                    self._bands.setdefault((params_key,) + band, set()).add(key)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清空快取"""
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+            self.bytes = 0
+
+    def _lookup(self, key: str, now: float) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        if entry.fingerprint is not None:
+            for band in _bands(entry.fingerprint):
+                band_key = (entry.params_key,) + band
+                keys = self._bands.get(band_key)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._bands[band_key]
+
+    def stats(self) -> dict:
+        """輸出命中率與淘汰統計"""
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+# 全域共用的 LLM 回應快取
+response_cache = ResponseCache()
+
+class _Load:
+    """進行中的一次載入；invalidated 為 True 表示載入期間該鍵已被失效"""
+    __slots__ = ('future', 'invalidated')
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.invalidated = False
+
+class ReadThroughCache:
+    """
+    非同步讀穿快取，用於很少變動的資料列
+
+    同一個鍵同時只會有一次載入（single-flight），其他請求等待同一結果；
+    載入結果為 None 時以較短的 TTL 做負向快取。載入期間鍵被失效時，結果
+    不寫入快取，等待中的請求也會重新載入，不會拿到失效前的資料。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        negative_ttl: float,
+        max_entries: int = 10000
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, float]]' = OrderedDict()
+        self._inflight: Dict[Hashable, _Load] = {}
+
+        # 統計
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.reloads = 0
+
+    async def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """
+        讀取快取，過期或不存在時呼叫 loader 載入
+        """
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    if value is None:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return value
+                del self._entries[key]
+
+            load = self._inflight.get(key)
+            if load is None:
+                break
+            self.coalesced += 1
+            value = await asyncio.shield(load.future)
+            if not load.invalidated:
+                return value
+            # 等待期間鍵被失效，重新載入
+            self.reloads += 1
+
+        self.misses += 1
+        load = _Load(asyncio.get_running_loop().create_future())
+        self._inflight[key] = load
+        try:
+            value = await loader()
+        except BaseException as e:
+            load.future.set_exception(e)
+            # 沒有其他等待者時避免 "exception was never retrieved" 警告
+            load.future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is load:
+                del self._inflight[key]
+        # 載入期間被失效的結果不寫入快取
+        if not load.invalidated:
+            self.set(key, value, ttl)
+        load.future.set_result(value)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """寫入快取"""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """使指定鍵失效，資料變更後呼叫"""
+        self._entries.pop(key, None)
+        # 之後的請求不再併入失效前開始的載入
+        load = self._inflight.pop(key, None)
+        if load is not None:
+            load.invalidated = True
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        """輸出命中與合併請求統計"""
+        lookups = self.hits + self.negative_hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'invalidations': self.invalidations,
+            'reloads': self.reloads,
+            'hit_ratio': (self.hits + self.negative_hits + self.coalesced) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,192 @@
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 本模組第一次載入的時間，作為冷啟動各階段的起點
+_ORIGIN = time.perf_counter()
+
+class _Entry:
+    __slots__ = ('name', 'factory', 'imports', 'cache', 'instance', 'created', 'seconds', 'import_seconds', 'error')
+
+    def __init__(self, name: str, factory: Callable[[], Any], imports: Sequence[str], cache: bool):
+        self.name = name
+        self.factory = factory
+        self.imports = tuple(imports)
+        self.cache = cache
+        self.instance: Any = None
+        self.created = False
+        self.seconds = 0.0
+        self.import_seconds = 0.0
+        self.error: Optional[str] = None
+
+class ClientRegistry:
+    """
+    外部服務客戶端的登錄表：模組載入時只登錄建立函式，第一次取用時才匯入
+    SDK 並建立客戶端，之後所有模組共用同一個實例
+
+    cache 為 False 的項目（例如綁定事件迴圈的資料庫客戶端）由建立函式自行快取，
+    登錄表只負責預先匯入與暖機。
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        imports: Sequence[str] = (),
+        cache: bool = True
+    ) -> None:
+        """登錄客戶端的建立函式與其需要的重量級模組"""
+        with self._lock:
+            self._entries[name] = _Entry(name, factory, imports, cache)
+
+    def _import(self, entry: _Entry) -> None:
+        if entry.import_seconds or not entry.imports:
+            return
+        started = time.perf_counter()
+        for module in entry.imports:
+            importlib.import_module(module)
+        entry.import_seconds = time.perf_counter() - started
+
+    def get(self, name: str) -> Any:
+        """取得客戶端，第一次呼叫時建立"""
+        entry = self._entries[name]
+        if entry.created and entry.cache:
+            return entry.instance
+        with self._lock:
+            if entry.created and entry.cache:
+                return entry.instance
+            self._import(entry)
+            started = time.perf_counter()
+            try:
+                instance = entry.factory()
+            except Exception as e:
+                entry.error = str(e)
+                raise
+            if not entry.created:
+                entry.seconds = time.perf_counter() - started
+                entry.created = True
+                logger.info(f"Initialized client {name} in {entry.seconds * 1000:.1f} ms")
+            if entry.cache:
+                entry.instance = instance
+            return instance
+
+    def override(self, name: str, instance: Optional[Any]) -> None:
+        """替換客戶端（基準測試與本機替身使用），傳入 None 還原為延遲建立"""
+        entry = self._entries[name]
+        with self._lock:
+            entry.instance = instance
+            entry.created = instance is not None
+
+    def loaded(self, name: str) -> bool:
+        return self._entries[name].created
+
+    def proxy(self, name: str) -> 'ClientProxy':
+        """回傳可在模組層級使用的代理物件，屬性存取時才建立客戶端"""
+        return ClientProxy(self, name)
+
+    async def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """
+        預先匯入 SDK 並建立客戶端，讓第一個請求不必等待
+
+        匯入與建立在執行緒中進行，避免阻塞事件迴圈；cache 為 False 的項目
+        需要在事件迴圈上建立，只在執行緒中預先匯入。
+        """
+        timings: Dict[str, float] = {}
+        for name in list(names or self._entries):
+            entry = self._entries[name]
+            started = time.perf_counter()
+            try:
+                if entry.cache:
+                    await asyncio.to_thread(self.get, name)
+                else:
+                    await asyncio.to_thread(self._import, entry)
+                    self.get(name)
+            except Exception as e:
+                entry.error = str(e)
+                logger.error(f"Error warming up client {name}: {e}")
+            timings[name] = time.perf_counter() - started
+        startup_profile.mark('warmed_up')
+        return timings
+
+    def stats(self) -> dict:
+        """輸出各客戶端是否已建立與匯入、建立耗時"""
+        return {
+            name: {
+                'loaded': entry.created,
+                'import_seconds': entry.import_seconds,
+                'init_seconds': entry.seconds,
+                'error': entry.error
+            }
+            for name, entry in self._entries.items()
+        }
+
+class ClientProxy:
+    """
+    延遲建立客戶端的代理，屬性存取轉給實際的客戶端
+    """
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry: ClientRegistry, name: str):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._registry.get(self._name), attribute)
+
+    def __repr__(self) -> str:
+        return f"ClientProxy({self._name!r})"
+
+class StartupProfile:
+    """
+    記錄冷啟動各階段距離本模組載入的時間：app 匯入完成、startup 完成、
+    暖機完成與第一個請求
+    """
+
+    def __init__(self):
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str) -> None:
+        """只記錄第一次"""
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - _ORIGIN
+
+    def report(self) -> dict:
+        return {
+            'marks': dict(self.marks),
+            'clients': clients.stats()
+        }
+
+# 全域共用的客戶端登錄表與啟動時間紀錄
+clients = ClientRegistry()
+startup_profile = StartupProfile()
+
+def _line_bot_api() -> Any:
+    from linebot import LineBotApi
+    return LineBotApi(os.getenv('LINE_CHANNEL_ACCESS_TOKEN'))
+
+def _webhook_handler() -> Any:
+    from linebot import WebhookHandler
+    return WebhookHandler(os.getenv('LINE_CHANNEL_SECRET'))
+
+def _tiktoken_encoding() -> Any:
+    # 未安裝 tiktoken 或無法取得編碼檔時回傳 None，改用字元估算
+    try:
+        import tiktoken
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        return None
+
+clients.register('line_bot_api', _line_bot_api, imports=('linebot', 'linebot.models'))
+clients.register('webhook_handler', _webhook_handler, imports=('linebot',))
+clients.register('tiktoken', _tiktoken_encoding)
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.services.sqlite_service import SQLiteFile
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 每段對話與每位用戶的固定開銷估計（位元組）
+TURN_OVERHEAD = 120
+ENTRY_OVERHEAD = 300
+
+# 單段對話：(訊息, 回覆, ISO 時間)
+Turn = Tuple[str, str, str]
+
+def _turn_size(turn: Turn) -> int:
+    return sum(len(part.encode()) for part in turn) + TURN_OVERHEAD
+
+class ContextEntry:
+    """
+    單一用戶的對話上下文，保留最近 N 段對話
+    """
+    __slots__ = ('user_id', 'turns', 'last_access', 'size')
+
+    def __init__(self, user_id: str, max_turns: int, turns: Optional[List[Turn]] = None):
+        self.user_id = user_id
+        self.turns: Deque[Turn] = deque(turns or (), maxlen=max_turns)
+        self.last_access = time.time()
+        self.size = ENTRY_OVERHEAD + sum(_turn_size(t) for t in self.turns)
+
+    def append(self, turn: Turn) -> None:
+        """加入一段對話，超過視窗時捨棄最舊的一段"""
+        if len(self.turns) == self.turns.maxlen:
+            self.size -= _turn_size(self.turns[0])
+        self.turns.append(turn)
+        self.size += _turn_size(turn)
+        self.last_access = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉成與舊版 user_contexts 相容的格式"""
+        if not self.turns:
+            return {}
+        message, response, timestamp = self.turns[-1]
+        return {
+            'last_message': message,
+            'last_response': response,
+            'timestamp': timestamp,
+            'history': [
+                {'message': m, 'response': r, 'timestamp': t}
+                for m, r, t in self.turns
+            ]
+        }
+
+def without_history(context: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留上一段對話（舊版 user_contexts 的欄位），用於寫入訊息紀錄"""
+    return {key: value for key, value in context.items() if key != 'history'}
+
+class MemoryContextBackend:
+    """
+    行程內的 LRU 上下文儲存，具閒置 TTL 與記憶體上限
+    """
+    blocking = False
+
+    def __init__(self, max_turns: int, idle_ttl: float, max_users: int, max_bytes: int):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, ContextEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user_id: str) -> Optional[ContextEntry]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.time() - entry.last_access > self.idle_ttl:
+                self._remove(user_id)
+                self.expirations += 1
+                return None
+            entry.last_access = time.time()
+            self._entries.move_to_end(user_id)
+            return entry
+
+    def append(self, user_id: str, turn: Turn) -> None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = ContextEntry(user_id, self.max_turns)
+                self._entries[user_id] = entry
+                self.bytes += entry.size
+            else:
+                self._entries.move_to_end(user_id)
+            before = entry.size
+            entry.append(turn)
+            self.bytes += entry.size - before
+            self._evict()
+
+    def _evict(self) -> None:
+        # 先清除閒置過久的用戶，再依 LRU 淘汰到符合上限
+        now = time.time()
+        while self._entries:
+            oldest_id, oldest = next(iter(self._entries.items()))
+            if now - oldest.last_access > self.idle_ttl:
+                self._remove(oldest_id)
+                self.expirations += 1
+            elif len(self._entries) > self.max_users or self.bytes > self.max_bytes:
+                self._remove(oldest_id)
+                self.evictions += 1
+            else:
+                break
+
+    def _remove(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id)
+        self.bytes -= entry.size
+
+    def stats(self) -> dict:
+        users = len(self._entries)
+        return {
+            'backend': 'memory',
+            'users': users,
+            'bytes': self.bytes,
+            'bytes_per_user': self.bytes / users if users else 0.0,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class SQLiteContextBackend:
+    """
+    以 SQLite 檔案儲存上下文，讓多個 gunicorn worker 共用對話狀態
+    """
+    blocking = True
+
+    def __init__(self, path: str, max_turns: int, idle_ttl: float, max_users: int, max_bytes: int):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        self.db = SQLiteFile(path, (
+            'create table if not exists contexts ('
+            'user_id text primary key, turns text not null, '
+            'size integer not null, last_access real not null)',
+            'create index if not exists idx_contexts_last_access on contexts(last_access)'
+        ), self._evict)
+
+    def get(self, user_id: str) -> Optional[ContextEntry]:
+        conn = self.db.connect()
+        now = time.time()
+        with conn:
+            conn.execute('begin immediate')
+            row = conn.execute(
+                'select turns, last_access from contexts where user_id = ?', (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.idle_ttl:
+                conn.execute('delete from contexts where user_id = ?', (user_id,))
+                self.expirations += 1
+                return None
+            # 讀取也算使用，更新閒置計時
+            conn.execute('update contexts set last_access = ? where user_id = ?', (now, user_id))
+        return ContextEntry(user_id, self.max_turns, [tuple(t) for t in json.loads(row[0])])
+
+    def append(self, user_id: str, turn: Turn) -> None:
+        conn = self.db.connect()
+        with conn:
+            conn.execute('begin immediate')
+            row = conn.execute('select turns from contexts where user_id = ?', (user_id,)).fetchone()
+            turns = [tuple(t) for t in json.loads(row[0])] if row else []
+            entry = ContextEntry(user_id, self.max_turns, turns)
+            entry.append(turn)
+            conn.execute(
+                'insert or replace into contexts (user_id, turns, size, last_access) values (?, ?, ?, ?)',
+                (user_id, json.dumps(list(entry.turns), ensure_ascii=False), entry.size, entry.last_access)
+            )
+        self.db.written()
+
+    def _evict(self) -> None:
+        conn = self.db.connect()
+        with conn:
+            cursor = conn.execute(
+                'delete from contexts where last_access < ?', (time.time() - self.idle_ttl,)
+            )
+            self.expirations += cursor.rowcount
+            users, total = conn.execute('select count(*), coalesce(sum(size), 0) from contexts').fetchone()
+            while users > self.max_users or total > self.max_bytes:
+                # 每次淘汰最舊的 10%
+                batch = max(1, users // 10)
+                cursor = conn.execute(
+                    'delete from contexts where user_id in '
+                    '(select user_id from contexts order by last_access limit ?)', (batch,)
+                )
+                self.evictions += cursor.rowcount
+                users, total = conn.execute('select count(*), coalesce(sum(size), 0) from contexts').fetchone()
+
+    def stats(self) -> dict:
+        users, total = self.db.connect().execute(
+            'select count(*), coalesce(sum(size), 0) from contexts'
+        ).fetchone()
+        return {
+            'backend': 'sqlite',
+            'users': users,
+            'bytes': total,
+            'bytes_per_user': total / users if users else 0.0,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class ContextStore:
+    """
+    用戶對話上下文儲存，依 CONTEXT_BACKEND 選擇 memory 或 sqlite
+    """
+
+    def __init__(self, backend: Optional[str] = None):
+        backend = backend or os.getenv('CONTEXT_BACKEND', 'memory')
+        options = {
+            'max_turns': int(os.getenv('CONTEXT_MAX_TURNS', '10')),
+            'idle_ttl': float(os.getenv('CONTEXT_IDLE_TTL', '1800')),
+            'max_users': int(os.getenv('CONTEXT_MAX_USERS', '10000')),
+            'max_bytes': int(os.getenv('CONTEXT_MAX_BYTES', str(32 * 1024 * 1024)))
+        }
+        if backend == 'sqlite':
+            self.backend = SQLiteContextBackend(
+                os.getenv('CONTEXT_SQLITE_PATH', 'contexts.db'), **options
+            )
+        else:
+            self.backend = MemoryContextBackend(**options)
+
+    async def _call(self, method, *args):
+        # SQLite 的讀寫會阻塞，移到執行緒中執行
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, user_id: str) -> Dict[str, Any]:
+        """獲取用戶上下文，沒有資料時回傳空字典"""
+        try:
+            entry = await self._call(self.backend.get, user_id)
+            return entry.to_dict() if entry else {}
+        except Exception as e:
+            logger.error(f"Error getting context: {e}")
+            return {}
+
+    async def append_turn(self, user_id: str, message: str, response: str) -> None:
+        """記錄一段對話"""
+        try:
+            await self._call(self.backend.append, user_id, (message, response, datetime.now().isoformat()))
+        except Exception as e:
+            logger.error(f"Error saving context: {e}")
+
+    def stats(self) -> dict:
+        """輸出用戶數、每位用戶的記憶體用量與淘汰次數"""
+        try:
+            return self.backend.stats()
+        except Exception as e:
+            logger.error(f"Error getting context stats: {e}")
+            return {}
@@ -1,25 +1,76 @@
-from supabase import create_client
 import os
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 import logging
+from app.services.cache_service import ReadThroughCache
+from app.services.db_client_service import get_client, execute, sync
+from app.services.message_log_service import MessageLogWriter
+from app.services.metrics_service import Histogram
+from app.services.reminder_service import reminder_scheduler
+from app.services.search_service import task_search
+from app.services.task_stats_service import task_aggregates
 
 # 設定日誌
 logger = logging.getLogger(__name__)
 
-# 初始化 Supabase 客戶端
-supabase = create_client(
-    os.getenv('SUPABASE_URL'),
-    os.getenv('SUPABASE_KEY')
-)
-
 class DatabaseError(Exception):
     """自定義資料庫錯誤"""
     pass
 
+def _table(name: str):
+    return get_client().table(name)
+
+async def _insert_rows(table: str, rows: List[Dict[str, Any]]) -> None:
+    """批次寫入多筆資料"""
+    await execute(f'{table}.bulk_insert', _table(table).insert(rows))
+
+# 訊息紀錄的緩衝寫入器
+message_writer = MessageLogWriter(_insert_rows)
+
+# 用戶資料與設定的讀穿快取（未註冊用戶以較短 TTL 做負向快取）
+user_info_cache = ReadThroughCache(
+    'user_info',
+    ttl=float(os.getenv('USER_CACHE_TTL', '300')),
+    negative_ttl=float(os.getenv('USER_CACHE_NEGATIVE_TTL', '30'))
+)
+user_settings_cache = ReadThroughCache(
+    'user_settings',
+    ttl=float(os.getenv('USER_CACHE_TTL', '300')),
+    negative_ttl=float(os.getenv('USER_CACHE_NEGATIVE_TTL', '30'))
+)
+
+DEFAULT_SETTINGS = {
+    'notification_enabled': True,
+    'language': 'zh-TW'
+}
+
+# keyset 分頁的每頁筆數
+PAGE_SIZE = int(os.getenv('DB_PAGE_SIZE', '1000'))
+
+# 以 in_ 依 ID 查詢時每次請求的 ID 數
+ID_BATCH_SIZE = int(os.getenv('DB_ID_BATCH_SIZE', '200'))
+
+# 各查詢讀取的欄位，不使用 select('*')
+TASK_COLUMNS = 'id,title,description,assignee,department,due_date,priority,status,created_at,updated_at'
+TASK_FLOW_COLUMNS = 'id,task_id,step_number,department,handler_id,status,created_at'
+
+# 任務建立模式：batch 為每張表一次批次 insert，rpc 為單次交易
+TASK_CREATE_MODE = os.getenv('TASK_CREATE_MODE', 'batch')
+
+# 批次任務建立各階段耗時
+batch_timings: Dict[str, Histogram] = {
+    'task': Histogram(),
+    'task_flows': Histogram(),
+    'task_logs': Histogram(),
+    'rpc': Histogram(),
+    'total': Histogram()
+}
+
 async def save_message(event) -> None:
     """
-    保存 LINE 訊息到資料庫
+    保存 LINE 訊息到資料庫（經由緩衝寫入器批次寫入）
     """
     try:
         data = {
@@ -32,7 +83,7 @@ async def save_message(event) -> None:
             'status': 'pending',
             'context': {}
         }
-        await supabase.table('messages').insert(data).execute()
+        message_writer.add('messages', data)
     except Exception as e:
         logger.error(f"Error saving message: {e}")
         raise DatabaseError(f"Failed to save message: {str(e)}")
@@ -42,42 +93,140 @@ async def save_task(task_info: Dict[str, Any]) -> str:
     保存任務到資料庫，返回任務ID
     """
     try:
-        data = {
-            'title': task_info.get('title', ''),
-            'description': task_info.get('description'),
-            'assignee': task_info.get('assignee'),
-            'department': task_info.get('department'),
-            'due_date': task_info.get('due_date'),
-            'priority': task_info.get('priority', 'medium'),
-            'status': 'pending',
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
-        response = await supabase.table('tasks').insert(data).execute()
-        return response.data[0]['id']
+        data = _task_row(task_info)
+        response = await execute('tasks.insert', _table('tasks').insert(data))
+        task_id = response.data[0]['id']
+        task_aggregates.record_created({**data, 'id': task_id})
+        task_search.record_created({**data, 'id': task_id})
+        reminder_scheduler.track({**data, 'id': task_id})
+        return task_id
     except Exception as e:
         logger.error(f"Error saving task: {e}")
         raise DatabaseError(f"Failed to save task: {str(e)}")
 
-def save_task_flow(task_id: str, flow_steps: List[Dict[str, Any]]) -> None:
+async def save_tasks(task_infos: List[Dict[str, Any]]) -> List[str]:
     """
-    保存任務流程
+    以單次請求批次保存多個任務，依序返回任務ID
     """
+    if not task_infos:
+        return []
     try:
-        for i, step in enumerate(flow_steps):
-            data = {
-                'task_id': task_id,
-                'step_number': i + 1,
-                'department': step.get('department'),
-                'handler_id': step.get('handler_id'),
-                'status': '待處理',
-                'created_at': datetime.now().isoformat()
-            }
-            supabase.table('task_flows').insert(data).execute()
+        rows = [_task_row(task_info) for task_info in task_infos]
+        response = await execute('tasks.insert_many', _table('tasks').insert(rows))
+        task_ids = [row['id'] for row in response.data]
+        for row, task_id in zip(rows, task_ids):
+            task_aggregates.record_created({**row, 'id': task_id})
+            task_search.record_created({**row, 'id': task_id})
+            reminder_scheduler.track({**row, 'id': task_id})
+        return task_ids
     except Exception as e:
-        print(f"Error saving task flow: {e}")
+        logger.error(f"Error saving tasks: {e}")
+        raise DatabaseError(f"Failed to save tasks: {str(e)}")
+
+def _task_row(task_info: Dict[str, Any]) -> Dict[str, Any]:
+    now = datetime.now().isoformat()
+    return {
+        'title': task_info.get('title', ''),
+        'description': task_info.get('description'),
+        'assignee': task_info.get('assignee'),
+        'department': task_info.get('department'),
+        'due_date': task_info.get('due_date'),
+        'priority': task_info.get('priority', 'medium'),
+        'status': 'pending',
+        'created_at': now,
+        'updated_at': now
+    }
 
-def save_user(user_info: Dict[str, Any]) -> None:
+def _flow_rows(task_id: Optional[str], flow_steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    now = datetime.now().isoformat()
+    return [
+        {
+            'task_id': task_id,
+            'step_number': i + 1,
+            'department': step.get('department'),
+            'handler_id': step.get('handler_id'),
+            'status': '待處理',
+            'created_at': now
+        }
+        for i, step in enumerate(flow_steps)
+    ]
+
+async def save_task_flow(task_id: str, flow_steps: List[Dict[str, Any]]) -> None:
+    """
+    保存任務流程（單次批次 insert）
+    """
+    try:
+        if flow_steps:
+            await execute('task_flows.insert', _table('task_flows').insert(_flow_rows(task_id, flow_steps)))
+    except Exception as e:
+        logger.error(f"Error saving task flow: {e}")
+
+async def _timed(stage: str, operation: str, query) -> Any:
+    started = time.perf_counter()
+    try:
+        return await execute(operation, query)
+    finally:
+        batch_timings[stage].observe(time.perf_counter() - started)
+
+async def create_task_with_flow(
+    task_info: Dict[str, Any],
+    flow_steps: List[Dict[str, Any]],
+    user_id: Optional[str] = None
+) -> str:
+    """
+    一次建立任務、任務流程與初始日誌，返回任務ID
+    """
+    started = time.perf_counter()
+    task = _task_row(task_info)
+    log = {
+        'user_id': user_id,
+        'action': '建立任務',
+        'timestamp': datetime.now().isoformat()
+    }
+    try:
+        if TASK_CREATE_MODE == 'rpc':
+            # 由資料庫函式在單一交易中寫入三張表
+            response = await _timed('rpc', 'rpc.create_task_with_flow', get_client().rpc('create_task_with_flow', {
+                'task': task,
+                'flow_steps': _flow_rows(None, flow_steps),
+                'log': log
+            }))
+            task_aggregates.record_created({**task, 'id': response.data})
+            task_search.record_created({**task, 'id': response.data})
+            reminder_scheduler.track({**task, 'id': response.data})
+            return response.data
+
+        response = await _timed('task', 'tasks.insert', _table('tasks').insert(task))
+        task_id = response.data[0]['id']
+        try:
+            if flow_steps:
+                await _timed('task_flows', 'task_flows.insert', _table('task_flows').insert(_flow_rows(task_id, flow_steps)))
+            await _timed('task_logs', 'task_logs.insert', _table('task_logs').insert({'task_id': task_id, **log}))
+        except Exception:
+            # 盡力回滾已建立的任務，避免留下沒有流程的任務
+            try:
+                await execute('task_flows.delete', _table('task_flows').delete().eq('task_id', task_id))
+                await execute('tasks.delete', _table('tasks').delete().eq('id', task_id))
+            except Exception as e:
+                logger.error(f"Error rolling back task {task_id}: {e}")
+            raise
+        task_aggregates.record_created({**task, 'id': task_id})
+        task_search.record_created({**task, 'id': task_id})
+        reminder_scheduler.track({**task, 'id': task_id})
+        return task_id
+    except Exception as e:
+        logger.error(f"Error creating task with flow: {e}")
+        raise DatabaseError(f"Failed to create task with flow: {str(e)}")
+    finally:
+        batch_timings['total'].observe(time.perf_counter() - started)
+
+def get_batch_stats() -> Dict[str, Any]:
+    """
+    獲取批次任務建立的各階段耗時
+    """
+    return {stage: histogram.snapshot() for stage, histogram in batch_timings.items()}
+
+async def save_user(user_info: Dict[str, Any]) -> None:
     """
     保存使用者資訊
     """
@@ -89,23 +238,20 @@ def save_user(user_info: Dict[str, Any]) -> None:
             'title': user_info.get('title'),
             'join_date': datetime.now().isoformat()
         }
-        supabase.table('users').insert(data).execute()
+        await execute('users.insert', _table('users').insert(data))
     except Exception as e:
-        print(f"Error saving user: {e}")
+        logger.error(f"Error saving user: {e}")
+    finally:
+        user_info_cache.invalidate(user_info.get('line_id'))
 
-async def get_user_tasks(
-    status: str = None,
-    keyword: str = None,
-    assignee: str = None,
-    department: str = None,
-    created_after: str = None
-) -> List[Dict[str, Any]]:
-    """
-    獲取任務列表，支援多種篩選條件
-    """
-    try:
-        query = supabase.table('tasks').select('*')
-        
+def _task_filters(
+    status: Optional[str] = None,
+    keyword: Optional[str] = None,
+    assignee: Optional[str] = None,
+    department: Optional[str] = None,
+    created_after: Optional[str] = None
+) -> Callable[[Any], Any]:
+    def build(query):
         if status:
             query = query.eq('status', status)
         if keyword:
@@ -116,41 +262,177 @@ async def get_user_tasks(
             query = query.eq('department', department)
         if created_after:
             query = query.gte('created_at', created_after)
-            
-        response = await query.execute()
-        return response.data
+        return query
+    return build
+
+async def iter_pages(
+    operation: str,
+    table: str,
+    columns: str,
+    build: Optional[Callable[[Any], Any]] = None,
+    page_size: Optional[int] = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    以 (created_at, id) keyset 分頁逐頁讀取，每次只保留一頁資料；
+    build 用來加上篩選條件，columns 會自動補上分頁需要的欄位
+    """
+    page_size = page_size or PAGE_SIZE
+    fields = [field.strip() for field in columns.split(',')]
+    columns = ','.join(fields + [key for key in ('id', 'created_at') if key not in fields])
+    cursor: Optional[Tuple[Any, Any]] = None
+    while True:
+        query = _table(table).select(columns)
+        if build is not None:
+            query = build(query)
+        if cursor is not None:
+            # (created_at, id) > 游標；另加 created_at >= 游標讓索引可以直接做範圍掃描。
+            # postgrest 0.13 沒有 or_()，邏輯條件直接加到查詢參數；值含有冒號與加號，需加上雙引號
+            created_at, row_id = cursor
+            query = query.gte('created_at', created_at)
+            query.params = query.params.add(
+                'or', f'(created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt."{row_id}"))'
+            )
+        # PostgREST 只採用一個 order 參數，兩個排序欄位需放在同一個參數中
+        response = await execute(operation, query.order('created_at,id').limit(page_size))
+        rows = response.data
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1]['created_at'], rows[-1]['id'])
+
+async def iter_tasks(
+    status: str = None,
+    keyword: str = None,
+    assignee: str = None,
+    department: str = None,
+    created_after: str = None,
+    columns: str = TASK_COLUMNS,
+    page_size: Optional[int] = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    依建立時間逐頁讀取任務，篩選條件與 get_user_tasks 相同（關鍵字以 ilike 比對）
+    """
+    build = _task_filters(status, keyword, assignee, department, created_after)
+    async for page in iter_pages('tasks.select_page', 'tasks', columns, build, page_size):
+        yield page
+
+async def get_user_tasks(
+    status: str = None,
+    keyword: str = None,
+    assignee: str = None,
+    department: str = None,
+    created_after: str = None,
+    columns: str = TASK_COLUMNS,
+    limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    獲取任務列表，支援多種篩選條件；索引已載入時關鍵字以全文索引查詢並依相關度排序
+    """
+    try:
+        if keyword and task_search.loaded:
+            # 篩選條件在索引中排序前套用；未指定 limit 時取回所有符合的任務
+            ranked = [task_id for task_id, _ in task_search.search(
+                keyword,
+                limit=limit or 0,
+                status=status,
+                assignee=assignee,
+                department=department,
+                created_after=created_after
+            )]
+            if not ranked:
+                return []
+            # 資料庫仍套用同樣的篩選，以資料庫的最新狀態為準；ID 分批避免網址過長
+            build = _task_filters(status, None, assignee, department, created_after)
+            tasks = []
+            for start in range(0, len(ranked), ID_BATCH_SIZE):
+                batch = ranked[start:start + ID_BATCH_SIZE]
+                response = await execute('tasks.select', build(_table('tasks').select(columns).in_('id', batch)))
+                tasks.extend(response.data)
+            rank = {task_id: i for i, task_id in enumerate(ranked)}
+            return sorted(tasks, key=lambda task: rank.get(str(task['id']), len(rank)))
+
+        tasks: List[Dict[str, Any]] = []
+        page_size = min(limit, PAGE_SIZE) if limit else None
+        async for page in iter_tasks(status, keyword, assignee, department, created_after, columns, page_size):
+            tasks.extend(page)
+            if limit and len(tasks) >= limit:
+                return tasks[:limit]
+        return tasks
     except Exception as e:
         logger.error(f"Error getting tasks: {e}")
         raise DatabaseError(f"Failed to get tasks: {str(e)}")
 
-async def get_weekly_tasks() -> List[Dict[str, Any]]:
+async def get_weekly_tasks(columns: str = TASK_COLUMNS) -> List[Dict[str, Any]]:
     """
     獲取本週的任務
     """
     try:
         start_date = (datetime.now() - timedelta(days=7)).isoformat()
-        response = await supabase.table('tasks')\
-            .select('*')\
-            .gte('created_at', start_date)\
-            .execute()
-        return response.data
+        tasks: List[Dict[str, Any]] = []
+        async for page in iter_tasks(created_after=start_date, columns=columns):
+            tasks.extend(page)
+        return tasks
     except Exception as e:
         logger.error(f"Error getting weekly tasks: {e}")
         raise DatabaseError(f"Failed to get weekly tasks: {str(e)}")
 
-def get_task_flow(task_id: str) -> List[Dict[str, Any]]:
+def task_stat_pages() -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    逐頁讀取重新校正任務聚合所需的欄位
+    """
+    return iter_pages('tasks.select_stats', 'tasks', 'id,status,assignee,department,created_at')
+
+def task_search_pages() -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    逐頁讀取重建全文索引所需的欄位
+    """
+    return iter_pages('tasks.select_search', 'tasks', 'id,title,description,status,assignee,department,created_at')
+
+async def get_due_tasks(due_before: str) -> List[Dict[str, Any]]:
+    """
+    獲取截止時間在指定時間前、尚未發送提醒的待辦任務
+    """
+    try:
+        response = await execute('tasks.select_due', _table('tasks')\
+            .select('id,title,assignee,status,due_date')\
+            .eq('status', 'pending')\
+            .is_('reminder_sent_at', 'null')\
+            .lte('due_date', due_before)\
+            .order('due_date'))
+        return response.data
+    except Exception as e:
+        logger.error(f"Error getting due tasks: {e}")
+        raise DatabaseError(f"Failed to get due tasks: {str(e)}")
+
+async def claim_task_reminders(task_ids: List[str]) -> List[str]:
+    """
+    標記任務已發送到期提醒，只回傳本次成功標記的任務ID
+    """
+    if not task_ids:
+        return []
+    try:
+        response = await execute('tasks.claim_reminders', _table('tasks')\
+            .update({'reminder_sent_at': datetime.now().astimezone().isoformat()})\
+            .in_('id', task_ids)\
+            .is_('reminder_sent_at', 'null'))
+        return [row['id'] for row in response.data]
+    except Exception as e:
+        logger.error(f"Error claiming task reminders: {e}")
+        raise DatabaseError(f"Failed to claim task reminders: {str(e)}")
+
+async def get_task_flow(task_id: str) -> List[Dict[str, Any]]:
     """
     獲取任務流程
     """
     try:
-        response = supabase.table('task_flows')\
-            .select('*')\
+        response = await execute('task_flows.select', _table('task_flows')\
+            .select(TASK_FLOW_COLUMNS)\
             .eq('task_id', task_id)\
-            .order('step_number')\
-            .execute()
+            .order('step_number'))
         return response.data
     except Exception as e:
-        print(f"Error getting task flow: {e}")
+        logger.error(f"Error getting task flow: {e}")
         return []
 
 async def update_task_status(task_id: str, status: str, user_id: str) -> None:
@@ -159,13 +441,16 @@ async def update_task_status(task_id: str, status: str, user_id: str) -> None:
     """
     try:
         # 更新任務狀態
-        await supabase.table('tasks')\
+        await execute('tasks.update', _table('tasks')\
             .update({
                 'status': status,
                 'updated_at': datetime.now().isoformat()
             })\
-            .eq('id', task_id)\
-            .execute()
+            .eq('id', task_id))
+        task_aggregates.record_status(task_id, status)
+        task_search.record_status(task_id, status)
+        if status != 'pending':
+            reminder_scheduler.cancel(task_id)
         
         # 記錄日誌
         log_data = {
@@ -174,38 +459,41 @@ async def update_task_status(task_id: str, status: str, user_id: str) -> None:
             'action': f'更新狀態為 {status}',
             'timestamp': datetime.now().isoformat()
         }
-        await supabase.table('task_logs').insert(log_data).execute()
+        await execute('task_logs.insert', _table('task_logs').insert(log_data))
     except Exception as e:
         logger.error(f"Error updating task status: {e}")
         raise DatabaseError(f"Failed to update task status: {str(e)}")
 
-def get_user_info(line_id: str) -> Optional[Dict[str, Any]]:
+async def _fetch_user_info(line_id: str) -> Optional[Dict[str, Any]]:
+    response = await execute('users.select', _table('users')\
+        .select('*')\
+        .eq('line_id', line_id))
+    return response.data[0] if response.data else None
+
+async def get_user_info(line_id: str) -> Optional[Dict[str, Any]]:
     """
-    獲取使用者資訊
+    獲取使用者資訊（經由讀穿快取）
     """
     try:
-        response = supabase.table('users')\
-            .select('*')\
-            .eq('line_id', line_id)\
-            .execute()
-        return response.data[0] if response.data else None
+        user_info = await user_info_cache.get(line_id, lambda: _fetch_user_info(line_id))
+        return dict(user_info) if user_info else None
     except Exception as e:
-        print(f"Error getting user info: {e}")
+        logger.error(f"Error getting user info: {e}")
         return None
 
+async def _fetch_user_settings(user_id: str) -> Dict[str, Any]:
+    response = await execute('settings.select', _table('settings')\
+        .select('*')\
+        .eq('user_id', user_id))
+    return response.data[0] if response.data else DEFAULT_SETTINGS
+
 async def get_user_settings(user_id: str) -> Dict[str, Any]:
     """
-    獲取用戶設定
+    獲取用戶設定（經由讀穿快取）
     """
     try:
-        response = await supabase.table('settings')\
-            .select('*')\
-            .eq('user_id', user_id)\
-            .execute()
-        return response.data[0] if response.data else {
-            'notification_enabled': True,
-            'language': 'zh-TW'
-        }
+        settings = await user_settings_cache.get(user_id, lambda: _fetch_user_settings(user_id))
+        return dict(settings)
     except Exception as e:
         logger.error(f"Error getting user settings: {e}")
         raise DatabaseError(f"Failed to get user settings: {str(e)}")
@@ -215,13 +503,38 @@ async def update_user_settings(user_id: str, settings: Dict[str, Any]) -> None:
     更新用戶設定
     """
     try:
-        await supabase.table('settings')\
+        await execute('settings.upsert', _table('settings')\
             .upsert({
                 'user_id': user_id,
                 **settings,
                 'updated_at': datetime.now().isoformat()
-            })\
-            .execute()
+            }))
     except Exception as e:
         logger.error(f"Error updating user settings: {e}")
-        raise DatabaseError(f"Failed to update user settings: {str(e)}") 
\ No newline at end of file
+        raise DatabaseError(f"Failed to update user settings: {str(e)}")
+    finally:
+        user_settings_cache.invalidate(user_id)
+
+# 給舊有同步程式碼使用的介面，需在執行緒中呼叫（見 db_client_service.run_in_thread）
+sync_db = SimpleNamespace(
+    save_task=sync(save_task),
+    save_task_flow=sync(save_task_flow),
+    create_task_with_flow=sync(create_task_with_flow),
+    save_user=sync(save_user),
+    get_user_tasks=sync(get_user_tasks),
+    get_weekly_tasks=sync(get_weekly_tasks),
+    get_task_flow=sync(get_task_flow),
+    update_task_status=sync(update_task_status),
+    get_user_info=sync(get_user_info),
+    get_user_settings=sync(get_user_settings),
+    update_user_settings=sync(update_user_settings)
+)
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    獲取用戶資料快取的統計
+    """
+    return {
+        'user_info': user_info_cache.stats(),
+        'user_settings': user_settings_cache.stats()
+    }
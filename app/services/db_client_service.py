@@ -0,0 +1,201 @@
+import asyncio
+import functools
+import importlib.util
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from app.services.client_service import clients
+from app.services.metrics_service import Histogram, Sample, metrics
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 連線池設定
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '20'))
+DB_KEEPALIVE_EXPIRY = float(os.getenv('DB_KEEPALIVE_EXPIRY', '30'))
+DB_TIMEOUT = float(os.getenv('DB_TIMEOUT', '10'))
+DB_SYNC_TIMEOUT = float(os.getenv('DB_SYNC_TIMEOUT', '30'))
+# HTTP/2 需要安裝 h2 套件，未安裝時退回 HTTP/1.1 keep-alive
+DB_HTTP2 = os.getenv('DB_HTTP2', 'auto')
+
+# 每個事件迴圈各自的客戶端（httpx 連線綁定事件迴圈）
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]' = weakref.WeakKeyDictionary()
+_client_override: Optional[Any] = None
+
+# 每種查詢的延遲直方圖
+query_latency: Dict[str, Histogram] = {}
+query_errors: Dict[str, int] = {}
+# 每種查詢回傳的資料列數
+query_rows: Dict[str, int] = {}
+
+def _http2_enabled() -> bool:
+    if DB_HTTP2 == 'auto':
+        return importlib.util.find_spec('h2') is not None
+    return DB_HTTP2.lower() == 'true'
+
+@functools.lru_cache(maxsize=None)
+def _client_class() -> type:
+    """第一次建立客戶端時才匯入 httpx 與 postgrest"""
+    import httpx
+    from postgrest import AsyncPostgrestClient
+
+    class PooledPostgrestClient(AsyncPostgrestClient):
+        """
+        使用共用連線池（keep-alive、HTTP/2）的 PostgREST 客戶端
+        """
+
+        def create_session(self, base_url, headers, timeout, verify=True, **kwargs):
+            return httpx.AsyncClient(
+                base_url=base_url,
+                headers=headers,
+                timeout=DB_TIMEOUT,
+                verify=verify,
+                follow_redirects=True,
+                http2=_http2_enabled(),
+                limits=httpx.Limits(
+                    max_connections=DB_POOL_SIZE,
+                    max_keepalive_connections=DB_POOL_SIZE,
+                    keepalive_expiry=DB_KEEPALIVE_EXPIRY
+                )
+            )
+
+    return PooledPostgrestClient
+
+def _create_client() -> Any:
+    url = os.getenv('SUPABASE_URL')
+    key = os.getenv('SUPABASE_KEY')
+    if not url or not key:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_KEY are required")
+    return _client_class()(
+        f"{url.rstrip('/')}/rest/v1",
+        headers={'apiKey': key, 'Authorization': f'Bearer {key}'}
+    )
+
+def _loop_client() -> Any:
+    """建立（或取得）目前事件迴圈的客戶端，由客戶端登錄表呼叫"""
+    if _client_override is not None:
+        return _client_override
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _create_client()
+        _clients[loop] = client
+    return client
+
+def get_client() -> Any:
+    """獲取目前事件迴圈的資料庫客戶端"""
+    if _client_override is not None:
+        return _client_override
+    client = _clients.get(asyncio.get_running_loop())
+    return client if client is not None else clients.get('supabase')
+
+# 客戶端綁定事件迴圈，登錄表不快取實例，只負責預先匯入與暖機
+clients.register('supabase', _loop_client, imports=('httpx', 'postgrest'), cache=False)
+
+def set_client(client: Optional[Any]) -> None:
+    """替換資料庫客戶端（基準測試與本機替身使用），傳入 None 還原"""
+    global _client_override
+    _client_override = client
+
+async def close_client() -> None:
+    """關閉目前事件迴圈的連線池"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+async def execute(operation: str, query) -> Any:
+    """
+    執行查詢並記錄延遲
+    """
+    started = time.perf_counter()
+    try:
+        response = await query.execute()
+        data = getattr(response, 'data', None)
+        if isinstance(data, list):
+            query_rows[operation] = query_rows.get(operation, 0) + len(data)
+        return response
+    except Exception:
+        query_errors[operation] = query_errors.get(operation, 0) + 1
+        raise
+    finally:
+        histogram = query_latency.get(operation)
+        if histogram is None:
+            histogram = query_latency[operation] = Histogram()
+        histogram.observe(time.perf_counter() - started)
+
+def get_query_stats() -> Dict[str, Any]:
+    """獲取每種查詢的延遲分佈與錯誤次數"""
+    return {
+        operation: {
+            **histogram.snapshot(),
+            'errors': query_errors.get(operation, 0),
+            'rows': query_rows.get(operation, 0)
+        }
+        for operation, histogram in query_latency.items()
+    }
+
+def collect_query_metrics() -> Iterable[Sample]:
+    """輸出每種查詢的延遲、錯誤次數與讀取的資料列數"""
+    for operation, histogram in list(query_latency.items()):
+        labels = {'operation': operation}
+        yield ('db_query_duration_seconds', 'histogram', '資料庫查詢耗時', labels, histogram)
+        yield ('db_query_errors_total', 'counter', '資料庫查詢失敗次數', labels, query_errors.get(operation, 0))
+        yield ('db_rows_read_total', 'counter', '資料庫查詢回傳的資料列數', labels, query_rows.get(operation, 0))
+
+metrics.register(collect_query_metrics)
+
+# 同步介面：讓舊有同步程式碼在執行緒中呼叫 async 查詢
+_main_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_lock = threading.Lock()
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('DB_SYNC_WORKERS', '8')),
+    thread_name_prefix='db-sync'
+)
+
+def bind_loop(loop: asyncio.AbstractEventLoop) -> None:
+    """指定同步介面使用的主事件迴圈（於應用程式啟動時呼叫）"""
+    global _main_loop
+    _main_loop = loop
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='db-loop', daemon=True).start()
+            _background_loop = loop
+        return _background_loop
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """
+    在同步程式碼中執行資料庫協程，查詢仍在事件迴圈上以 async 執行
+    """
+    loop = _main_loop if _main_loop is not None and _main_loop.is_running() else None
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None:
+        coro.close()
+        raise RuntimeError("Synchronous database call inside the event loop; use await or run_in_thread()")
+    if loop is None:
+        # 沒有主事件迴圈時（腳本、排程執行緒）使用背景事件迴圈
+        loop = _get_background_loop()
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=timeout or DB_SYNC_TIMEOUT)
+
+def sync(func: Callable[..., Awaitable]) -> Callable[..., Any]:
+    """將 async 資料庫函式包成同步版本"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_sync(func(*args, **kwargs))
+    return wrapper
+
+async def run_in_thread(func: Callable[..., Any], *args) -> Any:
+    """在執行緒池中執行舊有的同步處理函式，避免阻塞事件迴圈"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(func, *args))
@@ -0,0 +1,268 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+
+from app.services.metrics_service import Sample
+from app.services.sqlite_service import SQLiteFile
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 事件狀態
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+
+# claim 的結果
+NEW = 'new'
+DUPLICATE = 'duplicate'
+COALESCED = 'coalesced'
+
+def event_id(event: Any) -> Optional[str]:
+    """取出 LINE 事件的 webhookEventId，舊版 SDK 或測試事件沒有時回傳 None"""
+    return getattr(event, 'webhook_event_id', None) or None
+
+def is_redelivery(event: Any) -> bool:
+    """LINE 重送的事件 deliveryContext.isRedelivery 為 True"""
+    context = getattr(event, 'delivery_context', None)
+    return bool(getattr(context, 'is_redelivery', False))
+
+class MemoryDedupBackend:
+    """
+    行程內的已處理事件集合，依時間視窗過期並限制筆數
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # 事件ID -> (狀態, 過期時間)，依寫入順序排列
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def claim(self, event_id: str, ttl: float) -> Optional[str]:
+        """
+        尚未見過（或已過期）時標記為處理中並回傳 None，否則回傳目前狀態
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(event_id)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+            self._entries.pop(event_id, None)
+            self._entries[event_id] = (IN_FLIGHT, now + ttl)
+            self._evict(now)
+            return None
+
+    def mark(self, event_id: str, state: str, ttl: float) -> None:
+        with self._lock:
+            self._entries.pop(event_id, None)
+            self._entries[event_id] = (state, time.time() + ttl)
+            self._evict(time.time())
+
+    def discard(self, event_id: str) -> None:
+        with self._lock:
+            self._entries.pop(event_id, None)
+
+    def _evict(self, now: float) -> None:
+        # 最舊的先過期；超過上限時淘汰最舊的
+        while self._entries:
+            oldest_id, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at <= now:
+                del self._entries[oldest_id]
+                self.expirations += 1
+            elif len(self._entries) > self.max_entries:
+                del self._entries[oldest_id]
+                self.evictions += 1
+            else:
+                break
+
+    def stats(self) -> dict:
+        return {
+            'backend': 'memory',
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class SQLiteDedupBackend:
+    """
+    以 SQLite 檔案記錄已處理事件，讓多個 gunicorn worker 共用同一份集合
+
+    claim 在 begin immediate 交易中完成讀取與寫入，同一事件同時送到兩個
+    worker 時只有一個能取得處理權。
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.expirations = 0
+        self.db = SQLiteFile(path, (
+            'create table if not exists webhook_events ('
+            'event_id text primary key, state text not null, expires_at real not null)',
+            'create index if not exists idx_webhook_events_expires_at on webhook_events(expires_at)'
+        ), self._evict)
+
+    def claim(self, event_id: str, ttl: float) -> Optional[str]:
+        conn = self.db.connect()
+        now = time.time()
+        with conn:
+            conn.execute('begin immediate')
+            row = conn.execute(
+                'select state, expires_at from webhook_events where event_id = ?', (event_id,)
+            ).fetchone()
+            if row is not None and row[1] > now:
+                return row[0]
+            conn.execute(
+                'insert or replace into webhook_events (event_id, state, expires_at) values (?, ?, ?)',
+                (event_id, IN_FLIGHT, now + ttl)
+            )
+        self.db.written()
+        return None
+
+    def mark(self, event_id: str, state: str, ttl: float) -> None:
+        self.db.connect().execute(
+            'insert or replace into webhook_events (event_id, state, expires_at) values (?, ?, ?)',
+            (event_id, state, time.time() + ttl)
+        )
+        self.db.written()
+
+    def discard(self, event_id: str) -> None:
+        self.db.connect().execute('delete from webhook_events where event_id = ?', (event_id,))
+
+    def _evict(self) -> None:
+        conn = self.db.connect()
+        with conn:
+            cursor = conn.execute('delete from webhook_events where expires_at <= ?', (time.time(),))
+            self.expirations += cursor.rowcount
+            count = conn.execute('select count(*) from webhook_events').fetchone()[0]
+            if count > self.max_entries:
+                cursor = conn.execute(
+                    'delete from webhook_events where event_id in '
+                    '(select event_id from webhook_events order by expires_at limit ?)',
+                    (count - self.max_entries,)
+                )
+                self.evictions += cursor.rowcount
+
+    def stats(self) -> dict:
+        entries = self.db.connect().execute('select count(*) from webhook_events').fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class EventDeduplicator:
+    """
+    以 webhookEventId 去除重複的 Webhook 事件，依 WEBHOOK_DEDUP_BACKEND 選擇 memory 或 sqlite
+
+    事件放入佇列前先 claim：第一次出現時標記為處理中；處理中又收到重送時
+    併入原本的處理（不再執行一次）；處理完成後在時間視窗內的重送直接略過。
+    處理失敗時釋放標記，讓 LINE 之後的重送能再處理一次。
+    """
+
+    def __init__(self, backend: Optional[str] = None):
+        backend = backend or os.getenv('WEBHOOK_DEDUP_BACKEND', 'memory')
+        self.enabled = os.getenv('WEBHOOK_DEDUP_ENABLED', 'true').lower() == 'true'
+        self.ttl = float(os.getenv('WEBHOOK_DEDUP_TTL', '86400'))
+        # 處理中的標記較短，worker 當掉時不會永遠擋住重送
+        self.in_flight_ttl = float(os.getenv('WEBHOOK_DEDUP_IN_FLIGHT_TTL', '300'))
+        max_entries = int(os.getenv('WEBHOOK_DEDUP_MAX_ENTRIES', '100000'))
+        if backend == 'sqlite':
+            self.backend = SQLiteDedupBackend(
+                os.getenv('WEBHOOK_DEDUP_SQLITE_PATH', 'webhook_events.db'), max_entries
+            )
+        else:
+            self.backend = MemoryDedupBackend(max_entries)
+
+        # 去重指標
+        self.accepted = 0
+        self.duplicates = 0
+        self.coalesced = 0
+        self.redeliveries = 0
+        self.missing_id = 0
+        self.released = 0
+        self.errors = 0
+
+    def claim(self, event: Any) -> str:
+        """
+        判斷事件是否需要處理：回傳 NEW、DUPLICATE（已處理過）或 COALESCED（處理中）
+        """
+        if is_redelivery(event):
+            self.redeliveries += 1
+        key = event_id(event)
+        if not self.enabled or key is None:
+            if key is None:
+                self.missing_id += 1
+            self.accepted += 1
+            return NEW
+        try:
+            state = self.backend.claim(key, self.in_flight_ttl)
+        except Exception as e:
+            # 去重失敗時寧可重複處理，也不要漏掉事件
+            self.errors += 1
+            logger.error(f"Error claiming webhook event {key}: {e}")
+            state = None
+        if state is None:
+            self.accepted += 1
+            return NEW
+        if state == IN_FLIGHT:
+            self.coalesced += 1
+            logger.info(f"Coalesced redelivered webhook event {key}")
+            return COALESCED
+        self.duplicates += 1
+        logger.info(f"Skipped duplicate webhook event {key}")
+        return DUPLICATE
+
+    def complete(self, event: Any) -> None:
+        """事件處理完成，時間視窗內的重送都會略過"""
+        key = event_id(event)
+        if key is None or not self.enabled:
+            return
+        try:
+            self.backend.mark(key, DONE, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error completing webhook event {key}: {e}")
+
+    def release(self, event: Any) -> None:
+        """事件未能處理（佇列拒絕或處理失敗），移除標記讓重送能再處理"""
+        key = event_id(event)
+        if key is None or not self.enabled:
+            return
+        try:
+            self.backend.discard(key)
+            self.released += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error releasing webhook event {key}: {e}")
+
+    def stats(self) -> dict:
+        """輸出去重命中次數與已記錄的事件數"""
+        try:
+            backend = self.backend.stats()
+        except Exception as e:
+            logger.error(f"Error getting webhook dedup stats: {e}")
+            backend = {}
+        return {
+            **backend,
+            'enabled': self.enabled,
+            'ttl': self.ttl,
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'coalesced': self.coalesced,
+            'redeliveries': self.redeliveries,
+            'missing_id': self.missing_id,
+            'released': self.released,
+            'errors': self.errors
+        }
+
+    def collect(self) -> Iterable[Sample]:
+        """輸出各種去重結果的次數"""
+        for result in ('accepted', 'duplicates', 'coalesced', 'redeliveries', 'missing_id', 'released', 'errors'):
+            yield ('webhook_dedup_total', 'counter', 'Webhook 事件去重結果', {'result': result}, getattr(self, result))
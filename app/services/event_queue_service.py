@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.services.metrics_service import Histogram, Sample
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+def event_key(event: Any) -> Hashable:
+    """
+    事件所屬的對話：群組與聊天室以對話為單位，一對一以用戶為單位；
+    沒有來源的事件共用同一個鍵
+    """
+    source = getattr(event, 'source', None)
+    return (
+        getattr(source, 'group_id', None)
+        or getattr(source, 'room_id', None)
+        or getattr(source, 'user_id', None)
+        or ''
+    )
+
+def conversation_keys(event: Any) -> Tuple[Hashable, ...]:
+    """
+    依對話與發話用戶排序：同一對話依序回覆，同一用戶在群組與一對一的訊息
+    也不會同時處理（對話上下文以用戶為單位）
+    """
+    conversation = event_key(event)
+    user_id = getattr(getattr(event, 'source', None), 'user_id', None)
+    return (conversation, user_id) if user_id and user_id != conversation else (conversation,)
+
+def user_keys(event: Any) -> Tuple[Hashable, ...]:
+    """
+    只依發話用戶排序：同一用戶的對話上下文不會同時被兩則訊息更新，
+    群組中不同成員的訊息則可並行（群組內的回覆順序不保證）
+    """
+    source = getattr(event, 'source', None)
+    return (getattr(source, 'user_id', None) or event_key(event),)
+
+# EVENT_QUEUE_ORDERING 可選的排序鍵
+ORDERING_KEYS = {'conversation': conversation_keys, 'user': user_keys}
+
+def redact_key(key: Hashable) -> str:
+    """對外輸出時不顯示原始的 LINE ID，只保留類型字首與雜湊"""
+    text = str(key)
+    return f"{text[:1]}#{hashlib.sha256(text.encode()).hexdigest()[:10]}"
+
+class _Item:
+    """佇列中的事件：blocked 為尚未輪到它的 key 數，歸零時即可處理"""
+    __slots__ = ('event', 'enqueued_at', 'keys', 'blocked')
+
+    def __init__(self, event: Any, keys: Tuple[Hashable, ...]):
+        self.event = event
+        self.enqueued_at = time.monotonic()
+        self.keys = keys
+        self.blocked = 0
+
+class EventQueue:
+    """
+    有界的 Webhook 事件佇列，由固定數量的 async worker 消化
+
+    Webhook 端點只負責驗證簽名與放入佇列，實際的 LLM、資料庫與回覆
+    都在 worker 中執行，讓 LINE 能立即收到 200。
+
+    每則事件有一或多個 key，放入各 key 的佇列：預設為所屬對話（群組、聊天室
+    或一對一用戶）與發話用戶，EVENT_QUEUE_ORDERING=user 時只有發話用戶。
+    事件在所有 key 的佇列中都排到最前面才會處理，因此同一個 key 的事件依放入
+    順序逐一處理，沒有共同 key 的事件由多個 worker 並行。事件依放入順序排隊，
+    最早的事件一定可以處理，不會互相等待。一則事件處理完後，同一個 key 的下一則
+    排到可處理佇列的最後，訊息很多的群組不會讓其他對話等待。
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        maxsize: Optional[int] = None,
+        workers: Optional[int] = None,
+        keys: Optional[Callable[[Any], Iterable[Hashable]]] = None,
+        key_maxsize: Optional[int] = None
+    ):
+        self.handler = handler
+        self.keys = keys or ORDERING_KEYS[os.getenv('EVENT_QUEUE_ORDERING', 'conversation')]
+        self.maxsize = maxsize or int(os.getenv('EVENT_QUEUE_MAXSIZE', '1000'))
+        self.key_maxsize = key_maxsize or int(os.getenv('EVENT_QUEUE_KEY_MAXSIZE', '100'))
+        self.worker_count = workers or int(os.getenv('EVENT_QUEUE_WORKERS', '4'))
+        # 各 key 待處理與處理中的事件，最前面的是正在處理或可處理的事件
+        self._pending: Dict[Hashable, Deque[_Item]] = {}
+        self._size = 0
+        # 可處理的事件佇列需在事件迴圈中建立，因此延後到 start()
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+
+        # 背壓指標
+        self.wait_time = Histogram()
+        self.handle_time = Histogram()
+        self.key_depth = Histogram(buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.rejected_key_full = 0
+        self.max_depth = 0
+        self.max_key_depth = 0
+
+    @property
+    def depth(self) -> int:
+        """目前佇列深度（所有 key 的待處理事件總數）"""
+        return self._size
+
+    async def start(self) -> None:
+        """建立可處理的事件佇列並啟動 worker"""
+        if self._ready is not None:
+            return
+        self._ready = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(self.worker_count)
+        ]
+        self._accepting = True
+        logger.info(
+            f"Event queue started with {self.worker_count} workers "
+            f"(maxsize={self.maxsize}, key_maxsize={self.key_maxsize})"
+        )
+
+    def has_capacity(self, count: int = 1) -> bool:
+        """檢查佇列是否還能容納指定數量的事件"""
+        if not self._accepting or self._ready is None:
+            return False
+        return self._size + count <= self.maxsize
+
+    def put_nowait(self, event: Any) -> bool:
+        """
+        放入事件，佇列已滿、任一 key 的佇列已滿或停止接收時回傳 False
+        """
+        if not self._accepting or self._ready is None or self._size >= self.maxsize:
+            self.rejected += 1
+            return False
+        keys = tuple(dict.fromkeys(self.keys(event)))
+        if any(len(self._pending.get(key, ())) >= self.key_maxsize for key in keys):
+            self.rejected += 1
+            self.rejected_key_full += 1
+            return False
+        item = _Item(event, keys)
+        for key in keys:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = deque()
+            elif pending:
+                item.blocked += 1
+            pending.append(item)
+            self.key_depth.observe(len(pending))
+            if len(pending) > self.max_key_depth:
+                self.max_key_depth = len(pending)
+        self._size += 1
+        self.enqueued += 1
+        if not item.blocked:
+            self._ready.put_nowait(item)
+
+        if self._size > self.max_depth:
+            self.max_depth = self._size
+        return True
+
+    def _release(self, item: _Item) -> None:
+        """事件處理完後移出各 key 的佇列，所有 key 都輪到的下一則事件排到最後"""
+        for key in item.keys:
+            pending = self._pending[key]
+            pending.popleft()
+            if not pending:
+                del self._pending[key]
+                continue
+            head = pending[0]
+            head.blocked -= 1
+            if not head.blocked:
+                self._ready.put_nowait(head)
+
+    async def _worker(self, index: int) -> None:
+        """依序取出可處理的事件"""
+        while True:
+            item = await self._ready.get()
+            self._size -= 1
+            started = time.monotonic()
+            self.wait_time.observe(started - item.enqueued_at)
+            try:
+                await self.handler(item.event)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error in event worker {index}: {e}")
+            finally:
+                self.handle_time.observe(time.monotonic() - started)
+                # 先放入下一則再標記完成，drain 才不會在還有事件時結束
+                self._release(item)
+                self._ready.task_done()
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """
+        停止接收新事件，等待佇列中的事件處理完畢後關閉 worker
+        """
+        if self._ready is None:
+            return
+        self._accepting = False
+        if timeout is None:
+            timeout = float(os.getenv('EVENT_QUEUE_DRAIN_TIMEOUT', '10'))
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Event queue drain timed out with {self._size} events left")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Event queue drained: {self.stats()}")
+
+    def busiest_keys(self, limit: int = 5) -> List[Tuple[str, int]]:
+        """待處理事件最多的 key（已遮蔽原始 ID）"""
+        depths = sorted(((len(pending), str(key)) for key, pending in self._pending.items()), reverse=True)
+        return [(redact_key(key), depth) for depth, key in depths[:limit]]
+
+    def stats(self) -> dict:
+        """輸出佇列狀態、各 key 的佇列長度與背壓指標"""
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'maxsize': self.maxsize,
+            'keys': len(self._pending),
+            'key_maxsize': self.key_maxsize,
+            'max_key_depth': self.max_key_depth,
+            'busiest_keys': self.busiest_keys(),
+            'workers': len(self._workers),
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'rejected_key_full': self.rejected_key_full,
+            'wait_time': self.wait_time.snapshot(),
+            'handle_time': self.handle_time.snapshot(),
+            'key_depth': self.key_depth.snapshot()
+        }
+
+    def collect(self) -> Iterable[Sample]:
+        """輸出佇列深度、吞吐量與等待、處理時間"""
+        yield ('event_queue_depth', 'gauge', '事件佇列目前深度', {}, self.depth)
+        yield ('event_queue_keys', 'gauge', '有待處理或處理中事件的 key 數', {}, len(self._pending))
+        yield ('event_queue_max_key_depth', 'gauge', '目前單一 key 最長的佇列長度',
+               {}, max((len(pending) for pending in self._pending.values()), default=0))
+        yield ('event_queue_enqueued_total', 'counter', '放入佇列的事件數', {}, self.enqueued)
+        yield ('event_queue_processed_total', 'counter', '處理完成的事件數', {}, self.processed)
+        yield ('event_queue_failed_total', 'counter', '處理失敗的事件數', {}, self.failed)
+        yield ('event_queue_rejected_total', 'counter', '因佇列已滿被拒絕的事件數', {}, self.rejected)
+        yield ('event_queue_rejected_key_full_total', 'counter', '因單一 key 的佇列已滿被拒絕的事件數',
+               {}, self.rejected_key_full)
+        yield ('event_queue_wait_seconds', 'histogram', '事件在佇列中等待的時間', {}, self.wait_time)
+        yield ('event_queue_handle_seconds', 'histogram', '事件處理耗時', {}, self.handle_time)
+        yield ('event_queue_key_depth', 'histogram', '放入事件時該 key 的佇列長度', {}, self.key_depth)
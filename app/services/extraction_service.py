@@ -0,0 +1,294 @@
+import json
+import logging
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # 未安裝 orjson 時使用標準函式庫
+    _loads = json.loads
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+class ExtractionError(ValueError):
+    """模型輸出無法解析或不符合結構定義"""
+    pass
+
+Validator = Callable[[Any, str], Any]
+
+def compile_schema(schema: Dict[str, Any]) -> Validator:
+    """
+    將 JSON Schema 子集（object、array、string、boolean、integer、number、enum、required）
+    預先編譯成驗證函式；未定義的屬性會被捨棄
+    """
+    kind = schema.get('type')
+    if kind == 'object':
+        properties = {name: compile_schema(sub) for name, sub in schema.get('properties', {}).items()}
+        required = tuple(schema.get('required', ()))
+
+        def validate_object(value: Any, path: str) -> Dict[str, Any]:
+            if not isinstance(value, dict):
+                raise ExtractionError(f"{path}: expected object")
+            for name in required:
+                if value.get(name) is None:
+                    raise ExtractionError(f"{path}.{name}: required")
+            return {
+                name: check(value[name], f"{path}.{name}")
+                for name, check in properties.items()
+                if value.get(name) is not None
+            }
+        return validate_object
+
+    if kind == 'array':
+        check_item = compile_schema(schema.get('items', {}))
+
+        def validate_array(value: Any, path: str) -> List[Any]:
+            if not isinstance(value, list):
+                raise ExtractionError(f"{path}: expected array")
+            return [check_item(item, f"{path}[{i}]") for i, item in enumerate(value)]
+        return validate_array
+
+    if kind == 'string':
+        allowed = frozenset(schema['enum']) if 'enum' in schema else None
+
+        def validate_string(value: Any, path: str) -> str:
+            if not isinstance(value, str):
+                raise ExtractionError(f"{path}: expected string")
+            value = value.strip()
+            if allowed is not None and value not in allowed:
+                raise ExtractionError(f"{path}: {value!r} not in {sorted(allowed)}")
+            return value
+        return validate_string
+
+    if kind == 'boolean':
+        def validate_boolean(value: Any, path: str) -> bool:
+            if not isinstance(value, bool):
+                raise ExtractionError(f"{path}: expected boolean")
+            return value
+        return validate_boolean
+
+    if kind in ('integer', 'number'):
+        types = (int,) if kind == 'integer' else (int, float)
+
+        def validate_number(value: Any, path: str):
+            if isinstance(value, bool) or not isinstance(value, types):
+                raise ExtractionError(f"{path}: expected {kind}")
+            return value
+        return validate_number
+
+    # 未指定型別時不檢查
+    return lambda value, path: value
+
+TASK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_task": {"type": "boolean"},
+        "description": {"type": "string"},
+        "assignee": {"type": "string"},
+        "due_date": {"type": "string"},
+        "priority": {"type": "string", "enum": ["高", "中", "低"]}
+    },
+    "required": ["is_task"]
+}
+
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "tasks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"index": {"type": "integer"}, **TASK_SCHEMA["properties"]},
+                "required": ["index", "is_task"]
+            }
+        }
+    },
+    "required": ["tasks"]
+}
+
+EXTRACT_TASK_FUNCTION = {
+    "name": "extract_task",
+    "description": "提取任務相關資訊",
+    "parameters": TASK_SCHEMA
+}
+
+EXTRACT_TASKS_FUNCTION = {
+    "name": "extract_tasks",
+    "description": "逐則提取多則訊息中的任務相關資訊，index 為訊息編號",
+    "parameters": BATCH_SCHEMA
+}
+
+_validate_task = compile_schema(TASK_SCHEMA)
+_validate_batch = compile_schema(BATCH_SCHEMA)
+
+# 模型偶爾回傳英文優先級
+PRIORITY_ALIASES = {'high': '高', 'medium': '中', 'normal': '中', 'low': '低'}
+
+# 截止時間的本機解析
+DEFAULT_DUE_TIME = time(18, 0)
+NUMERALS = {'零': 0, '〇': 0, '一': 1, '二': 2, '兩': 2, '三': 3, '四': 4, '五': 5,
+            '六': 6, '七': 7, '八': 8, '九': 9, '十': 10}
+WEEKDAYS = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6, '天': 6, '末': 5}
+RELATIVE_DAYS = {'今天': 0, '今日': 0, '明天': 1, '明日': 1, '後天': 2, '大後天': 3}
+PERIODS = (
+    ('凌晨', 3, False), ('早上', 9, False), ('上午', 10, False), ('中午', 12, True),
+    ('下午', 15, True), ('傍晚', 17, True), ('下班', 18, True), ('晚上', 20, True)
+)
+
+_ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+_SLASH_DATE = re.compile(r'(?:(\d{4})[/.年])?(\d{1,2})[/月](\d{1,2})[日號]?')
+_RELATIVE = re.compile(r'(大後天|後天|明天|明日|今天|今日)')
+_WEEKDAY = re.compile(r'(下下|下|這|本|上)?(?:個)?(?:週|周|星期|禮拜)([一二三四五六日天末])')
+_IN_DAYS = re.compile(r'([0-9一二兩三四五六七八九十]+)\s*天(?:後|內)')
+_CLOCK = re.compile(r'(\d{1,2}|[一二兩三四五六七八九十]{1,3})\s*(?:[:：](\d{2})|點(半|[0-9一二三四五六七八九十]{1,3}分?)?)')
+
+def _number(text: str) -> int:
+    if text.isdigit():
+        return int(text)
+    # 十、十二、二十、二十三
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return (NUMERALS.get(tens, 1) if tens else 1) * 10 + (NUMERALS.get(ones, 0) if ones else 0)
+    return NUMERALS.get(text, 0)
+
+def _time_of_day(text: str) -> Optional[time]:
+    period_hour, afternoon = None, False
+    for word, hour, pm in PERIODS:
+        if word in text:
+            period_hour, afternoon = hour, pm
+            break
+    match = _CLOCK.search(text)
+    if match:
+        hour = _number(match.group(1))
+        minute = 0
+        if match.group(2):
+            minute = int(match.group(2))
+        elif match.group(3):
+            minute = 30 if match.group(3) == '半' else _number(match.group(3).rstrip('分'))
+        if afternoon and hour < 12:
+            hour += 12
+        if hour < 24 and minute < 60:
+            return time(hour, minute)
+    if period_hour is not None:
+        return time(period_hour, 0)
+    return None
+
+def parse_due_date(text: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    將截止時間描述轉為 datetime，支援 ISO 日期、「6/30」「6月30日」、「明天下午」、
+    「週五」「下週一上午10點」、「3天後」等寫法；無法解析時回傳 None
+
+    一律回傳帶時區的本地時間（依行程的 TZ 設定）：帶時差的 ISO 時間換算成本地時間，
+    其餘寫法以本地時間解讀。now 未帶時區時視為本地時間。
+    """
+    if not text:
+        return None
+    text = text.strip()
+    now = (now or datetime.now()).astimezone()
+    if _ISO_DATE.match(text):
+        try:
+            parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            # 只有日期時使用預設的下班時間
+            if len(text) <= 10:
+                parsed = datetime.combine(parsed.date(), DEFAULT_DUE_TIME)
+            return parsed.astimezone()
+
+    day: Optional[date] = None
+    today = now.date()
+    match = _RELATIVE.search(text)
+    if match:
+        day = today + timedelta(days=RELATIVE_DAYS[match.group(1)])
+    if day is None:
+        match = _WEEKDAY.search(text)
+        if match:
+            prefix, weekday = match.group(1), WEEKDAYS[match.group(2)]
+            monday = today - timedelta(days=today.weekday())
+            if prefix in ('這', '本'):
+                day = monday + timedelta(days=weekday)
+            elif prefix == '下':
+                day = monday + timedelta(days=7 + weekday)
+            elif prefix == '下下':
+                day = monday + timedelta(days=14 + weekday)
+            elif prefix == '上':
+                day = monday + timedelta(days=weekday - 7)
+            else:
+                # 單說「週五」指下一個週五（含今天）
+                day = today + timedelta(days=(weekday - today.weekday()) % 7)
+    if day is None:
+        match = _IN_DAYS.search(text)
+        if match:
+            day = today + timedelta(days=_number(match.group(1)))
+    if day is None:
+        match = _SLASH_DATE.search(text)
+        if match:
+            year = int(match.group(1)) if match.group(1) else today.year
+            try:
+                day = date(year, int(match.group(2)), int(match.group(3)))
+            except ValueError:
+                return None
+            # 沒寫年份且日期已過時視為明年
+            if not match.group(1) and day < today:
+                day = day.replace(year=year + 1)
+
+    moment = _time_of_day(text)
+    if day is None:
+        if moment is None:
+            return None
+        # 只有時間時取今天，已過則取明天
+        day = today if moment > now.time() else today + timedelta(days=1)
+    return datetime.combine(day, moment or DEFAULT_DUE_TIME).astimezone()
+
+def _normalize(task: Dict[str, Any], now: Optional[datetime]) -> Dict[str, Any]:
+    for field in ('description', 'assignee', 'due_date'):
+        if task.get(field) == '':
+            task.pop(field)
+    if 'due_date' in task:
+        task['due_date_text'] = task['due_date']
+        task['due_date'] = parse_due_date(task['due_date'], now)
+    return task
+
+def _decode(raw: Any) -> Any:
+    if isinstance(raw, (dict, list)):
+        return raw
+    try:
+        return _loads(raw)
+    except ValueError as e:
+        raise ExtractionError(f"Invalid JSON: {e}")
+
+def _alias_priority(item: Any) -> None:
+    if isinstance(item, dict) and isinstance(item.get('priority'), str):
+        item['priority'] = PRIORITY_ALIASES.get(item['priority'].strip().lower(), item['priority'])
+
+def parse_task_arguments(raw: Any, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    解析 extract_task 的函式呼叫參數；不是任務時回傳 None，格式錯誤時拋出 ExtractionError
+    """
+    data = _decode(raw)
+    if data is None:
+        return None
+    _alias_priority(data)
+    task = _validate_task(data, '$')
+    if not task['is_task']:
+        return None
+    return _normalize(task, now)
+
+def parse_batch_arguments(raw: Any, count: int, now: Optional[datetime] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    解析 extract_tasks 的函式呼叫參數，依訊息順序回傳結果；沒有結果的訊息為 None
+    """
+    data = _decode(raw)
+    if isinstance(data, dict):
+        for item in data.get('tasks') or ():
+            _alias_priority(item)
+    results: List[Optional[Dict[str, Any]]] = [None] * count
+    for item in _validate_batch(data, '$')['tasks']:
+        index = item.pop('index')
+        if 0 <= index < count and item['is_task']:
+            results[index] = _normalize(item, now)
+    return results
@@ -1,45 +1,31 @@
 from linebot.models import TextSendMessage, FlexSendMessage
 from app.services.openai_service import generate_task_summary
-from app.services.database_service import (
-    get_user_tasks, get_weekly_tasks, get_task_flow,
-    get_user_info, save_user, update_task_status
-)
+from app.services.database_service import sync_db
+from app.services.router_service import Intent, Router
 import json
 
 def handle_message(event, line_bot_api):
     """
-    處理使用者的指令
+    處理使用者的指令（同步函式，需透過 run_in_thread 在執行緒中呼叫）
     """
-    command = event.message.text.lower()
+    match = router.match(event.message.text)
     user_id = event.source.user_id
     
     # 檢查是否為新用戶
-    user_info = get_user_info(user_id)
-    if not user_info and not command.startswith('/自我介紹'):
+    user_info = sync_db.get_user_info(user_id)
+    if not user_info and (match is None or match.intent.requires_registration):
         line_bot_api.reply_message(
             event.reply_token,
             TextSendMessage(text="歡迎使用！請先輸入 /自我介紹 來完成註冊。")
         )
         return
     
-    if command.startswith('/自我介紹'):
-        handle_introduction(event, line_bot_api)
-    elif "這個誰做" in command:
-        handle_unassigned_tasks(event, line_bot_api)
-    elif "報表交了沒" in command:
-        handle_report_status(event, line_bot_api)
-    elif "昨天說的行銷簡報" in command:
-        handle_specific_task(event, line_bot_api)
-    elif "這週的事" in command:
-        handle_weekly_report(event, line_bot_api)
-    elif "我的任務" in command:
-        handle_my_tasks(event, line_bot_api, user_id)
-    elif "部門任務" in command:
-        handle_department_tasks(event, line_bot_api, user_info['department'])
-    else:
-        show_help(event, line_bot_api)
+    if match is None:
+        show_help(event, line_bot_api, user_info)
+        return
+    match.intent.handler(event, line_bot_api, user_info, **match.args)
 
-def handle_introduction(event, line_bot_api):
+def handle_introduction(event, line_bot_api, user_info=None, **_):
     """
     處理用戶自我介紹
     """
@@ -60,7 +46,7 @@ def handle_introduction(event, line_bot_api):
             'title': parts[3].split('：')[1].strip()
         }
         
-        save_user(user_info)
+        sync_db.save_user(user_info)
         line_bot_api.reply_message(
             event.reply_token,
             TextSendMessage(text=f"歡迎 {user_info['name']}！註冊成功！")
@@ -72,11 +58,11 @@ def handle_introduction(event, line_bot_api):
             TextSendMessage(text="註冊失敗，請檢查格式後重試。")
         )
 
-def handle_unassigned_tasks(event, line_bot_api):
+def handle_unassigned_tasks(event, line_bot_api, user_info=None, **_):
     """
     處理未指派任務查詢
     """
-    tasks = get_user_tasks(status="未指派")
+    tasks = sync_db.get_user_tasks(status="未指派")
     if tasks:
         response = generate_task_summary(tasks)
         line_bot_api.reply_message(
@@ -89,45 +75,45 @@ def handle_unassigned_tasks(event, line_bot_api):
             TextSendMessage(text="目前沒有未指派的任務。")
         )
 
-def handle_report_status(event, line_bot_api):
+def handle_report_status(event, line_bot_api, user_info=None, keyword="報表", **_):
     """
-    處理報表狀態查詢
+    處理報表狀態查詢，keyword 為「XX交了沒」中的 XX
     """
-    tasks = get_user_tasks(keyword="報表")
+    tasks = sync_db.get_user_tasks(keyword=keyword)
     if tasks:
         response = generate_task_summary(tasks)
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text=f"📊 報表狀態：\n\n{response}")
+            TextSendMessage(text=f"📊 {keyword}狀態：\n\n{response}")
         )
     else:
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="沒有找到相關的報表任務。")
+            TextSendMessage(text=f"沒有找到相關的{keyword}任務。")
         )
 
-def handle_specific_task(event, line_bot_api):
+def handle_specific_task(event, line_bot_api, user_info=None, keyword="", **_):
     """
-    處理特定任務查詢
+    處理特定任務查詢，keyword 為「XX是誰接的」中的 XX
     """
-    tasks = get_user_tasks(keyword="行銷簡報")
+    tasks = sync_db.get_user_tasks(keyword=keyword)
     if tasks:
         response = generate_task_summary(tasks)
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text=f"📝 行銷簡報任務：\n\n{response}")
+            TextSendMessage(text=f"📝 {keyword}任務：\n\n{response}")
         )
     else:
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="沒有找到相關的行銷簡報任務。")
+            TextSendMessage(text=f"沒有找到相關的{keyword}任務。")
         )
 
-def handle_weekly_report(event, line_bot_api):
+def handle_weekly_report(event, line_bot_api, user_info=None, **_):
     """
     處理週報生成
     """
-    tasks = get_weekly_tasks()
+    tasks = sync_db.get_weekly_tasks()
     if tasks:
         response = generate_task_summary(tasks)
         line_bot_api.reply_message(
@@ -140,11 +126,11 @@ def handle_weekly_report(event, line_bot_api):
             TextSendMessage(text="本週目前沒有任務記錄。")
         )
 
-def handle_my_tasks(event, line_bot_api, user_id):
+def handle_my_tasks(event, line_bot_api, user_info=None, **_):
     """
     處理個人任務查詢
     """
-    tasks = get_user_tasks(assignee=user_id)
+    tasks = sync_db.get_user_tasks(assignee=event.source.user_id)
     if tasks:
         response = generate_task_summary(tasks)
         line_bot_api.reply_message(
@@ -157,11 +143,13 @@ def handle_my_tasks(event, line_bot_api, user_id):
             TextSendMessage(text="您目前沒有負責的任務。")
         )
 
-def handle_department_tasks(event, line_bot_api, department):
+def handle_department_tasks(event, line_bot_api, user_info=None, department=None, **_):
     """
-    處理部門任務查詢
+    處理部門任務查詢，未指定部門時查詢使用者所屬部門
     """
-    tasks = get_user_tasks(department=department)
+    if not department or department in OWN_DEPARTMENT_WORDS:
+        department = user_info['department']
+    tasks = sync_db.get_user_tasks(department=department)
     if tasks:
         response = generate_task_summary(tasks)
         line_bot_api.reply_message(
@@ -174,17 +162,17 @@ def handle_department_tasks(event, line_bot_api, department):
             TextSendMessage(text=f"{department}部門目前沒有進行中的任務。")
         )
 
-def show_help(event, line_bot_api):
+def show_help(event, line_bot_api, user_info=None, **_):
     """
     顯示幫助訊息
     """
     help_text = """🤖 我可以幫你：
 1. 查詢未指派任務 (@AI 這個誰做？)
-2. 確認報表狀態 (@AI 報表交了沒)
+2. 確認報表狀態 (@AI 報表交了沒、@AI 預算表交了沒)
 3. 查詢特定任務 (@AI 昨天說的行銷簡報是誰接的？)
 4. 生成週報 (@AI 這週的事)
 5. 查看我的任務 (@AI 我的任務)
-6. 查看部門任務 (@AI 部門任務)
+6. 查看部門任務 (@AI 部門任務、@AI 業務部門任務)
 
 📝 其他指令：
 - /自我介紹：註冊新用戶
@@ -202,4 +190,19 @@ def send_broadcast_message(line_bot_api, user_id: str, message: str):
     try:
         line_bot_api.push_message(user_id, TextSendMessage(text=message))
     except Exception as e:
-        print(f"Error sending broadcast message: {e}") 
\ No newline at end of file
+        print(f"Error sending broadcast message: {e}")
+
+# 「我們部門任務」等說法指的是使用者自己的部門
+OWN_DEPARTMENT_WORDS = {'我', '我的', '我們', '我們的', '本', '自己'}
+
+# 指令與意圖註冊表：新增指令時只需在此加入一筆
+router = Router([
+    Intent('introduction', ['/自我介紹'], handle_introduction, priority=100, command=True, requires_registration=False),
+    Intent('help', ['/幫助', '/help'], show_help, priority=100, command=True),
+    Intent('unassigned_tasks', ['這個誰做', '沒人做'], handle_unassigned_tasks),
+    Intent('report_status', ['{keyword}交了沒', '{keyword}交了嗎'], handle_report_status),
+    Intent('specific_task', ['說的{keyword}是誰接的', '{keyword}是誰接的', '{keyword}誰負責', '昨天說的{keyword}'], handle_specific_task),
+    Intent('weekly_report', ['這週的事', '本週的事'], handle_weekly_report),
+    Intent('my_tasks', ['我的任務'], handle_my_tasks, priority=10),
+    Intent('department_tasks', ['部門任務', '{department}部門任務'], handle_department_tasks)
+])
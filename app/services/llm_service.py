@@ -0,0 +1,445 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from app.services.client_service import clients
+from app.services.metrics_service import Histogram, Sample, metrics
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, Any]]
+
+class LLMError(Exception):
+    """LLM 呼叫失敗"""
+    pass
+
+class CircuitOpenError(LLMError):
+    """斷路器開啟中，暫停呼叫上游"""
+    pass
+
+class LLMResult:
+    __slots__ = ('text', 'function_arguments', 'prompt_tokens', 'completion_tokens', 'degraded')
+
+    def __init__(
+        self,
+        text: str = '',
+        function_arguments: Optional[str] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        degraded: bool = False
+    ):
+        self.text = text
+        self.function_arguments = function_arguments
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        # 斷路或失敗時回傳的預設內容
+        self.degraded = degraded
+
+class OpenAIBackend:
+    """OpenAI v1 非同步客戶端，重試由 LLMClient 處理"""
+
+    def __init__(self, api_key: Optional[str] = None):
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'), max_retries=0)
+
+    async def complete(self, messages: Messages, **params) -> LLMResult:
+        response = await self.client.chat.completions.create(messages=messages, **params)
+        message = response.choices[0].message
+        function_call = getattr(message, 'function_call', None)
+        usage = getattr(response, 'usage', None)
+        return LLMResult(
+            text=message.content or '',
+            function_arguments=function_call.arguments if function_call else None,
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0),
+            completion_tokens=getattr(usage, 'completion_tokens', 0)
+        )
+
+    async def stream(self, messages: Messages, **params) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(messages=messages, stream=True, **params)
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+def parse_latency(spec: str):
+    """
+    解析延遲分佈：fixed:秒、uniform:最小,最大、lognormal:中位數,sigma、exp:平均
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v]
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if kind == 'exp':
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+TASK_HINTS = ('請', '負責', '完成', '截止', '任務', '交給', '處理')
+
+class StubBackend:
+    """
+    本機的決定性 LLM 替身，用於離線壓力測試
+
+    回覆內容只取決於提示，延遲與錯誤率依設定的分佈隨機產生。
+    """
+
+    def __init__(
+        self,
+        latency: Optional[str] = None,
+        error_rate: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency = parse_latency(latency or os.getenv('LLM_STUB_LATENCY', 'lognormal:0.8,0.5'))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv('LLM_STUB_ERROR_RATE', '0'))
+        self.tokens_per_second = tokens_per_second or float(os.getenv('LLM_STUB_TOKENS_PER_SECOND', '50'))
+        self.rng = random.Random(seed if seed is not None else int(os.getenv('LLM_STUB_SEED', '0')))
+        self.calls = 0
+
+    @staticmethod
+    def _answer(messages: Messages, params: Dict[str, Any]) -> LLMResult:
+        prompt = messages[-1]['content'] if messages else ''
+        if params.get('functions'):
+            def extract(text: str) -> Dict[str, Any]:
+                is_task = any(hint in text for hint in TASK_HINTS)
+                if not is_task:
+                    return {'is_task': False}
+                return {'is_task': True, 'description': text[-50:], 'assignee': '', 'due_date': '', 'priority': '中'}
+
+            if params['functions'][0].get('name') == 'extract_tasks':
+                # 批次提取：每行「[編號] 訊息」
+                lines = re.findall(r'^\[(\d+)\] (.*)$', prompt, re.MULTILINE)
+                arguments = {'tasks': [{'index': int(i), **extract(text)} for i, text in lines]}
+            else:
+                arguments = extract(prompt.rpartition('訊息：')[2])
+            return LLMResult(function_arguments=json.dumps(arguments, ensure_ascii=False))
+        max_tokens = params.get('max_tokens')
+        if max_tokens and max_tokens <= 10:
+            # 相關性判斷這類短回答
+            return LLMResult(text='yes')
+        digest = hashlib.md5(prompt.encode('utf-8')).hexdigest()[:8]
+        return LLMResult(text=f"（測試回覆 {digest}）已收到您的訊息。我會協助整理相關任務與進度。\n如需查看任務，請輸入 /tasks。")
+
+    async def _delay(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency(self.rng)))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise LLMError("Stub backend injected failure")
+
+    async def complete(self, messages: Messages, **params) -> LLMResult:
+        await self._delay()
+        result = self._answer(messages, params)
+        result.prompt_tokens = sum(len(m.get('content') or '') for m in messages)
+        result.completion_tokens = len(result.text or result.function_arguments or '')
+        return result
+
+    async def stream(self, messages: Messages, **params) -> AsyncIterator[str]:
+        await self._delay()
+        text = self._answer(messages, params).text
+        for i in range(0, len(text), 2):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield text[i:i + 2]
+
+def create_backend(name: Optional[str] = None):
+    """依 LLM_BACKEND 建立後端：openai 或 stub"""
+    name = (name or os.getenv('LLM_BACKEND', 'openai')).lower()
+    if name == 'stub':
+        return StubBackend()
+    return OpenAIBackend()
+
+# 依 LLM_BACKEND 建立，openai SDK 在建立 OpenAIBackend 時才匯入
+clients.register('llm', create_backend)
+
+class CircuitBreaker:
+    """
+    連續失敗達門檻後開啟，冷卻後放行一次試探請求，成功才關閉
+    """
+
+    def __init__(self, failure_threshold: int, recovery_time: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if self.half_open else 'open'
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.recovery_time:
+            # 每個冷卻期間只放行一個試探請求
+            self.half_open = True
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.half_open = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.half_open or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            self.half_open = False
+
+RETRYABLE_ERRORS = ('APIConnectionError', 'APITimeoutError', 'RateLimitError', 'InternalServerError')
+
+def _retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return type(error).__name__ in RETRYABLE_ERRORS or isinstance(error, LLMError)
+
+class LLMClient:
+    """
+    統一的非同步 LLM 客戶端
+
+    每次呼叫有總時限（deadline），時限內以帶抖動的指數退避重試；短的呼叫
+    可開啟 hedging，第一個請求超過 LLM_HEDGE_DELAY 仍未回應時再送一個，取先
+    完成者。連續失敗會開啟斷路器，斷路期間直接回傳呼叫端提供的預設內容。
+    """
+
+    def __init__(
+        self,
+        backend: Any = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        hedge_delay: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        recovery_time: Optional[float] = None
+    ):
+        self._backend = backend
+        self.timeout = timeout or float(os.getenv('LLM_TIMEOUT', '30'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('LLM_MAX_RETRIES', '2'))
+        self.hedge_delay = hedge_delay or float(os.getenv('LLM_HEDGE_DELAY', '1.0'))
+        self.first_token_timeout = float(os.getenv('LLM_FIRST_TOKEN_TIMEOUT', '15'))
+        self.chunk_timeout = float(os.getenv('LLM_CHUNK_TIMEOUT', '15'))
+        self.stream_deadline = float(os.getenv('LLM_STREAM_DEADLINE', '120'))
+        self.breaker = CircuitBreaker(
+            failure_threshold or int(os.getenv('LLM_BREAKER_THRESHOLD', '5')),
+            recovery_time or float(os.getenv('LLM_BREAKER_RECOVERY', '30'))
+        )
+        self.latency: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def backend(self) -> Any:
+        if self._backend is None:
+            self._backend = clients.get('llm')
+        return self._backend
+
+    def _count(self, purpose: str, key: str, amount: int = 1) -> None:
+        counters = self.counters.setdefault(purpose, {
+            'calls': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+            'timeouts': 0, 'failures': 0, 'degraded': 0,
+            'prompt_tokens': 0, 'completion_tokens': 0
+        })
+        counters[key] += amount
+
+    async def _hedged(self, purpose: str, call) -> LLMResult:
+        first = asyncio.ensure_future(call())
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        if done:
+            return first.result()
+        self._count(purpose, 'hedges')
+        second = asyncio.ensure_future(call())
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count(purpose, 'hedge_wins')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (first, second):
+                task.cancel()
+
+    def _degrade(self, purpose: str, fallback: Optional[str], error: BaseException) -> LLMResult:
+        if fallback is None:
+            raise error if isinstance(error, LLMError) else LLMError(str(error) or type(error).__name__)
+        self._count(purpose, 'degraded')
+        return LLMResult(text=fallback, degraded=True)
+
+    async def complete(
+        self,
+        messages: Messages,
+        purpose: str = 'chat',
+        deadline: Optional[float] = None,
+        hedge: bool = False,
+        fallback: Optional[str] = None,
+        **params
+    ) -> LLMResult:
+        """
+        呼叫模型；失敗或斷路時若有 fallback 則回傳 degraded 的預設內容，否則拋出 LLMError
+        """
+        self._count(purpose, 'calls')
+        if not self.breaker.allow():
+            return self._degrade(purpose, fallback, CircuitOpenError("LLM circuit breaker is open"))
+
+        started = time.monotonic()
+        budget = deadline or self.timeout
+        last_error: BaseException = LLMError("No attempt made")
+        for attempt in range(self.max_retries + 1):
+            remaining = budget - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            call = lambda timeout=remaining: self.backend.complete(messages, timeout=timeout, **params)
+            try:
+                if hedge:
+                    result = await asyncio.wait_for(self._hedged(purpose, call), timeout=remaining)
+                else:
+                    result = await asyncio.wait_for(call(), timeout=remaining)
+                self.breaker.record_success()
+                self.latency.setdefault(purpose, Histogram()).observe(time.monotonic() - started)
+                self._count(purpose, 'prompt_tokens', result.prompt_tokens or 0)
+                self._count(purpose, 'completion_tokens', result.completion_tokens or 0)
+                return result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                last_error = e
+                if isinstance(e, asyncio.TimeoutError):
+                    self._count(purpose, 'timeouts')
+                if not _retryable(e) or attempt == self.max_retries:
+                    break
+                self._count(purpose, 'retries')
+                delay = min(2 ** attempt * 0.5, 8) * (0.5 + random.random() / 2)
+                remaining = budget - (time.monotonic() - started)
+                if delay >= remaining:
+                    break
+                await asyncio.sleep(delay)
+
+        self._count(purpose, 'failures')
+        # 請求本身有誤（4xx）不代表上游異常，不計入斷路器
+        if _retryable(last_error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        logger.error(f"LLM call for {purpose} failed: {last_error!r}")
+        return self._degrade(purpose, fallback, last_error)
+
+    async def stream(
+        self,
+        messages: Messages,
+        purpose: str = 'chat',
+        fallback: Optional[str] = None,
+        **params
+    ) -> AsyncIterator[str]:
+        """
+        以串流方式呼叫模型；第一個片段前失敗時依 fallback 降級，之後的錯誤或逾時拋出 LLMError
+        """
+        self._count(purpose, 'calls')
+        if not self.breaker.allow():
+            result = self._degrade(purpose, fallback, CircuitOpenError("LLM circuit breaker is open"))
+            yield result.text
+            return
+
+        started = time.monotonic()
+        try:
+            iterator = self.backend.stream(messages, timeout=self.timeout, **params).__aiter__()
+            first = await asyncio.wait_for(iterator.__anext__(), timeout=self.first_token_timeout)
+        except StopAsyncIteration:
+            self.breaker.record_success()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stream_failed(purpose, e)
+            yield self._degrade(purpose, fallback, e).text
+            return
+
+        self.latency.setdefault(f"{purpose}_first_token", Histogram()).observe(time.monotonic() - started)
+        yield first
+        # 之後每個片段都有間隔時限，整段串流另有總時限
+        deadline_at = started + self.stream_deadline
+        while True:
+            remaining = deadline_at - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                delta = await asyncio.wait_for(iterator.__anext__(), timeout=min(self.chunk_timeout, remaining))
+            except StopAsyncIteration:
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stream_failed(purpose, e)
+                aclose = getattr(iterator, 'aclose', None)
+                if aclose is not None:
+                    try:
+                        await aclose()
+                    except Exception:
+                        pass
+                if isinstance(e, LLMError):
+                    raise
+                raise LLMError(str(e) or type(e).__name__) from e
+            yield delta
+        # 整段完成才算成功，中途失敗的串流不會重設連續失敗次數
+        self.breaker.record_success()
+        self.latency.setdefault(purpose, Histogram()).observe(time.monotonic() - started)
+
+    def _stream_failed(self, purpose: str, error: BaseException) -> None:
+        if isinstance(error, asyncio.TimeoutError):
+            self._count(purpose, 'timeouts')
+        self._count(purpose, 'failures')
+        # 與 complete 相同，請求本身有誤時不計入斷路器
+        if _retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        logger.error(f"LLM stream for {purpose} failed: {error!r}")
+
+    def stats(self) -> dict:
+        """輸出各用途的呼叫統計、延遲與斷路器狀態"""
+        return {
+            'backend': type(self._backend).__name__ if self._backend is not None else None,
+            'breaker': {'state': self.breaker.state, 'failures': self.breaker.failures, 'trips': self.breaker.trips},
+            'calls': self.counters,
+            'latency': {purpose: histogram.snapshot() for purpose, histogram in self.latency.items()}
+        }
+
+    def collect(self) -> Iterable[Sample]:
+        """輸出各用途的呼叫次數、token 用量與延遲"""
+        yield ('llm_breaker_open', 'gauge', 'LLM 斷路器是否開啟', {}, int(self.breaker.state == 'open'))
+        for purpose, counters in list(self.counters.items()):
+            for key, value in counters.items():
+                if key.endswith('_tokens'):
+                    labels = {'purpose': purpose, 'kind': key[:-len('_tokens')]}
+                    yield ('llm_tokens_total', 'counter', 'LLM 回報的 token 用量', labels, value)
+                else:
+                    yield (f'llm_{key}_total', 'counter', f'LLM {key} 次數', {'purpose': purpose}, value)
+        for purpose, histogram in list(self.latency.items()):
+            yield ('llm_duration_seconds', 'histogram', 'LLM 呼叫耗時', {'purpose': purpose}, histogram)
+
+# 全域共用的 LLM 客戶端，後端在第一次呼叫時建立
+llm_client = LLMClient()
+metrics.register(llm_client.collect)
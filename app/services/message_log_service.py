@@ -0,0 +1,291 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.metrics_service import Histogram
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 緩衝中的一筆資料：(資料表, 欄位)
+Row = Tuple[str, Dict[str, Any]]
+
+# 落地資料的重送檢查間隔（秒）
+REPLAY_INTERVAL = 10.0
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class MessageLogWriter:
+    """
+    訊息紀錄的 write-behind 緩衝寫入器
+
+    訊息先寫入記憶體緩衝與磁碟上的 JSONL 區段檔，達到筆數或時間門檻時
+    以單次批次 insert 寫入資料庫。寫入失敗會以指數退避重試，仍失敗則
+    保留在區段檔中，待資料庫恢復或下次啟動時重送。
+    """
+
+    def __init__(
+        self,
+        insert: Callable[[str, List[Dict[str, Any]]], Awaitable[Any]],
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        spill_dir: Optional[str] = None
+    ):
+        self.insert = insert
+        self.batch_size = batch_size or int(os.getenv('MESSAGE_LOG_BATCH_SIZE', '200'))
+        self.flush_interval = flush_interval or float(os.getenv('MESSAGE_LOG_FLUSH_INTERVAL', '0.5'))
+        self.max_retries = max_retries if max_retries is not None else \
+            int(os.getenv('MESSAGE_LOG_MAX_RETRIES', '5'))
+        self.spill_dir = spill_dir if spill_dir is not None else \
+            os.getenv('MESSAGE_LOG_SPILL_DIR', 'message_spill')
+
+        self._buffer: List[Row] = []
+        self._segment = None
+        self._segment_path: Optional[str] = None
+        self._sequence = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._next_replay = 0.0
+
+        # 統計
+        self.flush_time = Histogram()
+        self.added = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.spilled = 0
+        self.replayed = 0
+
+    async def start(self) -> None:
+        """啟動背景 flush 工作"""
+        self._ensure_started()
+
+    def _ensure_started(self) -> bool:
+        if self._task is not None:
+            return True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        if self.spill_dir:
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                self._recover_orphans()
+            except OSError as e:
+                logger.error(f"Error preparing spill dir, spilling disabled: {e}")
+                self.spill_dir = ''
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    def add(self, table: str, row: Dict[str, Any]) -> None:
+        """
+        加入一筆待寫入資料，不等待資料庫
+        """
+        if not self._ensure_started():
+            logger.warning("Message log writer used outside an event loop")
+        self._buffer.append((table, row))
+        self._write_segment(table, row)
+        self.added += 1
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing message log: {e}")
+
+    async def flush(self) -> None:
+        """將緩衝中的資料批次寫入資料庫"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._buffer:
+                rows, self._buffer = self._buffer, []
+                segment = self._rotate_segment()
+                failed = await self._write(rows)
+                if failed:
+                    self.spilled += len(failed)
+                    self._spill(failed)
+                    self._next_replay = time.monotonic() + REPLAY_INTERVAL
+                if segment:
+                    self._remove(segment)
+            # 定期檢查是否有落地資料需要重送
+            if time.monotonic() >= self._next_replay:
+                self._next_replay = time.monotonic() + REPLAY_INTERVAL
+                await self._replay_pending()
+
+    async def close(self) -> None:
+        """關閉前寫出所有緩衝資料"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+            self._remove(self._segment_path)
+        logger.info(f"Message log writer closed: {self.stats()}")
+
+    async def _write(self, rows: List[Row]) -> List[Row]:
+        """
+        依資料表與欄位分組批次寫入，回傳最終仍失敗的資料
+        """
+        # PostgREST 的批次 insert 要求每筆欄位一致
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        for table, row in rows:
+            groups.setdefault((table, tuple(sorted(row))), []).append(row)
+
+        failed: List[Row] = []
+        for (table, _), group in groups.items():
+            started = time.monotonic()
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await self.insert(table, group)
+                    self.written += len(group)
+                    self.batches += 1
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        logger.error(f"Error writing {len(group)} rows to {table}: {e}")
+                        failed.extend((table, row) for row in group)
+                        break
+                    self.retries += 1
+                    delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+                    await asyncio.sleep(delay)
+            self.flush_time.observe(time.monotonic() - started)
+        return failed
+
+    def _write_segment(self, table: str, row: Dict[str, Any]) -> None:
+        # 先寫入磁碟，程式崩潰時仍可從區段檔還原
+        if not self.spill_dir:
+            return
+        try:
+            if self._segment is None:
+                self._segment_path = os.path.join(self.spill_dir, f'current-{os.getpid()}.jsonl')
+                self._segment = open(self._segment_path, 'a', encoding='utf-8')
+            self._segment.write(json.dumps({'table': table, 'row': row}, ensure_ascii=False, default=str) + '\n')
+            self._segment.flush()
+        except OSError as e:
+            logger.error(f"Error writing spill segment: {e}")
+
+    def _rotate_segment(self) -> Optional[str]:
+        """將目前的區段檔改名，回傳改名後的路徑"""
+        if self._segment is None:
+            return None
+        self._segment.close()
+        self._segment = None
+        self._sequence += 1
+        path = os.path.join(self.spill_dir, f'flushing-{os.getpid()}-{self._sequence}.jsonl')
+        try:
+            os.replace(self._segment_path, path)
+        except OSError as e:
+            logger.error(f"Error rotating spill segment: {e}")
+            return None
+        return path
+
+    def _spill(self, rows: List[Row]) -> None:
+        if not self.spill_dir:
+            logger.error(f"Dropping {len(rows)} message rows, spilling disabled")
+            return
+        path = self._pending_path()
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                for table, row in rows:
+                    f.write(json.dumps({'table': table, 'row': row}, ensure_ascii=False, default=str) + '\n')
+        except OSError as e:
+            logger.error(f"Error spilling message rows: {e}")
+
+    def _pending_path(self) -> str:
+        self._sequence += 1
+        return os.path.join(
+            self.spill_dir,
+            f'pending-{int(time.time() * 1000)}-{os.getpid()}-{self._sequence}.jsonl'
+        )
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.error(f"Error removing spill segment: {e}")
+
+    def _recover_orphans(self) -> None:
+        """將已結束行程留下的區段檔轉為待重送檔"""
+        for path in glob.glob(os.path.join(self.spill_dir, '*.jsonl')):
+            name = os.path.basename(path)
+            if name.startswith('pending-'):
+                continue
+            try:
+                pid = int(name.split('-')[1].split('.')[0])
+            except (IndexError, ValueError):
+                continue
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            try:
+                os.replace(path, self._pending_path())
+            except OSError as e:
+                logger.error(f"Error recovering spill segment {path}: {e}")
+
+    async def _replay_pending(self) -> None:
+        """重送磁碟上尚未寫入的資料"""
+        if not self.spill_dir:
+            return
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, 'pending-*.jsonl'))):
+            # 以改名取得檔案，避免多個 worker 重複重送
+            claimed = os.path.join(self.spill_dir, f'replaying-{os.getpid()}-{os.path.basename(path)}')
+            try:
+                os.replace(path, claimed)
+            except OSError:
+                continue
+            try:
+                with open(claimed, encoding='utf-8') as f:
+                    rows = [
+                        (record['table'], record['row'])
+                        for record in map(json.loads, filter(None, map(str.strip, f)))
+                    ]
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading spill segment {path}: {e}")
+                continue
+            failed = await self._write(rows)
+            self._remove(claimed)
+            if failed:
+                # 資料庫仍無法寫入，寫回待重送檔後停止
+                self._spill(failed)
+                break
+            self.replayed += len(rows)
+
+    def stats(self) -> dict:
+        """輸出緩衝與寫入統計"""
+        return {
+            'buffered': len(self._buffer),
+            'added': self.added,
+            'written': self.written,
+            'batches': self.batches,
+            'retries': self.retries,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'flush_time': self.flush_time.snapshot()
+        }
@@ -0,0 +1,275 @@
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 預設延遲桶位（單位：秒）
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# 處理階段的延遲桶位，快取命中等次毫秒的階段也能分辨
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005) + DEFAULT_BUCKETS
+
+class Histogram:
+    """
+    固定桶位的直方圖，用於統計延遲與等待時間
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # 最後一格為 +Inf 桶
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """記錄一筆觀測值"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """
+        估算百分位數，回傳該名次所在桶位的上界
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if i < len(self.buckets):
+                    return min(self.buckets[i], self.max)
+                return self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        """輸出統計摘要"""
+        return {
+            'count': self.count,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max
+        }
+
+class Counter:
+    """只增不減的計數器"""
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        self.value += amount
+
+class Gauge:
+    """可增可減的數值，例如進行中的數量"""
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: Union[int, float] = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: Union[int, float]) -> None:
+        self.value = value
+
+class _Span:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage: 'Stage'):
+        self.stage = stage
+
+    def __enter__(self) -> '_Span':
+        self.stage.in_flight += 1
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        stage = self.stage
+        stage.latency.observe(time.perf_counter() - self.started)
+        stage.in_flight -= 1
+        if exc_type is not None and issubclass(exc_type, Exception):
+            stage.errors += 1
+
+class Stage:
+    """
+    一個處理階段的延遲直方圖、進行中數量與錯誤次數
+
+    以 `with stage.span():` 包住一段程式，或以 `@stage` 裝飾函式；
+    兩者都只有兩次 perf_counter 與一次桶位查找的額外成本。
+    """
+    __slots__ = ('name', 'latency', 'in_flight', 'errors')
+
+    def __init__(self, name: str, buckets: Sequence[float] = STAGE_BUCKETS):
+        self.name = name
+        self.latency = Histogram(buckets)
+        self.in_flight = 0
+        self.errors = 0
+
+    def span(self) -> _Span:
+        return _Span(self)
+
+    def __call__(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        stage = self
+        observe = self.latency.observe
+        perf_counter = time.perf_counter
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                stage.in_flight += 1
+                started = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    stage.errors += 1
+                    raise
+                finally:
+                    observe(perf_counter() - started)
+                    stage.in_flight -= 1
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stage.in_flight += 1
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                stage.errors += 1
+                raise
+            finally:
+                observe(perf_counter() - started)
+                stage.in_flight -= 1
+        return wrapper
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.latency.snapshot(), 'in_flight': self.in_flight, 'errors': self.errors}
+
+# 指標樣本：(名稱, 類型, 說明, 標籤, 數值或直方圖)
+Sample = Tuple[str, str, str, Dict[str, str], Union[int, float, Histogram]]
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(labels: Dict[str, str], extra: str = '') -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels.items()]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _number(value: Union[int, float]) -> str:
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """
+    行程內的指標登錄表，輸出 Prometheus 文字格式
+
+    處理階段、計數器與 gauge 直接在此建立；各元件既有的直方圖與計數
+    則以 collector 在輸出時讀取，不需重複記錄。
+    """
+
+    def __init__(self, namespace: str = 'linebot'):
+        self.namespace = namespace
+        self.stages: Dict[str, Stage] = {}
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Tuple[str, str, Any]] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def stage(self, name: str) -> Stage:
+        """取得（或建立）處理階段"""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name)
+        return stage
+
+    def _get(self, kind: str, factory: Callable[[], Any], name: str, help: str, labels: Dict[str, str]) -> Any:
+        key = (name, tuple(sorted(labels.items())))
+        entry = self._metrics.get(key)
+        if entry is None:
+            entry = self._metrics[key] = (kind, help, factory())
+        return entry[2]
+
+    def counter(self, name: str, help: str = '', **labels: str) -> Counter:
+        return self._get('counter', Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = '', **labels: str) -> Gauge:
+        return self._get('gauge', Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str = '', buckets: Sequence[float] = DEFAULT_BUCKETS, **labels: str) -> Histogram:
+        return self._get('histogram', lambda: Histogram(buckets), name, help, labels)
+
+    def register(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """登錄輸出時呼叫的 collector，回傳 Sample 序列"""
+        self._collectors.append(collector)
+
+    def samples(self) -> Iterable[Sample]:
+        for stage in self.stages.values():
+            labels = {'stage': stage.name}
+            yield ('stage_duration_seconds', 'histogram', '各處理階段的耗時', labels, stage.latency)
+            yield ('stage_in_flight', 'gauge', '各處理階段進行中的數量', labels, stage.in_flight)
+            yield ('stage_errors_total', 'counter', '各處理階段拋出例外的次數', labels, stage.errors)
+        for (name, labels), (kind, help, metric) in self._metrics.items():
+            yield (name, kind, help, dict(labels), metric if kind == 'histogram' else metric.value)
+        for collector in self._collectors:
+            try:
+                yield from collector()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+
+    def render(self) -> str:
+        """輸出 Prometheus text exposition format"""
+        families: Dict[str, Tuple[str, str, List[Tuple[Dict[str, str], Any]]]] = {}
+        for name, kind, help, labels, value in self.samples():
+            family = families.get(name)
+            if family is None:
+                family = families[name] = (kind, help, [])
+            family[2].append((labels, value))
+
+        lines: List[str] = []
+        for name, (kind, help, values) in families.items():
+            full_name = f'{self.namespace}_{name}'
+            if help:
+                lines.append(f'# HELP {full_name} {help}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            for labels, value in values:
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(value.buckets, value.counts):
+                        cumulative += count
+                        le = _labels(labels, f'le="{bound}"')
+                        lines.append(f'{full_name}_bucket{le} {cumulative}')
+                    le = _labels(labels, 'le="+Inf"')
+                    lines.append(f'{full_name}_bucket{le} {value.count}')
+                    lines.append(f'{full_name}_sum{_labels(labels)} {_number(value.sum)}')
+                    lines.append(f'{full_name}_count{_labels(labels)} {value.count}')
+                else:
+                    lines.append(f'{full_name}{_labels(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, Any]:
+        """輸出各處理階段的 p50/p95/p99 與進行中數量，供 /stats 使用"""
+        return {name: stage.snapshot() for name, stage in self.stages.items()}
+
+# 全域共用的指標登錄表
+metrics = MetricsRegistry()
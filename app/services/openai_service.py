@@ -1,58 +1,118 @@
-from openai import OpenAI
+import logging
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from app.services.cache_service import response_cache
+from app.services.db_client_service import run_sync
+from app.services.extraction_service import (
+    EXTRACT_TASK_FUNCTION, EXTRACT_TASKS_FUNCTION, parse_batch_arguments, parse_task_arguments
+)
+from app.services.llm_service import llm_client
+from app.services.summary_service import TaskSummarizer, aggregate, project_task
 
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+logger = logging.getLogger(__name__)
 
-def analyze_message(message: str) -> Optional[Dict[str, Any]]:
+summarizer = TaskSummarizer()
+
+# 各用途的呼叫時限（秒）
+EXTRACTION_DEADLINE = float(os.getenv('LLM_EXTRACTION_DEADLINE', '20'))
+SUMMARY_DEADLINE = float(os.getenv('LLM_SUMMARY_DEADLINE', '60'))
+
+SUMMARY_SYSTEM_PROMPT = "你是一個專業的專案管理助手，負責生成任務摘要報告。"
+
+EXTRACTION_SYSTEM_PROMPT = "你是一個任務分析專家，負責從對話中識別出任務相關資訊。"
+
+async def analyze_message(message: str) -> Optional[Dict[str, Any]]:
     """
-    分析訊息是否包含任務，並提取相關資訊
+    分析訊息是否包含任務，並提取相關資訊；due_date 會在本機轉為 datetime
     """
     try:
-        response = client.chat.completions.create(
+        response = await llm_client.complete(
+            purpose="extraction",
+            deadline=EXTRACTION_DEADLINE,
             model="gpt-4",
             messages=[
-                {"role": "system", "content": "你是一個任務分析專家，負責從對話中識別出任務相關資訊。"},
+                {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
                 {"role": "user", "content": f"請分析以下訊息是否包含任務，如果是，請提取：任務描述、負責人、截止日期、優先級。如果不是任務，請回覆 null。\n\n訊息：{message}"}
             ],
-            functions=[{
-                "name": "extract_task",
-                "description": "提取任務相關資訊",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "is_task": {"type": "boolean"},
-                        "description": {"type": "string"},
-                        "assignee": {"type": "string"},
-                        "due_date": {"type": "string"},
-                        "priority": {"type": "string", "enum": ["高", "中", "低"]}
-                    },
-                    "required": ["is_task"]
-                }
-            }],
+            functions=[EXTRACT_TASK_FUNCTION],
             function_call={"name": "extract_task"}
         )
         
-        result = response.choices[0].message.function_call.arguments
-        return eval(result) if result else None
+        result = response.function_arguments
+        return parse_task_arguments(result) if result else None
         
     except Exception as e:
-        print(f"Error analyzing message: {e}")
+        logger.error(f"Error analyzing message: {e}")
         return None
 
-def generate_task_summary(tasks: list) -> str:
+async def analyze_messages(messages: List[str]) -> List[Optional[Dict[str, Any]]]:
     """
-    生成任務摘要報告
+    以單次請求分析多則訊息，依訊息順序回傳結果；不是任務或失敗時為 None
     """
+    if not messages:
+        return []
+    numbered = "\n".join(f"[{i}] {message}" for i, message in enumerate(messages))
     try:
-        response = client.chat.completions.create(
+        response = await llm_client.complete(
+            purpose="extraction_batch",
+            deadline=EXTRACTION_DEADLINE,
             model="gpt-4",
             messages=[
-                {"role": "system", "content": "你是一個專業的專案管理助手，負責生成任務摘要報告。"},
-                {"role": "user", "content": f"請根據以下任務列表生成一份摘要報告：\n\n{tasks}"}
-            ]
+                {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+                {"role": "user", "content": f"以下每則訊息前有編號。請逐則判斷是否包含任務，如果是，請提取：任務描述、負責人、截止日期、優先級，並以 index 標示訊息編號。\n\n{numbered}"}
+            ],
+            functions=[EXTRACT_TASKS_FUNCTION],
+            function_call={"name": "extract_tasks"}
         )
-        return response.choices[0].message.content
+        result = response.function_arguments
+        return parse_batch_arguments(result, len(messages)) if result else [None] * len(messages)
+    except Exception as e:
+        logger.error(f"Error analyzing messages: {e}")
+        return [None] * len(messages)
+
+async def _complete_summary(prompt: str) -> Tuple[str, int, int]:
+    response = await llm_client.complete(
+        [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        purpose="summary",
+        deadline=SUMMARY_DEADLINE,
+        model="gpt-4"
+    )
+    return response.text, response.prompt_tokens, response.completion_tokens
+
+async def summarize_tasks(tasks: List[Dict[str, Any]]) -> str:
+    """
+    以 map-reduce 流程生成任務摘要報告，統計數字在本機計算
+    """
+    if not tasks:
+        return "目前沒有任務。"
+    # 以本機統計與投影後的欄位作為快取鍵，id 與時間戳記不影響命中；統計含依目前時間
+    # 計算的逾期與七天內到期清單，任務跨過到期界線時鍵就不同，不會沿用過時的摘要
+    stats = aggregate(tasks)
+    cache_key = stats + "\n\n" + "\n".join(project_task(task) for task in tasks)
+    cache_params = {"model": "gpt-4", "type": "task_summary"}
+    cached = response_cache.get(cache_key, cache_params, near_duplicate=False)
+    if cached:
+        return cached
+    try:
+        stats, prose = await summarizer.summarize(tasks, _complete_summary, stats=stats)
+    except Exception as e:
+        logger.error(f"Error generating summary: {e}")
+        # 模型失敗時仍回傳本機統計
+        return aggregate(tasks)
+    summary = f"{stats}\n\n{prose}".strip()
+    response_cache.set(cache_key, cache_params, summary, near_duplicate=False)
+    return summary
+
+def generate_task_summary(tasks: list) -> str:
+    """
+    生成任務摘要報告（同步版本，需在執行緒中呼叫）
+    """
+    try:
+        # 在主事件迴圈上執行，與其他呼叫共用 LLM 連線與斷路器；map、合併與 reduce 各預留一段時限
+        return run_sync(summarize_tasks(tasks), timeout=SUMMARY_DEADLINE * 3)
     except Exception as e:
-        print(f"Error generating summary: {e}")
-        return "無法生成摘要報告" 
\ No newline at end of file
+        logger.error(f"Error generating summary: {e}")
+        return "無法生成摘要報告"
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# LINE Messaging API 限制
+MAX_TEXT_LENGTH = 5000
+MAX_MESSAGES_PER_REQUEST = 5
+MAX_MULTICAST_RECIPIENTS = 500
+
+class TokenBucket:
+    """
+    以虛擬排程實作的令牌桶，不綁定事件迴圈
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.interval = 1.0 / rate
+        self.burst = burst
+        self._tat = 0.0
+        self._paused_until = 0.0
+
+    def reserve(self) -> float:
+        """預約一個令牌，回傳需要等待的秒數"""
+        now = time.monotonic()
+        earliest = max(now, self._paused_until)
+        tat = max(self._tat, earliest)
+        wait = max(earliest - now, tat - (self.burst - 1) * self.interval - now)
+        self._tat = tat + self.interval
+        return max(0.0, wait)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """收到 429 時暫停發送"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+def split_text(text: str, limit: int = MAX_TEXT_LENGTH) -> List[str]:
+    """依段落切分文字，確保每則不超過長度限制"""
+    chunks: List[str] = []
+    current = ''
+    for paragraph in text.split('\n'):
+        while len(paragraph) > limit:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(paragraph[:limit])
+            paragraph = paragraph[limit:]
+        candidate = f"{current}\n{paragraph}" if current else paragraph
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+def _is_user_id(recipient: str) -> bool:
+    # multicast 只接受用戶 ID，群組與聊天室仍需逐一 push
+    return recipient.startswith('U')
+
+class PushFanout:
+    """
+    排程通知的推播引擎
+
+    依收件人去重並將同一人的多則提醒合併成一則訊息；內容相同的用戶以
+    multicast（每次最多 500 人）發送，其餘以 push 發送。所有請求在令牌桶
+    限速下並行執行，遇到 429 會依 Retry-After 暫停後重試。
+    """
+
+    def __init__(
+        self,
+        line_bot_api: Any,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None
+    ):
+        self.line_bot_api = line_bot_api
+        self.bucket = TokenBucket(
+            rate or float(os.getenv('PUSH_RATE_PER_SECOND', '100')),
+            burst or int(os.getenv('PUSH_BURST', '20'))
+        )
+        self.concurrency = concurrency or int(os.getenv('PUSH_CONCURRENCY', '10'))
+        self.max_retries = max_retries if max_retries is not None else \
+            int(os.getenv('PUSH_MAX_RETRIES', '3'))
+
+        # 累計統計
+        self.totals: Dict[str, float] = {
+            'deliveries': 0, 'recipients': 0, 'requests': 0, 'multicast_requests': 0,
+            'push_requests': 0, 'failures': 0, 'rate_limited': 0, 'retries': 0
+        }
+        self.last_report: Dict[str, Any] = {}
+
+    @staticmethod
+    def _merge(notifications: Iterable[Tuple[str, str]]) -> 'OrderedDict[str, List[str]]':
+        merged: 'OrderedDict[str, List[str]]' = OrderedDict()
+        for recipient, text in notifications:
+            if not recipient or not text:
+                continue
+            texts = merged.setdefault(recipient, [])
+            # 同一人重複的內容只送一次
+            if text not in texts:
+                texts.append(text)
+        return merged
+
+    def _plan(self, notifications: Iterable[Tuple[str, str]]) -> List[Tuple[str, List[str], Tuple[str, ...]]]:
+        """
+        規劃請求：回傳 (方式, 收件人, 訊息內容) 的列表
+        """
+        by_content: 'OrderedDict[Tuple[str, ...], List[str]]' = OrderedDict()
+        for recipient, texts in self._merge(notifications).items():
+            chunks = tuple(split_text('\n\n'.join(texts)))
+            by_content.setdefault(chunks, []).append(recipient)
+
+        plan = []
+        for chunks, recipients in by_content.items():
+            # 每次請求最多 5 則訊息
+            batches = [chunks[i:i + MAX_MESSAGES_PER_REQUEST] for i in range(0, len(chunks), MAX_MESSAGES_PER_REQUEST)]
+            users = [r for r in recipients if _is_user_id(r)]
+            others = [r for r in recipients if not _is_user_id(r)]
+            if len(users) > 1:
+                for i in range(0, len(users), MAX_MULTICAST_RECIPIENTS):
+                    for batch in batches:
+                        plan.append(('multicast', users[i:i + MAX_MULTICAST_RECIPIENTS], batch))
+            else:
+                others = users + others
+            for recipient in others:
+                for batch in batches:
+                    plan.append(('push', [recipient], batch))
+        return plan
+
+    async def _send(self, method: str, recipients: List[str], texts: Tuple[str, ...], report: Dict[str, Any]) -> None:
+        from linebot.models import TextSendMessage
+        messages = [TextSendMessage(text=text) for text in texts]
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            report['requests'] += 1
+            report[f'{method}_requests'] += 1
+            try:
+                if method == 'multicast':
+                    await asyncio.to_thread(self.line_bot_api.multicast, recipients, messages)
+                else:
+                    await asyncio.to_thread(self.line_bot_api.push_message, recipients[0], messages)
+                return
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                retryable = status == 429 or (status is not None and status >= 500)
+                if not retryable or attempt == self.max_retries:
+                    report['failures'] += len(recipients)
+                    logger.error(f"Error sending {method} to {len(recipients)} recipients: {e}")
+                    return
+                report['retries'] += 1
+                if status == 429:
+                    report['rate_limited'] += 1
+                    headers = getattr(e, 'headers', None) or {}
+                    retry_after = headers.get('Retry-After') or headers.get('retry-after')
+                    try:
+                        delay = float(retry_after)
+                    except (TypeError, ValueError):
+                        delay = 2 ** attempt
+                    self.bucket.pause(delay)
+                else:
+                    await asyncio.sleep(2 ** attempt * (0.5 + random.random() / 2))
+
+    async def deliver(self, notifications: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        發送通知，notifications 為 (收件人, 文字) 的序列，回傳發送報告
+        """
+        notifications = list(notifications)
+        started = time.monotonic()
+        plan = self._plan(notifications)
+        recipients = {r for _, batch, _ in plan for r in batch}
+        report: Dict[str, Any] = {
+            'notifications': len(notifications),
+            'recipients': len(recipients),
+            'requests': 0,
+            'multicast_requests': 0,
+            'push_requests': 0,
+            'failures': 0,
+            'rate_limited': 0,
+            'retries': 0
+        }
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(step):
+            async with semaphore:
+                await self._send(*step, report)
+
+        await asyncio.gather(*(run(step) for step in plan))
+
+        elapsed = time.monotonic() - started
+        report['seconds'] = elapsed
+        report['recipients_per_second'] = len(recipients) / elapsed if elapsed else 0.0
+        self.totals['deliveries'] += 1
+        for key in ('recipients', 'requests', 'multicast_requests', 'push_requests',
+                    'failures', 'rate_limited', 'retries'):
+            self.totals[key] += report[key]
+        self.last_report = report
+        logger.info(f"Push fan-out finished: {report}")
+        return report
+
+    def stats(self) -> dict:
+        """輸出累計與最近一次的發送統計"""
+        return {**self.totals, 'last': self.last_report}
+
+_fanouts: Dict[int, PushFanout] = {}
+
+def get_fanout(line_bot_api: Any) -> PushFanout:
+    """獲取與 LINE API 客戶端對應的共用推播引擎"""
+    fanout = _fanouts.get(id(line_bot_api))
+    if fanout is None or fanout.line_bot_api is not line_bot_api:
+        fanout = _fanouts[id(line_bot_api)] = PushFanout(line_bot_api)
+    return fanout
@@ -0,0 +1,197 @@
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 與專案管理相關的關鍵字與權重（來自 RELEVANCE_PROMPT 與 line_service 的觸發語句）
+RELEVANT_KEYWORDS: Dict[str, float] = {
+    '任務': 2.5, '專案': 2.5, '進度': 2.5, '週報': 3.0, '報表': 2.5,
+    '提醒': 1.5, '截止': 2.0, '到期': 2.0, '期限': 2.0, '指派': 2.5,
+    '負責': 1.5, '追蹤': 1.5, '完成': 1.0, '部門': 1.0, '簡報': 1.5,
+    '會議': 1.0, '交付': 2.0, '排程': 1.5, '里程碑': 2.5, '待辦': 2.5,
+    '誰做': 3.0, '交了沒': 3.0, '這週的事': 3.0, '我的任務': 3.0,
+    '部門任務': 3.0, '未指派': 3.0, '行銷簡報': 3.0, '新增任務': 3.0,
+    '報告': 2.0, '加班': 1.5, '合約': 2.0, '設計稿': 2.0, '企劃': 2.0,
+    '提案': 1.5, '客戶': 1.5, '預算': 1.5, '需求': 1.5, '規格': 1.5,
+    '上線': 1.5, '版本': 1.0, '報價': 2.0, '開會': 1.0, '廠商': 1.5,
+    '文件': 1.0, '工時': 2.0, '採購': 1.5, '發票': 1.5, '測試': 1.0,
+    '紀錄': 1.0, '審核': 1.5, '核准': 1.5, '驗收': 2.0, '季報': 2.5,
+    'task': 2.5, 'project': 2.5, 'deadline': 2.5, 'report': 2.0, 'todo': 2.0,
+    'bug': 2.0, 'review': 1.5, 'demo': 1.5
+}
+
+# 一般聊天常見用語
+IRRELEVANT_KEYWORDS: Dict[str, float] = {
+    '哈哈': 1.5, '呵呵': 1.5, '早安': 2.0, '午安': 2.0, '晚安': 2.0,
+    '吃飯': 2.0, '午餐': 1.5, '晚餐': 1.5, '宵夜': 2.0, '飲料': 1.5,
+    '天氣': 1.5, '電影': 2.0, '追劇': 2.0, '週末': 1.0, '放假': 1.0,
+    '生日快樂': 2.5, '新年快樂': 2.5, '謝謝': 0.5, '貼圖': 2.0,
+    '好喔': 1.0, '好der': 1.5, '讚': 1.0, 'lol': 1.5, 'haha': 1.5
+}
+
+# 字元 n-gram 評分器的種子語料
+RELEVANT_SAMPLES = (
+    '新增一個任務', '修改任務內容', '查詢任務狀態', '專案進度追蹤',
+    '目前的專案進度如何', '生成本週週報', '任務到期提醒', '這個誰做',
+    '報表交了沒', '昨天說的行銷簡報是誰接的', '這週的事', '我的任務',
+    '部門任務', '將任務標記為已完成', '請幫我安排下週的工作',
+    '截止日期是什麼時候', '誰負責這個案子', '進度落後了', '交付時程'
+)
+IRRELEVANT_SAMPLES = (
+    '哈哈哈好好笑', '今天中午吃什麼', '晚上要不要去看電影', '早安大家',
+    '晚安好夢', '今天天氣真好', '週末去哪裡玩', '生日快樂',
+    '謝謝你喔', '好喔沒問題', '這家餐廳好吃嗎', '下班一起喝飲料',
+    '你最近好嗎', '我好累想睡覺', '有人要訂便當嗎'
+)
+
+class KeywordTrie:
+    """
+    以字元 trie 儲存關鍵字，一次掃描找出所有命中的關鍵字
+    """
+    __slots__ = ('_root', 'max_length')
+
+    def __init__(self, keywords: Dict[str, float]):
+        self._root: dict = {}
+        self.max_length = 0
+        for word, weight in keywords.items():
+            node = self._root
+            for char in word.lower():
+                node = node.setdefault(char, {})
+            # 以空字串鍵存放權重
+            node[''] = weight
+            self.max_length = max(self.max_length, len(word))
+
+    def matches(self, text: str) -> List[Tuple[str, float]]:
+        """回傳文字中所有命中的 (關鍵字, 權重)"""
+        found = []
+        length = len(text)
+        for start in range(length):
+            node = self._root
+            for end in range(start, min(length, start + self.max_length)):
+                node = node.get(text[end])
+                if node is None:
+                    break
+                if '' in node:
+                    found.append((text[start:end + 1], node['']))
+        return found
+
+def char_ngrams(text: str, n: int = 2) -> List[str]:
+    """切出字元 n-gram，過短的文字則回傳整段"""
+    text = ''.join(text.lower().split())
+    if len(text) < n:
+        return [text] if text else []
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+class NgramScorer:
+    """
+    以兩組種子語料計算字元 bigram 的對數勝算比
+    """
+
+    def __init__(self, relevant: Iterable[str], irrelevant: Iterable[str], smoothing: float = 1.0):
+        rel_counts = self._count(relevant)
+        irr_counts = self._count(irrelevant)
+        rel_total = sum(rel_counts.values())
+        irr_total = sum(irr_counts.values())
+        vocab = set(rel_counts) | set(irr_counts)
+        denom_rel = rel_total + smoothing * len(vocab)
+        denom_irr = irr_total + smoothing * len(vocab)
+        self.weights: Dict[str, float] = {
+            gram: math.log((rel_counts.get(gram, 0) + smoothing) / denom_rel)
+                - math.log((irr_counts.get(gram, 0) + smoothing) / denom_irr)
+            for gram in vocab
+        }
+
+    @staticmethod
+    def _count(samples: Iterable[str]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for sample in samples:
+            for gram in char_ngrams(sample):
+                counts[gram] = counts.get(gram, 0) + 1
+        return counts
+
+    def score(self, text: str) -> float:
+        """已知 bigram 的平均對數勝算比，無已知 bigram 時為 0"""
+        known = [self.weights[g] for g in char_ngrams(text) if g in self.weights]
+        return sum(known) / len(known) if known else 0.0
+
+class RelevanceFilter:
+    """
+    在 LLM 之前的本地相關性判斷
+
+    分數明確時直接在本地判定，只有落在中間區間的訊息才交給 LLM。
+    """
+
+    def __init__(
+        self,
+        yes_threshold: Optional[float] = None,
+        no_threshold: Optional[float] = None,
+        enabled: Optional[bool] = None
+    ):
+        self.yes_threshold = yes_threshold if yes_threshold is not None else \
+            float(os.getenv('RELEVANCE_YES_THRESHOLD', '0.85'))
+        self.no_threshold = no_threshold if no_threshold is not None else \
+            float(os.getenv('RELEVANCE_NO_THRESHOLD', '0.05'))
+        self.enabled = enabled if enabled is not None else \
+            os.getenv('RELEVANCE_PREFILTER_ENABLED', 'true').lower() == 'true'
+        self.relevant_trie = KeywordTrie(RELEVANT_KEYWORDS)
+        self.irrelevant_trie = KeywordTrie(IRRELEVANT_KEYWORDS)
+        self.scorer = NgramScorer(RELEVANT_SAMPLES, IRRELEVANT_SAMPLES)
+
+        # 統計
+        self.local_yes = 0
+        self.local_no = 0
+        self.deferred = 0
+
+    def probability(self, message: str) -> float:
+        """估算訊息與專案管理相關的機率"""
+        text = message.strip().lower()
+        if not text:
+            return 0.0
+        if text.startswith('/'):
+            return 1.0
+        score = sum(weight for _, weight in self.relevant_trie.matches(text))
+        score -= sum(weight for _, weight in self.irrelevant_trie.matches(text))
+        score += self.scorer.score(text)
+        # 極短且無關鍵字的訊息多半是閒聊
+        if len(text) <= 2 and score <= 0:
+            score -= 2.0
+        return 1.0 / (1.0 + math.exp(-score))
+
+    def decide(self, message: str) -> Optional[bool]:
+        """
+        與 classify 相同的判定但不計入統計，供任務提取批次等其他用途預先過濾
+        """
+        if not self.enabled:
+            return None
+        prob = self.probability(message)
+        if prob >= self.yes_threshold:
+            return True
+        if prob <= self.no_threshold:
+            return False
+        return None
+
+    def classify(self, message: str) -> Optional[bool]:
+        """
+        回傳 True/False 表示本地已判定，None 表示需交給 LLM
+        """
+        decision = self.decide(message)
+        if decision is True:
+            self.local_yes += 1
+        elif decision is False:
+            self.local_no += 1
+        else:
+            self.deferred += 1
+        return decision
+
+    def stats(self) -> dict:
+        """輸出本地判定與節省的 LLM 呼叫次數"""
+        total = self.local_yes + self.local_no + self.deferred
+        avoided = self.local_yes + self.local_no
+        return {
+            'local_yes': self.local_yes,
+            'local_no': self.local_no,
+            'llm_calls': self.deferred,
+            'llm_calls_avoided': avoided,
+            'avoided_ratio': avoided / total if total else 0.0,
+            'yes_threshold': self.yes_threshold,
+            'no_threshold': self.no_threshold
+        }
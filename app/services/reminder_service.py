@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+REMINDER_TEXT = "提醒：任務「{title}」即將在24小時內到期！"
+
+def parse_due_date(value: Any) -> Optional[float]:
+    """將 due_date 轉為 epoch 秒數，無法解析時回傳 None"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+class _Reminder:
+    __slots__ = ('task_id', 'fire_at', 'title', 'assignee')
+
+    def __init__(self, task_id: str, fire_at: float, title: str, assignee: str):
+        self.task_id = task_id
+        self.fire_at = fire_at
+        self.title = title
+        self.assignee = assignee
+
+class ReminderScheduler:
+    """
+    以最小堆積排程的到期提醒
+
+    啟動時只載入截止時間在視窗內、尚未提醒的待辦任務，之後由 save_task /
+    update_task_status 增量維護。每則提醒在截止前 REMINDER_LEAD_HOURS 小時
+    觸發一次；發送前先在資料庫寫入 reminder_sent_at 認領，重新啟動或多個
+    worker 都不會重複發送。
+    """
+
+    def __init__(self, lead_hours: Optional[float] = None, horizon_hours: Optional[float] = None):
+        self.lead = (lead_hours or float(os.getenv('REMINDER_LEAD_HOURS', '24'))) * 3600
+        self.horizon = (horizon_hours or float(os.getenv('REMINDER_HORIZON_HOURS', '72'))) * 3600
+        self._heap: List[Tuple[float, int, _Reminder]] = []
+        self._active: Dict[str, _Reminder] = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loader: Optional[Callable[[str], Awaitable[List[Dict[str, Any]]]]] = None
+        self._claim: Optional[Callable[[List[str]], Awaitable[List[str]]]] = None
+        self._send: Optional[Callable[[List[Tuple[str, str]]], Awaitable[Any]]] = None
+        self._loaded_until = 0.0
+
+        # 統計
+        self.scheduled = 0
+        self.fired = 0
+        self.skipped = 0
+        self.failures = 0
+
+    async def start(
+        self,
+        loader: Callable[[str], Awaitable[List[Dict[str, Any]]]],
+        claim: Callable[[List[str]], Awaitable[List[str]]],
+        send: Callable[[List[Tuple[str, str]]], Awaitable[Any]]
+    ) -> None:
+        """
+        啟動排程：loader(截止時間上限) 載入任務，claim(任務ID) 回傳成功認領的ID，
+        send([(收件人, 文字)]) 發送提醒
+        """
+        self._loader, self._claim, self._send = loader, claim, send
+        self._wakeup = asyncio.Event()
+        await self._refill()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止排程"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def track(self, task: Dict[str, Any]) -> None:
+        """新增或更新任務的提醒"""
+        task_id = task.get('id')
+        if task_id is None:
+            return
+        due_at = parse_due_date(task.get('due_date'))
+        if (
+            due_at is None
+            or not task.get('assignee')
+            or task.get('status', 'pending') != 'pending'
+            or task.get('reminder_sent_at')
+        ):
+            self.cancel(task_id)
+            return
+        # 尚未啟動或超出已載入視窗的任務留待下次載入
+        if not self._loaded_until or due_at > self._loaded_until:
+            self.cancel(task_id)
+            return
+        reminder = _Reminder(task_id, due_at - self.lead, task.get('title', ''), task['assignee'])
+        self._active[task_id] = reminder
+        heapq.heappush(self._heap, (reminder.fire_at, next(self._sequence), reminder))
+        self.scheduled += 1
+        if self._wakeup is not None and self._heap[0][2] is reminder:
+            self._wakeup.set()
+
+    def cancel(self, task_id: str) -> None:
+        """取消任務的提醒（堆積中的項目延遲刪除）"""
+        self._active.pop(task_id, None)
+
+    async def _refill(self) -> None:
+        """載入截止時間落在下一個視窗內的任務"""
+        until = time.time() + self.horizon
+        rows = await self._loader(datetime.fromtimestamp(until).astimezone().isoformat())
+        self._loaded_until = until
+        for row in rows:
+            self.track(row)
+
+    def _pop_due(self, now: float) -> List[_Reminder]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, reminder = heapq.heappop(self._heap)
+            # 已取消或已被較新的排程取代
+            if self._active.get(reminder.task_id) is reminder:
+                del self._active[reminder.task_id]
+                due.append(reminder)
+        return due
+
+    async def _fire(self, reminders: List[_Reminder]) -> None:
+        try:
+            claimed = set(await self._claim([r.task_id for r in reminders]))
+        except Exception as e:
+            # 認領失敗時稍後重試
+            self.failures += len(reminders)
+            logger.error(f"Error claiming reminders: {e}")
+            for reminder in reminders:
+                reminder.fire_at = time.time() + 60
+                self._active[reminder.task_id] = reminder
+                heapq.heappush(self._heap, (reminder.fire_at, next(self._sequence), reminder))
+            return
+        notifications = [
+            (r.assignee, REMINDER_TEXT.format(title=r.title))
+            for r in reminders if r.task_id in claimed
+        ]
+        self.skipped += len(reminders) - len(notifications)
+        if not notifications:
+            return
+        try:
+            await self._send(notifications)
+            self.fired += len(notifications)
+        except Exception as e:
+            # 已認領的提醒不再重送，寧可漏發也不要重複發送
+            self.failures += len(notifications)
+            logger.error(f"Error sending reminders: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                now = time.time()
+                due = self._pop_due(now)
+                if due:
+                    await self._fire(due)
+                    continue
+                # 視窗過半時載入下一段
+                next_refill = self._loaded_until - self.horizon / 2
+                if now >= next_refill:
+                    await self._refill()
+                    continue
+                timeout = next_refill - now
+                if self._heap:
+                    timeout = min(timeout, self._heap[0][0] - now)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.01))
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in reminder scheduler: {e}")
+                await asyncio.sleep(60)
+
+    def stats(self) -> dict:
+        """輸出排程狀態"""
+        next_fire = min((r.fire_at for r in self._active.values()), default=None)
+        return {
+            'pending': len(self._active),
+            'heap_size': len(self._heap),
+            'scheduled': self.scheduled,
+            'fired': self.fired,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'next_fire_in': max(0.0, next_fire - time.time()) if next_fire is not None else None
+        }
+
+# 全域共用的提醒排程
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,212 @@
+import logging
+import re
+import unicodedata
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 參數欄位：不跨越空白、標點與 @ 提及
+SLOT_PATTERN = r'[^\s，,。.？?！!、：:；;@]+'
+_SLOT = re.compile(r'\{(\w+)\}')
+_SLOT_CHAR = re.compile(SLOT_PATTERN)
+
+def normalize(text: str) -> str:
+    """全形轉半形並轉小寫，自動機與參數擷取都以此為準"""
+    return unicodedata.normalize('NFKC', text).lower()
+
+class AhoCorasick:
+    """
+    Aho–Corasick 多字串比對自動機，建立一次後以單次掃描找出所有命中的字串
+    """
+    __slots__ = ('_goto', '_fail', '_out', 'patterns')
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[Tuple[int, ...]] = [()]
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._out.append(())
+                node = next_node
+            self._out[node] += (index,)
+
+        # 以 BFS 建立失敗連結，並把失敗節點的輸出併入
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def search(self, text: str) -> Iterator[Tuple[int, int]]:
+        """依序產生 (結束位置, 字串編號)，結束位置不含該字元"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                for index in out[node]:
+                    yield position + 1, index
+
+class Intent:
+    """
+    一個意圖：觸發詞可含 {參數} 欄位，例如「{keyword}交了沒」；
+    command 為 True 時觸發詞只在訊息開頭、且後面是結尾或空白時成立
+    """
+    __slots__ = ('name', 'triggers', 'handler', 'priority', 'command', 'defaults', 'requires_registration')
+
+    def __init__(
+        self,
+        name: str,
+        triggers: Sequence[str],
+        handler: Optional[Callable[..., Any]] = None,
+        priority: int = 0,
+        command: bool = False,
+        defaults: Optional[Dict[str, str]] = None,
+        requires_registration: bool = True
+    ):
+        self.name = name
+        self.triggers = tuple(triggers)
+        self.handler = handler
+        self.priority = priority
+        self.command = command
+        self.defaults = defaults or {}
+        self.requires_registration = requires_registration
+
+class _Trigger:
+    __slots__ = ('intent', 'template', 'anchor', 'length', 'leading', 'regex')
+
+    def __init__(self, intent: Intent, template: str):
+        self.intent = intent
+        self.template = normalize(template)
+        pieces = _SLOT.split(self.template)
+        literals = pieces[0::2]
+        # 以最長的固定片段作為自動機的錨點
+        self.anchor = max(literals, key=len)
+        if not self.anchor:
+            raise ValueError(f"Trigger {template!r} of intent {intent.name} has no literal text")
+        self.length = sum(len(piece) for piece in literals)
+        # 錨點是第一個固定片段時，可從錨點附近直接擷取參數；否則搜尋整段訊息
+        first = next(piece for piece in literals if piece)
+        self.leading = (not literals[0]) if first == self.anchor else None
+        if len(pieces) == 1:
+            self.regex = None
+        else:
+            pattern = ''.join(
+                re.escape(piece) if i % 2 == 0 else f'(?P<{piece}>{SLOT_PATTERN})'
+                for i, piece in enumerate(pieces)
+            )
+            self.regex = re.compile(pattern)
+
+class RouteMatch:
+    __slots__ = ('intent', 'args', 'trigger', 'start')
+
+    def __init__(self, intent: Intent, args: Dict[str, str], trigger: str, start: int):
+        self.intent = intent
+        self.args = args
+        self.trigger = trigger
+        self.start = start
+
+    def __repr__(self) -> str:
+        return f"RouteMatch({self.intent.name!r}, {self.args!r})"
+
+class Router:
+    """
+    宣告式的意圖路由：所有觸發詞編譯成一個自動機，訊息只掃描一次
+
+    多個意圖同時命中時依序比較：priority 高者、觸發詞較長者、出現位置較前者、
+    能擷取到參數者；含參數的觸發詞在錨點命中後才以正規式擷取參數。
+    """
+
+    def __init__(self, intents: Sequence[Intent] = ()):
+        self._intents: List[Intent] = []
+        self._triggers: List[_Trigger] = []
+        self._automaton: Optional[AhoCorasick] = None
+        self.routed: Dict[str, int] = {}
+        self.unmatched = 0
+        for intent in intents:
+            self.add(intent)
+
+    def add(self, intent: Intent) -> Intent:
+        self._intents.append(intent)
+        self._triggers.extend(_Trigger(intent, template) for template in intent.triggers)
+        self._automaton = None
+        return intent
+
+    def compile(self) -> None:
+        self._automaton = AhoCorasick([trigger.anchor for trigger in self._triggers])
+
+    def match(self, text: str) -> Optional[RouteMatch]:
+        """回傳最佳的意圖與擷取到的參數，沒有命中時回傳 None"""
+        if self._automaton is None:
+            self.compile()
+        text = normalize(text)
+        best: Optional[RouteMatch] = None
+        best_key: Optional[Tuple[int, int, int, bool]] = None
+        for end, index in self._automaton.search(text):
+            trigger = self._triggers[index]
+            intent = trigger.intent
+            start = end - len(trigger.anchor)
+            if intent.command and (start != 0 or text[end:end + 1] not in ('', ' ', '\n', '\t')):
+                continue
+            key = (intent.priority, trigger.length, -start, trigger.regex is not None)
+            if best_key is not None and key <= best_key:
+                continue
+            args = dict(intent.defaults)
+            if trigger.regex is not None:
+                found = self._capture(trigger, text, start)
+                if found is None:
+                    continue
+                args.update(found.groupdict())
+            elif intent.command:
+                rest = text[end:].strip()
+                if rest:
+                    args['args'] = rest
+            best, best_key = RouteMatch(intent, args, trigger.template, start), key
+
+        if best is None:
+            self.unmatched += 1
+        else:
+            self.routed[best.intent.name] = self.routed.get(best.intent.name, 0) + 1
+        return best
+
+    @staticmethod
+    def _capture(trigger: _Trigger, text: str, start: int) -> Optional['re.Match']:
+        if trigger.leading is None:
+            return trigger.regex.search(text)
+        if not trigger.leading:
+            return trigger.regex.match(text, start)
+        # 參數欄位不跨越空白與標點，往前看到上一個分隔字元即可
+        begin = start
+        while begin > 0 and _SLOT_CHAR.match(text[begin - 1]):
+            begin -= 1
+        return trigger.regex.match(text, begin) if begin < start else None
+
+    @property
+    def intents(self) -> List[Intent]:
+        return list(self._intents)
+
+    def stats(self) -> dict:
+        """輸出各意圖的命中次數"""
+        return {
+            'intents': len(self._intents),
+            'triggers': len(self._triggers),
+            'routed': dict(self.routed),
+            'unmatched': self.unmatched
+        }
@@ -1,12 +1,406 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime, timedelta
-from app.services.database_service import get_weekly_tasks, get_user_tasks
-from app.services.openai_service import generate_task_summary
-from app.services.line_service import send_broadcast_message
+import asyncio
+import json
+import logging
 import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，單一 worker 直接擔任 leader
+    fcntl = None
+
+from app.services.database_service import get_user_tasks, get_weekly_tasks
+from app.services.metrics_service import Histogram, Sample, metrics
+from app.services.openai_service import summarize_tasks
+from app.services.push_service import get_fanout
+from app.services.summary_service import PROJECTED_FIELDS
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 摘要只需要投影後的欄位
+SUMMARY_COLUMNS = ','.join(('id', 'created_at') + PROJECTED_FIELDS)
+
+DAY_NAMES = {'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6}
+
+def _parse_field(expr: str, low: int, high: int, names: Optional[Dict[str, int]] = None) -> Set[int]:
+    """解析 cron 欄位，支援 *、數值、名稱、範圍、列表與間隔"""
+    def value(token: str) -> int:
+        return names[token] if names and token in names else int(token)
+
+    values: Set[int] = set()
+    for part in str(expr).lower().split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+        if part in ('*', ''):
+            start, end = low, high
+        elif '-' in part:
+            first, last = part.split('-', 1)
+            start, end = value(first), value(last)
+        else:
+            start = value(part)
+            end = high if step > 1 else start
+        if not (low <= start <= end <= high):
+            raise ValueError(f"Cron value out of range: {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronTrigger:
+    """
+    cron 觸發條件，day_of_week 以週一為 0（與 datetime.weekday 相同）；
+    day 與 day_of_week 同時指定時兩者都要符合，與 APScheduler 相同（不同於 crontab 的「任一符合」）
+    """
+
+    def __init__(self, minute='0', hour='*', day='*', month='*', day_of_week='*'):
+        self.expression = f"{minute} {hour} {day} {month} {day_of_week}"
+        self.minutes = _parse_field(minute, 0, 59)
+        self.hours = _parse_field(hour, 0, 23)
+        self.days = _parse_field(day, 1, 31)
+        self.months = _parse_field(month, 1, 12)
+        self.weekdays = _parse_field(day_of_week, 0, 6, DAY_NAMES)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        return (
+            moment.month in self.months
+            and moment.day in self.days
+            and moment.weekday() in self.weekdays
+        )
+
+    def next_fire(self, after: datetime) -> datetime:
+        """回傳晚於 after 的下一次觸發時間"""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # 最多往後找四年，涵蓋 2 月 29 日這類規則
+        limit = moment + timedelta(days=366 * 4)
+        while moment < limit:
+            if not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+                continue
+            if moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+                continue
+            return moment
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+    def __repr__(self) -> str:
+        return f"CronTrigger({self.expression!r})"
+
+class Job:
+    """排程工作與其執行統計"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        trigger: CronTrigger,
+        timeout: Optional[float],
+        misfire_grace: float,
+        leader_only: bool,
+        jitter: float = 0.0
+    ):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.timeout = timeout
+        self.misfire_grace = misfire_grace
+        self.leader_only = leader_only
+        # 每個 worker 固定的隨機延後秒數，讓各 worker 的同一工作錯開執行，間隔仍與 cron 相同
+        self.offset = random.uniform(0, jitter) if jitter > 0 else 0.0
+        self.next_run: Optional[datetime] = None
+        self.last_scheduled: Optional[datetime] = None
+        self.running: Optional[asyncio.Task] = None
+
+        self.duration = Histogram()
+        self.lag = Histogram()
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped_overlap = 0
+        self.skipped_misfire = 0
+        self.caught_up = 0
+        self.last_error: Optional[str] = None
+
+    def next_after(self, moment: datetime) -> datetime:
+        """晚於 moment 的下一次執行時間（含延後秒數）"""
+        delay = timedelta(seconds=self.offset)
+        return self.trigger.next_fire(moment - delay) + delay
+
+    def stats(self) -> dict:
+        return {
+            'trigger': self.trigger.expression,
+            'leader_only': self.leader_only,
+            'offset_seconds': self.offset,
+            'running': self.running is not None,
+            'next_run': self.next_run.isoformat() if self.next_run else None,
+            'last_scheduled': self.last_scheduled.isoformat() if self.last_scheduled else None,
+            'runs': self.runs,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'skipped_overlap': self.skipped_overlap,
+            'skipped_misfire': self.skipped_misfire,
+            'caught_up': self.caught_up,
+            'last_error': self.last_error,
+            'duration': self.duration.snapshot(),
+            'lag': self.lag.snapshot()
+        }
+
+class LeaderLock:
+    """
+    以檔案鎖選出 leader：同一台機器上的多個 gunicorn worker 只有一個能取得鎖，
+    持有者結束時鎖自動釋放，其他 worker 下次嘗試即可接手
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
 
-scheduler = BackgroundScheduler()
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        if fcntl is None or not self.path:
+            self._file = True
+            return True
+        handle = open(self.path, 'a+')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._file = handle
+        return True
+
+    def release(self) -> None:
+        handle, self._file = self._file, None
+        if handle is not None and handle is not True:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+class JobEngine:
+    """
+    單一的非同步排程引擎
+
+    以 cron 觸發工作，每個工作有獨立逾時；前一次仍在執行時略過本次觸發。
+    leader_only 的工作只在取得 leader 鎖的 worker 執行，並將最後觸發時間寫入
+    狀態檔，重新啟動後若錯過的觸發仍在寬限時間內，會合併補跑一次。
+    """
+
+    def __init__(self, lock_path: Optional[str] = None, state_path: Optional[str] = None):
+        self.lock = LeaderLock(lock_path if lock_path is not None else os.getenv('SCHEDULER_LOCK_PATH', 'scheduler.lock'))
+        self.state_path = state_path if state_path is not None else os.getenv('SCHEDULER_STATE_PATH', 'scheduler_state.json')
+        self.leader_retry = float(os.getenv('SCHEDULER_LEADER_RETRY', '30'))
+        self.default_timeout = float(os.getenv('SCHEDULER_JOB_TIMEOUT', '600'))
+        self.default_grace = float(os.getenv('SCHEDULER_MISFIRE_GRACE', '3600'))
+        self.jobs: Dict[str, Job] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        trigger: CronTrigger,
+        timeout: Optional[float] = None,
+        misfire_grace: Optional[float] = None,
+        leader_only: bool = True,
+        jitter: float = 0.0
+    ) -> Job:
+        """
+        註冊工作，同名工作會被取代；jitter 為各 worker 隨機延後的最大秒數，
+        需小於觸發間隔
+        """
+        job = Job(
+            name, func, trigger,
+            timeout if timeout is not None else self.default_timeout,
+            misfire_grace if misfire_grace is not None else self.default_grace,
+            leader_only,
+            jitter
+        )
+        self.jobs[name] = job
+        if self._wakeup is not None:
+            self._schedule(job, datetime.now())
+            self._wakeup.set()
+        return job
+
+    # 狀態檔
+    def _load_state(self) -> Dict[str, str]:
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable scheduler state: {e}")
+            return {}
+
+    def _save_state(self) -> None:
+        if not self.state_path or not self.lock.held:
+            return
+        state = {
+            name: job.last_scheduled.isoformat()
+            for name, job in self.jobs.items()
+            if job.leader_only and job.last_scheduled
+        }
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            logger.error(f"Error saving scheduler state: {e}")
+
+    def _schedule(self, job: Job, now: datetime, last: Optional[datetime] = None) -> None:
+        """計算下一次觸發；錯過的觸發在寬限時間內合併成一次立即補跑"""
+        if last is None:
+            job.next_run = job.next_after(now)
+            return
+        missed = None
+        moment = job.next_after(last)
+        while moment <= now:
+            missed = moment
+            moment = job.next_after(moment)
+        if missed is not None and (now - missed).total_seconds() <= job.misfire_grace:
+            job.next_run = missed
+            job.caught_up += 1
+            logger.info(f"Catching up missed run of {job.name} scheduled at {missed}")
+        else:
+            if missed is not None:
+                job.skipped_misfire += 1
+            job.next_run = moment
+
+    async def start(self) -> None:
+        """啟動排程迴圈"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        now = datetime.now()
+        for job in self.jobs.values():
+            self._schedule(job, now)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止排程並等待執行中的工作結束"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        running = [job.running for job in self.jobs.values() if job.running is not None]
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        self.lock.release()
+
+    def _become_leader(self) -> None:
+        """取得 leader 鎖後，依狀態檔補跑錯過的工作"""
+        logger.info(f"Scheduler leadership acquired by pid {os.getpid()}")
+        state = self._load_state()
+        now = datetime.now()
+        for name, job in self.jobs.items():
+            if job.leader_only:
+                last = state.get(name)
+                self._schedule(job, now, datetime.fromisoformat(last) if last else None)
+
+    async def _execute(self, job: Job, scheduled: datetime) -> None:
+        started = time.perf_counter()
+        job.lag.observe(max(0.0, (datetime.now() - scheduled).total_seconds()))
+        try:
+            await asyncio.wait_for(job.func(), timeout=job.timeout)
+            job.runs += 1
+        except asyncio.TimeoutError:
+            job.timeouts += 1
+            job.last_error = f"timed out after {job.timeout}s"
+            logger.error(f"Job {job.name} timed out after {job.timeout}s")
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Job {job.name} failed: {e}")
+        finally:
+            job.duration.observe(time.perf_counter() - started)
+            job.running = None
+
+    def _fire(self, job: Job, now: datetime) -> None:
+        scheduled = job.next_run
+        job.next_run = job.next_after(max(now, scheduled))
+        job.last_scheduled = scheduled
+        if job.running is not None:
+            # 前一次尚未結束，略過本次
+            job.skipped_overlap += 1
+            logger.warning(f"Skipping {job.name} at {scheduled}: previous run still in progress")
+        else:
+            job.running = asyncio.create_task(self._execute(job, scheduled))
+        if job.leader_only:
+            self._save_state()
+
+    async def _run(self) -> None:
+        next_leader_attempt = 0.0
+        while True:
+            try:
+                if not self.lock.held and time.monotonic() >= next_leader_attempt:
+                    if self.lock.acquire():
+                        self._become_leader()
+                    else:
+                        next_leader_attempt = time.monotonic() + self.leader_retry
+                now = datetime.now()
+                for job in self.jobs.values():
+                    if job.leader_only and not self.lock.held:
+                        continue
+                    if job.next_run is not None and job.next_run <= now:
+                        self._fire(job, now)
+
+                # 最長睡 60 秒，以便重試 leader 鎖並因應系統時間調整
+                timeout = 60.0
+                for job in self.jobs.values():
+                    if job.next_run is not None and (self.lock.held or not job.leader_only):
+                        timeout = min(timeout, (job.next_run - datetime.now()).total_seconds())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.01))
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in scheduler loop: {e}")
+                await asyncio.sleep(60)
+
+    def stats(self) -> dict:
+        """輸出 leader 狀態與各工作的耗時、延遲統計"""
+        return {
+            'leader': self.lock.held,
+            'pid': os.getpid(),
+            'jobs': {name: job.stats() for name, job in self.jobs.items()}
+        }
+
+    def collect(self) -> Iterable[Sample]:
+        """輸出各工作的執行次數、耗時與觸發延遲"""
+        yield ('scheduler_leader', 'gauge', '此 worker 是否為排程 leader', {}, int(self.lock.held))
+        for name, job in list(self.jobs.items()):
+            labels = {'job': name}
+            yield ('job_running', 'gauge', '工作是否正在執行', labels, int(job.running is not None))
+            yield ('job_runs_total', 'counter', '工作成功執行次數', labels, job.runs)
+            yield ('job_failures_total', 'counter', '工作失敗次數', labels, job.failures)
+            yield ('job_timeouts_total', 'counter', '工作逾時次數', labels, job.timeouts)
+            yield ('job_duration_seconds', 'histogram', '工作執行耗時', labels, job.duration)
+            yield ('job_lag_seconds', 'histogram', '工作實際開始與排定時間的差距', labels, job.lag)
+
+# 全域共用的排程引擎
+scheduler = JobEngine()
+metrics.register(scheduler.collect)
 
 def setup_scheduler(line_bot_api):
     """
@@ -14,59 +408,44 @@ def setup_scheduler(line_bot_api):
     """
     # 每天早上 9:00 發送每日任務摘要
     scheduler.add_job(
-        send_daily_summary,
-        CronTrigger(hour=9, minute=0),
-        args=[line_bot_api],
-        id='daily_summary'
+        'daily_summary',
+        lambda: send_daily_summary(line_bot_api),
+        CronTrigger(minute='0', hour='9')
     )
-    
+
     # 每週一早上 9:30 發送週報
     scheduler.add_job(
-        send_weekly_report,
-        CronTrigger(day_of_week='mon', hour=9, minute=30),
-        args=[line_bot_api],
-        id='weekly_report'
+        'weekly_report',
+        lambda: send_weekly_report(line_bot_api),
+        CronTrigger(minute='30', hour='9', day_of_week='mon')
     )
-    
-    scheduler.start()
 
-def send_daily_summary(line_bot_api):
+async def send_daily_summary(line_bot_api):
     """
     發送每日任務摘要
     """
-    try:
-        # 獲取昨天的任務
-        yesterday = datetime.now() - timedelta(days=1)
-        tasks = get_user_tasks(created_after=yesterday.isoformat())
-        
-        if tasks:
-            summary = generate_task_summary(tasks)
-            # 發送給所有相關人員
-            for task in tasks:
-                if task.get('assignee'):
-                    send_broadcast_message(
-                        line_bot_api,
-                        task['assignee'],
-                        f"📊 每日任務摘要\n\n{summary}"
-                    )
-    except Exception as e:
-        print(f"Error sending daily summary: {e}")
-
-def send_weekly_report(line_bot_api):
+    # 獲取昨天的任務
+    yesterday = datetime.now() - timedelta(days=1)
+    tasks = await get_user_tasks(created_after=yesterday.isoformat(), columns=SUMMARY_COLUMNS)
+
+    if tasks:
+        summary = await summarize_tasks(tasks)
+        # 發送給所有相關人員（同一人只發送一次）
+        await get_fanout(line_bot_api).deliver(
+            (task['assignee'], f"📊 每日任務摘要\n\n{summary}")
+            for task in tasks if task.get('assignee')
+        )
+
+async def send_weekly_report(line_bot_api):
     """
     發送週報
     """
-    try:
-        tasks = get_weekly_tasks()
-        if tasks:
-            summary = generate_task_summary(tasks)
-            # 發送給所有部門主管
-            departments = set(task.get('department') for task in tasks if task.get('department'))
-            for dept in departments:
-                send_broadcast_message(
-                    line_bot_api,
-                    f"dept_{dept}",
-                    f"📈 週報摘要\n\n{summary}"
-                )
-    except Exception as e:
-        print(f"Error sending weekly report: {e}") 
\ No newline at end of file
+    tasks = await get_weekly_tasks(columns=SUMMARY_COLUMNS)
+    if tasks:
+        summary = await summarize_tasks(tasks)
+        # 發送給所有部門主管
+        departments = set(task.get('department') for task in tasks if task.get('department'))
+        await get_fanout(line_bot_api).deliver(
+            (f"dept_{dept}", f"📈 週報摘要\n\n{summary}")
+            for dept in departments
+        )
@@ -0,0 +1,388 @@
+import bisect
+import logging
+import math
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from itertools import compress, islice, repeat
+from operator import add, itemgetter, mul
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.metrics_service import Histogram
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 中日韓文字連續段與英數字詞
+_CJK_RUN = re.compile(r'[㐀-鿿豈-﫿぀-ヿ가-힯]+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+# BM25 參數
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    中日韓文字切成字元 bigram（單一字元時保留單字），英數字以詞為單位，皆轉小寫
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', text).lower()
+    tokens: List[str] = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD.findall(text))
+    return tokens
+
+def _document(task: Dict[str, Any]) -> str:
+    return f"{task.get('title') or ''}\n{task.get('description') or ''}"
+
+def _timestamp(value: Any) -> Optional[float]:
+    """ISO 時間字串轉為時間戳；沒有時區的值視為本地時間，無法解析時回傳 None"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    else:
+        return None
+    return parsed.timestamp()
+
+def _fields(task: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[float]]:
+    """查詢時可篩選的欄位：(負責人, 部門, 建立時間戳)"""
+    return task.get('assignee'), task.get('department'), _timestamp(task.get('created_at'))
+
+def _impact(frequency: int, length: int, average_length: float) -> float:
+    """BM25 中與詞頻、文件長度有關的部分，查詢時只需再乘上 idf"""
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (average_length or 1.0))
+    return frequency * (BM25_K1 + 1) / (frequency + norm)
+
+class _IndexState:
+    """
+    單一版本的倒排索引，重新建立時會整份替換
+
+    posting 直接存放預先算好的 BM25 詞頻分數。重建時以全體平均長度計算，
+    之後增量加入的任務以當下的平均長度計算，下次重建時再校正。
+    """
+    __slots__ = ('postings', 'doc_terms', 'doc_length', 'status', 'fields', 'total_length', '_vocabulary')
+
+    def __init__(self):
+        # 詞 -> {任務ID: 詞頻分數}
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self.doc_length: Dict[str, int] = {}
+        self.status: Dict[str, str] = {}
+        # 任務ID -> (負責人, 部門, 建立時間戳)，查詢時在排序前篩選
+        self.fields: Dict[str, Tuple[Optional[str], Optional[str], Optional[float]]] = {}
+        self.total_length = 0
+        # 排序後的詞彙表，供前綴搜尋使用；有新詞時延後重建
+        self._vocabulary: Optional[List[str]] = None
+
+    @property
+    def average_length(self) -> float:
+        return self.total_length / len(self.doc_terms) if self.doc_terms else 1.0
+
+    @staticmethod
+    def prepare(task: Dict[str, Any]) -> Tuple[str, List[str], Optional[str], tuple]:
+        """斷詞後的 (任務ID, 詞, 狀態, 篩選欄位)，供 load 一次載入"""
+        return str(task['id']), tokenize(_document(task)), task.get('status'), _fields(task)
+
+    def load(self, documents: List[Tuple[str, List[str], Optional[str], tuple]]) -> None:
+        """一次載入多筆斷詞後的任務，先算出平均長度再建立 posting"""
+        average_length = sum(len(document[1]) for document in documents) / len(documents) if documents else 1.0
+        # 平均長度固定時分數只取決於 (詞頻, 長度)，相同的分數共用同一個 float
+        impacts: Dict[Tuple[int, int], float] = {}
+        for task_id, tokens, status, fields in documents:
+            self._add(task_id, tokens, status, fields, average_length, impacts)
+
+    def upsert(self, task: Dict[str, Any]) -> None:
+        task_id = task.get('id')
+        if task_id is None:
+            return
+        task_id = str(task_id)
+        self.remove(task_id)
+        tokens = tokenize(_document(task))
+        average_length = (self.total_length + len(tokens)) / (len(self.doc_terms) + 1)
+        self._add(task_id, tokens, task.get('status'), _fields(task), average_length)
+
+    def _add(
+        self,
+        task_id: str,
+        tokens: List[str],
+        status: Optional[str],
+        fields: tuple,
+        average_length: float,
+        impacts: Optional[Dict[Tuple[int, int], float]] = None
+    ) -> None:
+        counts = Counter(tokens)
+        length = len(tokens)
+        for term, frequency in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[sys.intern(term)] = {}
+                self._vocabulary = None
+            if impacts is None:
+                postings[task_id] = _impact(frequency, length, average_length)
+            else:
+                impact = impacts.get((frequency, length))
+                if impact is None:
+                    impact = impacts[(frequency, length)] = _impact(frequency, length, average_length)
+                postings[task_id] = impact
+        self.doc_terms[task_id] = tuple(counts)
+        self.doc_length[task_id] = length
+        self.status[task_id] = status or 'pending'
+        self.fields[task_id] = fields
+        self.total_length += length
+
+    def remove(self, task_id: str) -> bool:
+        terms = self.doc_terms.pop(task_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            postings = self.postings[term]
+            del postings[task_id]
+            if not postings:
+                del self.postings[term]
+                self._vocabulary = None
+        self.total_length -= self.doc_length.pop(task_id)
+        self.status.pop(task_id, None)
+        self.fields.pop(task_id, None)
+        return True
+
+    def idf(self, term: str) -> float:
+        total_docs = len(self.doc_terms)
+        frequency = len(self.postings[term])
+        return math.log(1 + (total_docs - frequency + 0.5) / (frequency + 0.5))
+
+    def vocabulary(self) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def expand(self, prefix: str) -> List[str]:
+        """找出以 prefix 開頭的所有詞"""
+        vocabulary = self.vocabulary()
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + '\uffff')
+        return vocabulary[start:end]
+
+class TaskSearchIndex:
+    """
+    任務標題與描述的全文索引
+
+    以 CJK bigram 建立倒排索引，查詢時要求所有詞都出現，再以 BM25 排序；
+    最後一個英數字詞與單一中文字以前綴展開。由 save_task / update_task_status
+    增量更新，並定期以完整資料重新建立，取代資料庫的前置萬用字元 ilike 掃描。
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit or int(os.getenv('TASK_SEARCH_LIMIT', '50'))
+        self._state = _IndexState()
+        # 重建期間的增量更新，重建完成後重放
+        self._journal: Optional[List[Tuple[str, tuple]]] = None
+        self.loaded = False
+        self.last_rebuilt: Optional[datetime] = None
+        self.rebuild_seconds = 0.0
+        self.query_latency = Histogram(buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+        self.queries = 0
+        self.unknown_updates = 0
+
+    # 增量更新
+    def record_created(self, task: Dict[str, Any]) -> None:
+        """新任務建立後呼叫"""
+        self._state.upsert(task)
+        if self._journal is not None:
+            self._journal.append(('upsert', (dict(task),)))
+
+    def record_status(self, task_id: str, status: str) -> None:
+        """任務狀態變更後呼叫"""
+        task_id = str(task_id)
+        if task_id in self._state.status:
+            self._state.status[task_id] = status
+        else:
+            self.unknown_updates += 1
+        if self._journal is not None:
+            self._journal.append(('status', (task_id, status)))
+
+    def record_removed(self, task_id: str) -> None:
+        """任務刪除後呼叫"""
+        self._state.remove(str(task_id))
+        if self._journal is not None:
+            self._journal.append(('remove', (str(task_id),)))
+
+    async def rebuild(self, loader: Callable[[], AsyncIterator[List[Dict[str, Any]]]]) -> None:
+        """
+        以逐頁讀取的完整任務資料重建索引，並重放重建期間的增量更新
+        """
+        started = time.perf_counter()
+        self._journal = []
+        try:
+            documents = []
+            async for page in loader():
+                documents.extend(_IndexState.prepare(row) for row in page if row.get('id') is not None)
+            state = _IndexState()
+            state.load(documents)
+            for operation, args in self._journal:
+                if operation == 'upsert':
+                    state.upsert(*args)
+                elif operation == 'remove':
+                    state.remove(*args)
+                elif args[0] in state.status:
+                    state.status[args[0]] = args[1]
+        finally:
+            self._journal = None
+        self._state = state
+        self.loaded = True
+        self.last_rebuilt = datetime.now()
+        self.rebuild_seconds = time.perf_counter() - started
+
+    # 查詢
+    def _query_terms(self, query: str, prefix: bool) -> List[List[str]]:
+        """回傳每個查詢詞可接受的索引詞（前綴展開後可能有多個）"""
+        state = self._state
+        normalized = unicodedata.normalize('NFKC', query).lower()
+        groups = [[term] for term in dict.fromkeys(tokenize(normalized))]
+        if prefix and groups:
+            words = _WORD.findall(normalized)
+            cjk = _CJK_RUN.findall(normalized)
+            # 最後一個英數字詞可能還沒打完
+            if words and normalized.rstrip().endswith(words[-1]):
+                groups[-1] = state.expand(words[-1]) or groups[-1]
+            # 單一中文字以該字開頭的 bigram 比對
+            for index, group in enumerate(groups):
+                if len(group) == 1 and len(group[0]) == 1 and group[0] in cjk:
+                    groups[index] = state.expand(group[0]) or group
+        return groups
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        status: Optional[str] = None,
+        prefix: bool = True,
+        assignee: Optional[str] = None,
+        department: Optional[str] = None,
+        created_after: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        依 BM25 分數回傳 (任務ID, 分數)，所有查詢詞都必須出現
+
+        篩選條件在排序前套用，不會因為相關度較低被截掉；limit 未指定時
+        使用 TASK_SEARCH_LIMIT，為 0 時回傳所有符合的任務。
+        """
+        started = time.perf_counter()
+        if limit is None:
+            limit = self.limit
+        predicate = self._predicate(status, assignee, department, created_after)
+        try:
+            return self._search(query, limit, predicate, prefix)
+        finally:
+            self.queries += 1
+            self.query_latency.observe(time.perf_counter() - started)
+
+    def _predicate(
+        self,
+        status: Optional[str],
+        assignee: Optional[str],
+        department: Optional[str],
+        created_after: Optional[str]
+    ) -> Optional[Callable[[str], bool]]:
+        """組合篩選條件；建立時間無法解析的任務保留，交由資料庫判斷"""
+        if not (status or assignee or department or created_after):
+            return None
+        state = self._state
+        after = _timestamp(created_after) if created_after else None
+
+        def match(doc: str) -> bool:
+            if status and state.status.get(doc) != status:
+                return False
+            doc_assignee, doc_department, created = state.fields.get(doc, (None, None, None))
+            if assignee and doc_assignee != assignee:
+                return False
+            if department and doc_department != department:
+                return False
+            return after is None or created is None or created >= after
+        return match
+
+    def _search(
+        self,
+        query: str,
+        limit: int,
+        predicate: Optional[Callable[[str], bool]],
+        prefix: bool
+    ) -> List[Tuple[str, float]]:
+        state = self._state
+        groups = self._query_terms(query, prefix)
+        if not groups or not state.doc_terms:
+            return []
+
+        # 每個查詢詞一組 (idf, posting)；前綴展開出多個詞時先合併成一份
+        weighted: List[Tuple[float, Dict[str, float]]] = []
+        for group in groups:
+            terms = [term for term in group if term in state.postings]
+            if not terms:
+                return []
+            if len(terms) == 1:
+                weighted.append((state.idf(terms[0]), state.postings[terms[0]]))
+                continue
+            combined: Dict[str, float] = {}
+            for term in terms:
+                idf = state.idf(term)
+                for doc, impact in state.postings[term].items():
+                    combined[doc] = combined.get(doc, 0.0) + idf * impact
+            weighted.append((1.0, combined))
+
+        # 從最短的 posting 開始取交集，交集、計分與挑選都以內建迭代器完成
+        weighted.sort(key=lambda item: len(item[1]))
+        candidates: Iterable[str] = weighted[0][1]
+        for _, postings in weighted[1:]:
+            candidates = filter(postings.__contains__, candidates)
+        if predicate is not None:
+            candidates = [doc for doc in candidates if predicate(doc)]
+        else:
+            candidates = list(candidates)
+        if not candidates:
+            return []
+        scores: Iterable[float] = repeat(0.0)
+        for idf, postings in weighted:
+            scores = map(add, scores, map(mul, map(postings.__getitem__, candidates), repeat(idf)))
+        scores = list(scores)
+        if limit and len(scores) > limit:
+            # 先以排序浮點數找出門檻，再挑出高於門檻者，同分者依加入順序補足
+            threshold = sorted(scores)[-limit]
+            top = list(compress(zip(scores, candidates), map(threshold.__lt__, scores)))
+            top.extend(islice(
+                compress(zip(scores, candidates), map(threshold.__eq__, scores)),
+                limit - len(top)
+            ))
+        else:
+            top = list(zip(scores, candidates))
+        top.sort(key=itemgetter(0), reverse=True)
+        return [(doc, score) for score, doc in top]
+
+    def stats(self) -> dict:
+        """輸出索引大小與查詢延遲"""
+        state = self._state
+        return {
+            'loaded': self.loaded,
+            'tasks': len(state.doc_terms),
+            'terms': len(state.postings),
+            'postings': sum(len(terms) for terms in state.doc_terms.values()),
+            'last_rebuilt': self.last_rebuilt.isoformat() if self.last_rebuilt else None,
+            'rebuild_seconds': self.rebuild_seconds,
+            'queries': self.queries,
+            'unknown_updates': self.unknown_updates,
+            'query_latency': self.query_latency.snapshot()
+        }
+
+# 全域共用的任務搜尋索引
+task_search = TaskSearchIndex()
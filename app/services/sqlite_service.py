@@ -0,0 +1,37 @@
+import sqlite3
+import threading
+from typing import Callable, Iterable
+
+class SQLiteFile:
+    """
+    讓多個 gunicorn worker 共用的 SQLite 檔案
+
+    每個執行緒各自持有一條 WAL 模式的連線；每 evict_every 次寫入呼叫一次
+    evict 清除過期或超出上限的資料，避免每次寫入都掃描整張表。
+    """
+
+    def __init__(self, path: str, schema: Iterable[str], evict: Callable[[], None], evict_every: int = 100):
+        self.path = path
+        self.evict = evict
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes = 0
+        with self.connect() as conn:
+            for statement in schema:
+                conn.execute(statement)
+
+    def connect(self) -> sqlite3.Connection:
+        """取得目前執行緒的連線"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('pragma journal_mode=wal')
+            conn.execute('pragma synchronous=normal')
+            self._local.conn = conn
+        return conn
+
+    def written(self) -> None:
+        """記錄一次寫入，達到次數時整理資料"""
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from app.services.metrics_service import Histogram
+from app.services.push_service import MAX_MESSAGES_PER_REQUEST, MAX_TEXT_LENGTH, get_fanout, split_text
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 句子或段落結尾
+BOUNDARY = re.compile(r'[。！？!?；;\n]|\.(?=\s)')
+
+INTERRUPTED_TEXT = "抱歉，回覆中斷，請稍後再試。"
+
+class SentenceBuffer:
+    """
+    累積串流片段，只在句子或段落結尾切出完整的文字
+    """
+
+    def __init__(self, max_chars: int = MAX_TEXT_LENGTH):
+        self.max_chars = max_chars
+        self._buffer = ''
+
+    def feed(self, delta: str) -> Optional[str]:
+        """加入片段，有完整句子時回傳到最後一個句尾為止的文字"""
+        self._buffer += delta
+        last = None
+        for match in BOUNDARY.finditer(self._buffer):
+            last = match.end()
+        if last is None:
+            # 過長仍沒有句尾時直接切出
+            if len(self._buffer) >= self.max_chars:
+                last = self.max_chars
+            else:
+                return None
+        segment, self._buffer = self._buffer[:last], self._buffer[last:]
+        return segment
+
+    def flush(self) -> str:
+        segment, self._buffer = self._buffer, ''
+        return segment
+
+class StreamingReply:
+    """
+    邊生成邊回覆
+
+    第一段完整句子湊滿 STREAM_FIRST_MIN_CHARS 後立即以 reply token 回覆，
+    之後的內容每累積 STREAM_PUSH_MIN_CHARS 字在句尾以 push 送出（經由推播引擎
+    限速，並遵守每則 5000 字、每次 5 則的限制），結尾剩餘的內容最後送出。
+    """
+
+    def __init__(self, line_bot_api: Any, first_min_chars: Optional[int] = None, push_min_chars: Optional[int] = None):
+        self.line_bot_api = line_bot_api
+        self.first_min_chars = first_min_chars or int(os.getenv('STREAM_FIRST_MIN_CHARS', '40'))
+        self.push_min_chars = push_min_chars or int(os.getenv('STREAM_PUSH_MIN_CHARS', '600'))
+        self.ttfm = Histogram()
+        self.total = Histogram()
+        self.streams = 0
+        self.pushes = 0
+        self.reply_fallbacks = 0
+        self.interrupted = 0
+
+    async def _reply(self, reply_token: str, target: str, text: str) -> None:
+        from linebot.models import TextSendMessage
+        messages = [TextSendMessage(text=chunk) for chunk in split_text(text)]
+        if not messages:
+            return
+        try:
+            await asyncio.to_thread(
+                self.line_bot_api.reply_message, reply_token, messages[:MAX_MESSAGES_PER_REQUEST]
+            )
+            rest = [m.text for m in messages[MAX_MESSAGES_PER_REQUEST:]]
+        except Exception as e:
+            # reply token 逾期或已使用時改以 push 送出
+            logger.warning(f"Reply failed, falling back to push: {e}")
+            self.reply_fallbacks += 1
+            rest = [m.text for m in messages]
+        if rest:
+            await self._push(target, '\n'.join(rest))
+
+    async def _push(self, target: str, text: str) -> None:
+        if not text.strip():
+            return
+        self.pushes += 1
+        await get_fanout(self.line_bot_api).deliver([(target, text)])
+
+    async def deliver(self, reply_token: str, target: str, deltas: AsyncIterator[str]) -> str:
+        """
+        消化串流並送出訊息，回傳完整的回覆內容；target 為 push 的對象（用戶、群組或聊天室）
+        """
+        started = time.perf_counter()
+        self.streams += 1
+        buffer = SentenceBuffer()
+        parts: List[str] = []
+        pending = ''
+        replied = False
+        try:
+            async for delta in deltas:
+                if not delta:
+                    continue
+                parts.append(delta)
+                segment = buffer.feed(delta)
+                if segment is None:
+                    continue
+                pending += segment
+                if not replied and len(pending.strip()) >= self.first_min_chars:
+                    await self._reply(reply_token, target, pending)
+                    self.ttfm.observe(time.perf_counter() - started)
+                    replied, pending = True, ''
+                elif replied and len(pending) >= self.push_min_chars:
+                    await self._push(target, pending)
+                    pending = ''
+        except Exception as e:
+            if not replied:
+                raise
+            # 已回覆第一段時，送出已生成的內容並告知中斷
+            self.interrupted += 1
+            logger.error(f"Streaming interrupted: {e}")
+            await self._push(target, f"{pending}{buffer.flush()}\n\n{INTERRUPTED_TEXT}".strip())
+            self.total.observe(time.perf_counter() - started)
+            return ''.join(parts)
+
+        pending += buffer.flush()
+        if not replied:
+            await self._reply(reply_token, target, pending)
+            self.ttfm.observe(time.perf_counter() - started)
+        else:
+            await self._push(target, pending)
+        self.total.observe(time.perf_counter() - started)
+        return ''.join(parts)
+
+    def stats(self) -> dict:
+        """輸出首則訊息時間與發送統計"""
+        return {
+            'streams': self.streams,
+            'pushes': self.pushes,
+            'reply_fallbacks': self.reply_fallbacks,
+            'interrupted': self.interrupted,
+            'time_to_first_message': self.ttfm.snapshot(),
+            'total': self.total.snapshot()
+        }
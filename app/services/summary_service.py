@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.client_service import clients
+from app.services.metrics_service import Histogram
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 摘要只需要的欄位，id 與時間戳記不送進提示
+PROJECTED_FIELDS = ('title', 'status', 'assignee', 'department', 'priority', 'due_date')
+OPEN_STATUSES = ('pending', 'in_progress', '未指派', '待處理', '進行中')
+
+MAP_PROMPT = "以下是任務清單的一部分（欄位：{fields}）。請用條列方式摘要重點、風險與延遲項目，不要重複列出每筆任務。\n\n{chunk}"
+MERGE_PROMPT = "以下是數份任務摘要，請合併成一份條列摘要，保留重點、風險與延遲項目。\n\n{chunk}"
+REDUCE_PROMPT = "以下是任務統計與各部分的摘要。請整合成一份簡潔的摘要報告，統計數字已另外列出，不需要重算。\n\n{stats}\n\n{partials}"
+SINGLE_PROMPT = "以下是任務統計與任務清單（欄位：{fields}）。請撰寫一份簡潔的摘要報告，統計數字已另外列出，不需要重算。\n\n{stats}\n\n{chunk}"
+
+_CJK = re.compile(r'[\u3000-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 數，安裝 tiktoken 時使用實際的編碼"""
+    # tiktoken 的編碼檔在第一次估算時才載入
+    encoding = clients.get('tiktoken')
+    if encoding is not None:
+        return len(encoding.encode(text))
+    cjk = len(_CJK.findall(text))
+    # 中文約每字 1.5 個 token，其餘約每 4 個字元 1 個 token
+    return int(cjk * 1.5 + (len(text) - cjk) / 4) + 1
+
+def _due(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        due = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return due.astimezone().replace(tzinfo=None) if due.tzinfo else due
+
+def project_task(task: Dict[str, Any]) -> str:
+    """將任務投影成精簡的一行文字"""
+    values = []
+    for field in PROJECTED_FIELDS:
+        value = task.get(field)
+        if field == 'due_date' and value:
+            value = str(value)[:10]
+        values.append(str(value).replace('|', '/').replace('\n', ' ') if value else '-')
+    return ' | '.join(values)
+
+def aggregate(tasks: List[Dict[str, Any]], now: Optional[datetime] = None, limit: int = 10) -> str:
+    """在本機計算統計與逾期清單，不交給模型計算"""
+    now = now or datetime.now()
+    by_status = Counter(task.get('status') or 'pending' for task in tasks)
+    by_department = Counter(task.get('department') for task in tasks if task.get('department'))
+    by_assignee = Counter(task.get('assignee') for task in tasks if task.get('assignee'))
+    overdue, due_soon = [], []
+    for task in tasks:
+        if task.get('status') not in OPEN_STATUSES:
+            continue
+        due = _due(task.get('due_date'))
+        if due is None:
+            continue
+        if due < now:
+            overdue.append((due, task))
+        elif due < now + timedelta(days=7):
+            due_soon.append((due, task))
+
+    def listing(items: List[Tuple[datetime, Dict[str, Any]]]) -> List[str]:
+        items.sort(key=lambda item: item[0])
+        lines = [
+            f"- {task.get('title') or '（未命名）'}（{task.get('assignee') or '未指派'}，{due:%m/%d}）"
+            for due, task in items[:limit]
+        ]
+        if len(items) > limit:
+            lines.append(f"- 另有 {len(items) - limit} 項")
+        return lines
+
+    lines = [f"總任務數：{len(tasks)}"]
+    lines.append("狀態：" + "、".join(f"{status} {count}" for status, count in by_status.most_common()))
+    if by_department:
+        lines.append("部門：" + "、".join(f"{dept} {count}" for dept, count in by_department.most_common(limit)))
+    if by_assignee:
+        lines.append("負責人（前 {0} 名）：".format(min(limit, len(by_assignee))) +
+                     "、".join(f"{who} {count}" for who, count in by_assignee.most_common(limit)))
+    if overdue:
+        lines.append(f"逾期（{len(overdue)}）：")
+        lines.extend(listing(overdue))
+    if due_soon:
+        lines.append(f"七天內到期（{len(due_soon)}）：")
+        lines.extend(listing(due_soon))
+    return '\n'.join(lines)
+
+def chunk_lines(lines: Iterable[str], budget: int) -> List[str]:
+    """依 token 預算將多行文字分塊"""
+    chunks: List[str] = []
+    current: List[str] = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if current and used + cost > budget:
+            chunks.append('\n'.join(current))
+            current, used = [], 0
+        current.append(line)
+        used += cost
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+# complete(prompt) 回傳 (文字, 提示 token 數, 完成 token 數)
+Completion = Callable[[str], Awaitable[Tuple[str, int, int]]]
+
+class TaskSummarizer:
+    """
+    任務摘要的 map-reduce 流程
+
+    只投影必要欄位成精簡文字，統計與逾期清單在本機計算；任務清單依 token
+    預算分塊，各塊摘要在並行上限內同時產生，最後再合併成一份報告。每個
+    階段的耗時與 token 數都會記錄。
+    """
+
+    def __init__(self, chunk_tokens: Optional[int] = None, concurrency: Optional[int] = None):
+        self.chunk_tokens = chunk_tokens or int(os.getenv('SUMMARY_CHUNK_TOKENS', '3000'))
+        self.concurrency = concurrency or int(os.getenv('SUMMARY_CONCURRENCY', '4'))
+        self.latency: Dict[str, Histogram] = {
+            stage: Histogram() for stage in ('prepare', 'map', 'reduce', 'total')
+        }
+        self.tokens: Dict[str, Counter] = {stage: Counter() for stage in ('map', 'reduce')}
+        self.runs = 0
+        self.chunks = 0
+        self.failures = 0
+
+    async def _call(self, complete: Completion, stage: str, prompt: str) -> str:
+        text, prompt_tokens, completion_tokens = await complete(prompt)
+        self.tokens[stage]['prompt'] += prompt_tokens or estimate_tokens(prompt)
+        self.tokens[stage]['completion'] += completion_tokens or estimate_tokens(text or '')
+        self.tokens[stage]['calls'] += 1
+        return text or ''
+
+    async def _map(self, complete: Completion, chunks: List[str], template: str, **fields) -> List[str]:
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(chunk: str) -> str:
+            async with semaphore:
+                return await self._call(complete, 'map', template.format(chunk=chunk, **fields))
+
+        try:
+            return await asyncio.gather(*(run(chunk) for chunk in chunks))
+        finally:
+            self.latency['map'].observe(time.perf_counter() - started)
+
+    async def summarize(
+        self,
+        tasks: List[Dict[str, Any]],
+        complete: Completion,
+        stats: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """
+        產生摘要，回傳 (本機統計, 模型撰寫的摘要)；stats 為呼叫端已算好的本機統計
+        """
+        started = time.perf_counter()
+        self.runs += 1
+        try:
+            lines = [project_task(task) for task in tasks]
+            if stats is None:
+                stats = aggregate(tasks)
+            chunks = chunk_lines(lines, self.chunk_tokens)
+            self.chunks += len(chunks)
+            self.latency['prepare'].observe(time.perf_counter() - started)
+            fields = ' | '.join(PROJECTED_FIELDS)
+
+            if len(chunks) <= 1:
+                reduce_started = time.perf_counter()
+                prompt = SINGLE_PROMPT.format(fields=fields, stats=stats, chunk=chunks[0] if chunks else '')
+                prose = await self._call(complete, 'reduce', prompt)
+                self.latency['reduce'].observe(time.perf_counter() - reduce_started)
+                return stats, prose
+
+            partials = await self._map(complete, chunks, MAP_PROMPT, fields=fields)
+            # 部分摘要仍超出預算時再分層合併
+            while estimate_tokens('\n\n'.join(partials)) > self.chunk_tokens and len(partials) > 1:
+                groups = chunk_lines(partials, self.chunk_tokens)
+                if len(groups) >= len(partials):
+                    break
+                partials = await self._map(complete, groups, MERGE_PROMPT)
+
+            reduce_started = time.perf_counter()
+            prompt = REDUCE_PROMPT.format(stats=stats, partials='\n\n'.join(partials))
+            prose = await self._call(complete, 'reduce', prompt)
+            self.latency['reduce'].observe(time.perf_counter() - reduce_started)
+            return stats, prose
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.latency['total'].observe(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        """輸出各階段的耗時與 token 統計"""
+        return {
+            'runs': self.runs,
+            'chunks': self.chunks,
+            'failures': self.failures,
+            'latency': {stage: histogram.snapshot() for stage, histogram in self.latency.items()},
+            'tokens': {stage: dict(counts) for stage, counts in self.tokens.items()}
+        }
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.metrics_service import Histogram
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 不計標點、空白與表情符號，少於這個字數的訊息不可能包含任務
+MIN_TASK_CHARS = int(os.getenv('EXTRACTION_MIN_CHARS', '3'))
+
+def trivial_prefilter(text: str) -> Optional[bool]:
+    """
+    任務提取的預先過濾：只排除空白、只有表情符號或極短的訊息（回傳 False），其餘一律提取
+
+    聊天用的相關性判斷會把「週末要加班趕報告」這類訊息判為無關，不能用來丟棄任務。
+    """
+    if len(re.findall(r'\w', text)) < MIN_TASK_CHARS:
+        return False
+    return None
+
+class _Pending:
+    __slots__ = ('message_id', 'text', 'user_id', 'enqueued')
+
+    def __init__(self, message_id: str, text: str, user_id: Optional[str]):
+        self.message_id = message_id
+        self.text = text
+        self.user_id = user_id
+        self.enqueued = time.monotonic()
+
+class ExtractionBatcher:
+    """
+    群組訊息的任務提取微批次
+
+    每個群組的訊息先緩衝 EXTRACTION_BATCH_WINDOW 秒或累積 EXTRACTION_BATCH_SIZE 則，
+    再以單次請求提取，結果依訊息編號對回原訊息，找到的任務一次批次寫入。
+    prefilter 回傳 False 的訊息（空白或極短的閒聊）不進入批次。
+    """
+
+    def __init__(
+        self,
+        extract: Callable[[List[str]], Awaitable[List[Optional[Dict[str, Any]]]]],
+        save: Callable[[List[Dict[str, Any]]], Awaitable[List[str]]],
+        prefilter: Optional[Callable[[str], Optional[bool]]] = None,
+        window: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.extract = extract
+        self.save = save
+        self.prefilter = prefilter
+        self.window = window if window is not None else float(os.getenv('EXTRACTION_BATCH_WINDOW', '5'))
+        self.max_batch = max_batch or int(os.getenv('EXTRACTION_BATCH_SIZE', '20'))
+        self.concurrency = concurrency or int(os.getenv('EXTRACTION_CONCURRENCY', '4'))
+        self._buffers: Dict[str, List[_Pending]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._inflight: set = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # 統計
+        self.lag = Histogram()
+        self.batch_sizes = Histogram(buckets=(1, 2, 5, 10, 20, 50, 100))
+        self.messages = 0
+        self.filtered = 0
+        self.calls = 0
+        self.tasks_found = 0
+        self.tasks_saved = 0
+        self.failures = 0
+
+    def add(self, group_id: str, message_id: str, text: str, user_id: Optional[str] = None) -> None:
+        """加入一則訊息，需在事件迴圈中呼叫"""
+        self.messages += 1
+        if self.prefilter is not None and self.prefilter(text) is False:
+            self.filtered += 1
+            return
+        buffer = self._buffers.setdefault(group_id, [])
+        buffer.append(_Pending(message_id, text, user_id))
+        if len(buffer) >= self.max_batch:
+            self._flush(group_id)
+        elif group_id not in self._timers:
+            self._timers[group_id] = asyncio.get_running_loop().call_later(self.window, self._flush, group_id)
+
+    def _flush(self, group_id: str) -> None:
+        timer = self._timers.pop(group_id, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._buffers.pop(group_id, None)
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._process(group_id, batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _process(self, group_id: str, batch: List[_Pending]) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            self.calls += 1
+            self.batch_sizes.observe(len(batch))
+            try:
+                results = await self.extract([item.text for item in batch])
+                found: List[Tuple[_Pending, Dict[str, Any]]] = [
+                    (item, result) for item, result in zip(batch, results) if result
+                ]
+                self.tasks_found += len(found)
+                if found:
+                    ids = await self.save([self._task_info(group_id, item, result) for item, result in found])
+                    self.tasks_saved += len(ids)
+                    logger.info(
+                        f"Extracted {len(ids)} tasks from group {group_id}: "
+                        f"{[item.message_id for item, _ in found]}"
+                    )
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Error extracting tasks for group {group_id}: {e}")
+            finally:
+                now = time.monotonic()
+                for item in batch:
+                    self.lag.observe(now - item.enqueued)
+
+    @staticmethod
+    def _task_info(group_id: str, item: _Pending, result: Dict[str, Any]) -> Dict[str, Any]:
+        description = result.get('description') or item.text
+        due_date = result.get('due_date')
+        return {
+            'title': description[:50],
+            'description': description,
+            'assignee': result.get('assignee'),
+            'due_date': due_date.isoformat() if due_date is not None else None,
+            'priority': {'高': 'high', '中': 'medium', '低': 'low'}.get(result.get('priority'), 'medium')
+        }
+
+    async def close(self) -> None:
+        """送出所有緩衝中的訊息並等待處理完成"""
+        for group_id in list(self._buffers):
+            self._flush(group_id)
+        if self._inflight:
+            await asyncio.gather(*list(self._inflight), return_exceptions=True)
+
+    def stats(self) -> dict:
+        """輸出批次數、每千則訊息的提取呼叫數與延遲"""
+        return {
+            'messages': self.messages,
+            'filtered': self.filtered,
+            'buffered': sum(len(buffer) for buffer in self._buffers.values()),
+            'calls': self.calls,
+            'calls_per_1000_messages': self.calls / self.messages * 1000 if self.messages else 0.0,
+            'tasks_found': self.tasks_found,
+            'tasks_saved': self.tasks_saved,
+            'failures': self.failures,
+            'batch_size': self.batch_sizes.snapshot(),
+            'lag': self.lag.snapshot()
+        }
@@ -0,0 +1,183 @@
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 任務索引：(狀態, 負責人, 部門, 建立日期)
+TaskKey = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+def _created_day(created_at: Any) -> Optional[str]:
+    if not created_at:
+        return None
+    if isinstance(created_at, datetime):
+        return created_at.date().isoformat()
+    # ISO 字串的前 10 碼即為日期
+    return str(created_at)[:10]
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+class _AggregateState:
+    """
+    單一版本的聚合計數，重新校正時會整份替換
+    """
+    __slots__ = ('tasks', 'global_counts', 'by_user', 'by_department', 'daily')
+
+    def __init__(self):
+        self.tasks: Dict[str, TaskKey] = {}
+        self.global_counts: Counter = Counter()
+        self.by_user: Dict[str, Counter] = {}
+        self.by_department: Dict[str, Counter] = {}
+        # 依建立日期分桶的狀態計數
+        self.daily: Dict[str, Counter] = {}
+
+    def _apply(self, key: TaskKey, delta: int) -> None:
+        status, assignee, department, day = key
+        self.global_counts[status] += delta
+        if assignee:
+            self.by_user.setdefault(assignee, Counter())[status] += delta
+        if department:
+            self.by_department.setdefault(department, Counter())[status] += delta
+        if day:
+            self.daily.setdefault(day, Counter())[status] += delta
+
+    def upsert(self, task: Dict[str, Any]) -> None:
+        task_id = task.get('id')
+        if task_id is None:
+            return
+        key = (
+            _intern(task.get('status') or 'pending'),
+            _intern(task.get('assignee')),
+            _intern(task.get('department')),
+            _intern(_created_day(task.get('created_at')))
+        )
+        old = self.tasks.get(task_id)
+        if old is not None:
+            self._apply(old, -1)
+        self.tasks[task_id] = key
+        self._apply(key, 1)
+
+    def set_status(self, task_id: str, status: str) -> bool:
+        old = self.tasks.get(task_id)
+        if old is None:
+            return False
+        new = (_intern(status),) + old[1:]
+        self._apply(old, -1)
+        self.tasks[task_id] = new
+        self._apply(new, 1)
+        return True
+
+    def prune(self, keep_from: str) -> None:
+        for day in [d for d in self.daily if d < keep_from]:
+            del self.daily[day]
+
+class TaskAggregates:
+    """
+    任務狀態的增量聚合
+
+    維護全域、每位負責人、每個部門的狀態計數，以及最近 N 週依建立日期
+    分桶的計數。由 save_task / update_task_status 增量更新，並定期以
+    完整資料重新校正，讓 /status 與週報不必掃描整張任務表。
+    """
+
+    def __init__(self, weeks: Optional[int] = None):
+        self.weeks = weeks or int(os.getenv('TASK_STATS_WEEKS', '4'))
+        self._state = _AggregateState()
+        # 校正期間的增量更新，校正完成後重放
+        self._journal: Optional[List[Tuple[str, tuple]]] = None
+        self.loaded = False
+        self.last_reconciled: Optional[datetime] = None
+        self.reconcile_seconds = 0.0
+        self.drift = 0
+        self.unknown_updates = 0
+
+    def _keep_from(self) -> str:
+        return (date.today() - timedelta(weeks=self.weeks)).isoformat()
+
+    # 增量更新
+    def record_created(self, task: Dict[str, Any]) -> None:
+        """新任務建立後呼叫"""
+        self._state.upsert(task)
+        if self._journal is not None:
+            self._journal.append(('upsert', (dict(task),)))
+
+    def record_status(self, task_id: str, status: str) -> None:
+        """任務狀態變更後呼叫"""
+        if not self._state.set_status(task_id, status):
+            self.unknown_updates += 1
+        if self._journal is not None:
+            self._journal.append(('status', (task_id, status)))
+
+    async def reconcile(self, loader: Callable[[], AsyncIterator[List[Dict[str, Any]]]]) -> None:
+        """
+        以逐頁讀取的完整任務資料重建聚合，並重放校正期間的增量更新
+        """
+        started = time.perf_counter()
+        self._journal = []
+        try:
+            state = _AggregateState()
+            async for page in loader():
+                for row in page:
+                    state.upsert(row)
+            for operation, args in self._journal:
+                if operation == 'upsert':
+                    state.upsert(*args)
+                else:
+                    state.set_status(*args)
+            state.prune(self._keep_from())
+        finally:
+            self._journal = None
+        if self.loaded:
+            self.drift = sum(
+                abs(state.global_counts[s] - self._state.global_counts[s])
+                for s in set(state.global_counts) | set(self._state.global_counts)
+            )
+            if self.drift:
+                logger.warning(f"Task aggregates drifted by {self.drift} before reconcile")
+        self._state = state
+        self.loaded = True
+        self.last_reconciled = datetime.now()
+        self.reconcile_seconds = time.perf_counter() - started
+
+    # 查詢
+    def status_counts(self, assignee: Optional[str] = None, department: Optional[str] = None) -> Dict[str, int]:
+        """獲取狀態計數，可指定負責人或部門"""
+        if assignee:
+            counts = self._state.by_user.get(assignee, Counter())
+        elif department:
+            counts = self._state.by_department.get(department, Counter())
+        else:
+            counts = self._state.global_counts
+        return {status: count for status, count in counts.items() if count}
+
+    def created_since(self, days: int = 7) -> Dict[str, int]:
+        """獲取最近幾天建立的任務依狀態的計數"""
+        since = (date.today() - timedelta(days=days)).isoformat()
+        totals: Counter = Counter()
+        for day, counts in self._state.daily.items():
+            if day >= since:
+                totals.update(counts)
+        return {status: count for status, count in totals.items() if count}
+
+    def stats(self) -> dict:
+        """輸出聚合層狀態"""
+        return {
+            'loaded': self.loaded,
+            'tasks': len(self._state.tasks),
+            'users': len(self._state.by_user),
+            'departments': len(self._state.by_department),
+            'days': len(self._state.daily),
+            'last_reconciled': self.last_reconciled.isoformat() if self.last_reconciled else None,
+            'reconcile_seconds': self.reconcile_seconds,
+            'drift': self.drift,
+            'unknown_updates': self.unknown_updates
+        }
+
+# 全域共用的任務聚合
+task_aggregates = TaskAggregates()
@@ -0,0 +1,3 @@
+"""
+效能基準測試與本機替身
+"""
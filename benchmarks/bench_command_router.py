@@ -0,0 +1,109 @@
+"""
+比較舊版 if/elif 子字串比對與預先編譯的意圖路由的分派速度
+
+語料混合指令、查詢與一般聊天，目標為每秒至少一萬則：
+
+    python -m benchmarks.bench_command_router --messages 10000 --repeat 5
+"""
+import argparse
+import json
+import random
+import time
+
+from app.services.line_service import router
+from app.services.router_service import Intent, Router
+
+MESSAGES = [
+    '@AI 這個誰做？', '@AI 報表交了沒', '預算表交了沒?', '@AI 昨天說的行銷簡報是誰接的？',
+    '官網改版是誰接的', '@AI 這週的事', '我的任務', '部門任務', '業務部門任務',
+    '/自我介紹\n姓名：小明\n部門：業務\n職稱：專員', '/幫助',
+    '哈哈好喔', '中午要吃什麼？', '收到，我晚點看一下', '今天好熱，有人要喝飲料嗎', '👍',
+    '明天下午三點開會，記得帶筆電，會議室在七樓', '辛苦了大家，這次活動很成功'
+]
+
+def legacy(command: str):
+    """舊版做法：依序以子字串比對，參數寫死在程式中"""
+    command = command.lower()
+    if command.startswith('/自我介紹'):
+        return 'introduction', {}
+    elif "這個誰做" in command:
+        return 'unassigned_tasks', {}
+    elif "報表交了沒" in command:
+        return 'report_status', {'keyword': '報表'}
+    elif "昨天說的行銷簡報" in command:
+        return 'specific_task', {'keyword': '行銷簡報'}
+    elif "這週的事" in command:
+        return 'weekly_report', {}
+    elif "我的任務" in command:
+        return 'my_tasks', {}
+    elif "部門任務" in command:
+        return 'department_tasks', {}
+    return None
+
+def bench(dispatch, messages: list, repeat: int) -> dict:
+    matched = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in messages:
+            if dispatch(text) is not None:
+                matched += 1
+    elapsed = time.perf_counter() - started
+    total = len(messages) * repeat
+    return {
+        'messages_per_second': total / elapsed,
+        'microseconds_per_message': elapsed / total * 1e6,
+        'matched_ratio': matched / total
+    }
+
+def scaling(messages: list, counts: list) -> dict:
+    """觸發詞數量增加時，逐一子字串比對與自動機的差異"""
+    rng = random.Random(1)
+    alphabet = '任務報表會議簡報預算客戶專案進度回饋資料整理檢討'
+    results = {}
+    for count in counts:
+        phrases = [''.join(rng.choice(alphabet) for _ in range(4)) for _ in range(count)]
+        scaled = Router([Intent(f'intent_{i}', [phrase]) for i, phrase in enumerate(phrases)])
+        scaled.compile()
+
+        def linear(text, phrases=phrases):
+            text = text.lower()
+            for phrase in phrases:
+                if phrase in text:
+                    return phrase
+            return None
+
+        results[count] = {
+            'linear': bench(linear, messages, 1)['messages_per_second'],
+            'router': bench(scaled.match, messages, 1)['messages_per_second']
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    messages = [rng.choice(MESSAGES) for _ in range(args.messages)]
+    started = time.perf_counter()
+    router.compile()
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    def route(text):
+        match = router.match(text)
+        return match and (match.intent.name, match.args)
+
+    results = {
+        'messages': args.messages,
+        'compile_ms': compile_ms,
+        'legacy': bench(legacy, messages, args.repeat),
+        'router': bench(route, messages, args.repeat),
+        'scaling_messages_per_second': scaling(messages, [10, 100, 1000]),
+        # 兩種做法對各語料的分派結果
+        'dispatch': {text: {'legacy': legacy(text), 'router': route(text)} for text in MESSAGES}
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
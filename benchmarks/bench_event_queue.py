@@ -0,0 +1,137 @@
+"""
+比較單一 FIFO 佇列與依對話/用戶排序的事件佇列：同一對話與同一用戶的處理順序、
+同時處理同一對話或同一用戶的次數，以及一個訊息很多的群組對其他用戶等待時間的影響
+
+群組成員同時也會在一對一聊天中發訊息，用來檢查同一用戶跨對話的順序。
+
+    python -m benchmarks.bench_event_queue --users 200 --group-messages 300 --workers 8
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from types import SimpleNamespace
+
+from app.services.event_queue_service import ORDERING_KEYS, EventQueue
+
+CHATTY_GROUP = 'Cchatty'
+
+def make_events(args, rng: random.Random) -> list:
+    """先湧入群組訊息（來自前 50 位用戶），接著是各用戶的一對一訊息"""
+    events = []
+    user_seq = {}
+    group_seq = 0
+
+    def add(user, group_id=None):
+        nonlocal group_seq
+        user_seq[user] = user_seq.get(user, -1) + 1
+        source = SimpleNamespace(group_id=group_id, user_id=user) if group_id else SimpleNamespace(user_id=user)
+        conversation = group_id or user
+        seq = group_seq if group_id else user_seq[user]
+        if group_id:
+            group_seq += 1
+        events.append(SimpleNamespace(source=source, user=user, conversation=conversation,
+                                      conversation_seq=seq, user_seq=user_seq[user]))
+
+    for _ in range(args.group_messages):
+        add(f'U{rng.randrange(50)}', CHATTY_GROUP)
+    for _ in range(args.users * args.messages):
+        add(f'U{rng.randrange(args.users)}')
+    # 一對一訊息的對話序號即用戶序號中屬於一對一的部分，重新編號
+    dm_seq = {}
+    for event in events:
+        if event.conversation != CHATTY_GROUP:
+            dm_seq[event.user] = dm_seq.get(event.user, -1) + 1
+            event.conversation_seq = dm_seq[event.user]
+    return events
+
+def percentile(samples: list, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000 if samples else 0.0
+
+class OrderCheck:
+    """記錄某個維度（對話或用戶）的順序違規與同時處理次數"""
+
+    def __init__(self):
+        self.running = {}
+        self.highest = {}
+        self.violations = 0
+        self.overlaps = 0
+
+    def start(self, key) -> None:
+        self.running[key] = self.running.get(key, 0) + 1
+        if self.running[key] > 1:
+            self.overlaps += 1
+
+    def finish(self, key, seq: int) -> None:
+        self.running[key] -= 1
+        if seq < self.highest.get(key, -1):
+            self.violations += 1
+        self.highest[key] = max(self.highest.get(key, -1), seq)
+
+async def run(mode: str, events: list, args) -> dict:
+    rng = random.Random(args.seed)
+    mu = math.log(args.latency)
+    conversations = OrderCheck()
+    users = OrderCheck()
+    finished = {}
+    enqueued_at = {}
+
+    async def handler(event):
+        conversations.start(event.conversation)
+        users.start(event.user)
+        await asyncio.sleep(rng.lognormvariate(mu, 0.5))
+        conversations.finish(event.conversation, event.conversation_seq)
+        users.finish(event.user, event.user_seq)
+        finished[id(event)] = time.monotonic()
+
+    # fifo：每則事件各自一個 key，等同舊版的單一 FIFO 佇列
+    if mode == 'fifo':
+        keys = lambda event: (id(event),)
+    else:
+        keys = ORDERING_KEYS[mode]
+    queue = EventQueue(handler, maxsize=len(events), workers=args.workers, keys=keys, key_maxsize=len(events))
+    await queue.start()
+    started = time.monotonic()
+    for event in events:
+        enqueued_at[id(event)] = time.monotonic()
+        queue.put_nowait(event)
+    await queue.drain(timeout=3600)
+    elapsed = time.monotonic() - started
+
+    quiet = [finished[id(e)] - enqueued_at[id(e)] for e in events if e.conversation != CHATTY_GROUP]
+    chatty = [finished[id(e)] - enqueued_at[id(e)] for e in events if e.conversation == CHATTY_GROUP]
+    return {
+        'seconds': elapsed,
+        'events_per_second': len(events) / elapsed,
+        'conversation_ordering_violations': conversations.violations,
+        'conversation_overlaps': conversations.overlaps,
+        'user_ordering_violations': users.violations,
+        'user_overlaps': users.overlaps,
+        'direct_messages_p50_ms': percentile(quiet, 0.50),
+        'direct_messages_p99_ms': percentile(quiet, 0.99),
+        'chatty_group_p50_ms': percentile(chatty, 0.50),
+        'chatty_group_p99_ms': percentile(chatty, 0.99),
+        'max_key_depth': queue.max_key_depth
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=3, help='每位用戶平均的一對一訊息數')
+    parser.add_argument('--group-messages', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02, help='處理一則事件的中位數秒數')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    events = make_events(args, random.Random(args.seed))
+    results = {'events': len(events), 'workers': args.workers}
+    for mode in ('fifo', 'conversation', 'user'):
+        results[mode] = asyncio.run(run(mode, events, args))
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
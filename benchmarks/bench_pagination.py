@@ -0,0 +1,119 @@
+"""
+比較一次 select('*') 讀取整張任務表與 keyset 分頁、欄位投影逐頁讀取的峰值記憶體
+
+資料寫入 SQLite 檔案，各模式在獨立的子行程中執行以分別量測峰值 RSS：
+
+    python -m benchmarks.bench_pagination --rows 1000000 --db /tmp/bench_tasks.sqlite
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app.services import database_service
+from app.services.db_client_service import execute, set_client
+from benchmarks.fake_supabase import AsyncFakeSupabase
+
+MODES = ('legacy', 'paged_all_columns', 'paged')
+COLUMNS = ('id', 'title', 'description', 'assignee', 'department', 'due_date',
+           'priority', 'status', 'created_at', 'updated_at')
+
+def seed(path: str, rows: int) -> None:
+    """直接以 executemany 寫入，不經過查詢建構器"""
+    rng = random.Random(0)
+    now = datetime.now().astimezone()
+    client = AsyncFakeSupabase(path=path)
+    client._ensure_columns('tasks', COLUMNS)
+    placeholders = ', '.join('?' for _ in COLUMNS)
+    client.conn.execute('begin')
+    batch = []
+    for i in range(rows):
+        created = (now - timedelta(seconds=rng.randrange(86400 * 365))).isoformat()
+        batch.append((
+            f'{rng.getrandbits(128):032x}', f'任務 {i}', f'整理第 {i} 份報表並寄給主管，附上本月數據與說明',
+            f'U{rng.randrange(500)}', f'部門{rng.randrange(20)}', created, rng.choice(['high', 'medium', 'low']),
+            rng.choice(['pending', 'in_progress', 'completed']), created, created
+        ))
+        if len(batch) == 50000:
+            client.conn.executemany(f'insert into tasks values ({placeholders})', batch)
+            batch = []
+    if batch:
+        client.conn.executemany(f'insert into tasks values ({placeholders})', batch)
+    client.conn.execute('commit')
+    client.create_index('tasks', 'created_at', 'id')
+    client.conn.close()
+
+def rss_mb() -> float:
+    # Linux 的 ru_maxrss 單位為 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def count_legacy() -> dict:
+    """舊版做法：select('*') 一次讀回所有資料列再計數"""
+    response = await execute('tasks.select', database_service._table('tasks').select('*'))
+    counts = {}
+    for task in response.data:
+        counts[task['status']] = counts.get(task['status'], 0) + 1
+    return counts
+
+async def count_paged(columns: str, page_size: int) -> dict:
+    counts = {}
+    async for page in database_service.iter_tasks(columns=columns, page_size=page_size):
+        for task in page:
+            counts[task['status']] = counts.get(task['status'], 0) + 1
+    return counts
+
+def run_mode(mode: str, path: str, page_size: int) -> dict:
+    client = AsyncFakeSupabase(path=path)
+    set_client(client)
+    baseline = rss_mb()
+    started = time.perf_counter()
+    if mode == 'legacy':
+        counts = asyncio.run(count_legacy())
+    elif mode == 'paged_all_columns':
+        counts = asyncio.run(count_paged(database_service.TASK_COLUMNS, page_size))
+    else:
+        counts = asyncio.run(count_paged('id,status,created_at', page_size))
+    return {
+        'seconds': time.perf_counter() - started,
+        'rows': sum(counts.values()),
+        'requests': client.requests,
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': rss_mb(),
+        'growth_mb': rss_mb() - baseline
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--db', default='/tmp/bench_tasks.sqlite')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--mode', choices=MODES, help='只執行單一模式（由主行程呼叫）')
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.db, args.page_size)))
+        return
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    started = time.perf_counter()
+    seed(args.db, args.rows)
+    results = {'rows': args.rows, 'page_size': args.page_size, 'seed_seconds': time.perf_counter() - started}
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_pagination', '--mode', mode,
+             '--db', args.db, '--page-size', str(args.page_size)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+    os.remove(args.db)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
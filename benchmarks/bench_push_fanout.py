@@ -0,0 +1,59 @@
+"""
+比較逐筆 push 與推播引擎（去重、合併、multicast、並行限速）的發送效率
+
+    python -m benchmarks.bench_push_fanout --tasks 2000 --users 300 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.services.push_service import PushFanout
+from benchmarks.fake_line import FakeLineBotApi
+
+def build_notifications(tasks: int, users: int):
+    notifications = []
+    for i in range(tasks):
+        assignee = f'U{random.randrange(users):032d}'
+        notifications.append((assignee, f"提醒：任務「任務 {i}」即將在24小時內到期！"))
+    # 每日摘要：每位負責人收到相同內容
+    summary = "📊 每日任務摘要\n\n" + "\n".join(f"- 任務 {i}" for i in range(20))
+    notifications += [(f'U{u:032d}', summary) for u in range(users)]
+    return notifications
+
+def serial(api: FakeLineBotApi, notifications) -> dict:
+    started = time.monotonic()
+    failures = 0
+    for recipient, text in notifications:
+        try:
+            api.push_message(recipient, [text])
+        except Exception:
+            failures += 1
+    elapsed = time.monotonic() - started
+    return {'seconds': elapsed, 'requests': api.requests, 'failures': failures}
+
+async def fanout(api: FakeLineBotApi, notifications, rate: float, concurrency: int) -> dict:
+    engine = PushFanout(api, rate=rate, burst=concurrency, concurrency=concurrency)
+    return await engine.deliver(notifications)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.02, help='每次請求的模擬延遲（秒）')
+    parser.add_argument('--rate', type=float, default=200, help='引擎的每秒請求上限')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--server-limit', type=int, default=None, help='模擬 API 的每秒請求上限（超過回 429）')
+    args = parser.parse_args()
+
+    notifications = build_notifications(args.tasks, args.users)
+    results = {
+        'notifications': len(notifications),
+        'serial': serial(FakeLineBotApi(args.latency, args.server_limit), notifications),
+        'fanout': asyncio.run(fanout(FakeLineBotApi(args.latency, args.server_limit), notifications, args.rate, args.concurrency))
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
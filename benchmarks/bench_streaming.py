@@ -0,0 +1,54 @@
+"""
+比較等待完整回覆與串流回覆的首則訊息時間（time-to-first-message）
+
+    python -m benchmarks.bench_streaming --ttft 0.5 --tokens-per-second 30 --repeat 3
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from linebot.models import TextSendMessage
+
+from app.services.stream_service import StreamingReply
+from benchmarks.fake_line import FakeLineBotApi
+from benchmarks.fake_llm import FakeStreamingLLM
+
+async def run(ttft: float, tokens_per_second: float, repeat: int, latency: float) -> dict:
+    llm = FakeStreamingLLM(ttft=ttft, tokens_per_second=tokens_per_second)
+
+    api = FakeLineBotApi(latency=latency)
+    started = time.monotonic()
+    answer = await llm.complete(repeat=repeat)
+    await asyncio.to_thread(api.reply_message, 'blocking', TextSendMessage(text=answer))
+    blocking = {
+        'time_to_first_message': api.sent_at[0] - started,
+        'total': api.sent_at[-1] - started,
+        'messages': len(api.sent_at)
+    }
+
+    api = FakeLineBotApi(latency=latency)
+    streamer = StreamingReply(api)
+    started = time.monotonic()
+    content = await streamer.deliver('streaming', 'U0', llm.stream(repeat=repeat))
+    delivered = ''.join(api.replies['streaming'] + api.inbox['U0'])
+    streaming = {
+        'time_to_first_message': api.sent_at[0] - started,
+        'total': api.sent_at[-1] - started,
+        'messages': len(api.sent_at),
+        'complete': delivered.replace('\n', '') == content.replace('\n', '')
+    }
+    return {'answer_chars': len(answer), 'blocking': blocking, 'streaming': streaming}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ttft', type=float, default=0.5, help='首個 token 前的延遲（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=30.0)
+    parser.add_argument('--repeat', type=int, default=3, help='回覆長度（範例回覆重複次數）')
+    parser.add_argument('--latency', type=float, default=0.05, help='LINE API 的模擬延遲（秒）')
+    args = parser.parse_args()
+    result = asyncio.run(run(args.ttft, args.tokens_per_second, args.repeat, args.latency))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
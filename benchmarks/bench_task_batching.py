@@ -0,0 +1,92 @@
+"""
+比較逐則提取任務與依群組微批次提取的呼叫數與延遲
+
+以本機 LLM 替身與資料庫替身模擬多個群組同時聊天：
+
+    python -m benchmarks.bench_task_batching --messages 1000 --groups 20 --rate 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.services import database_service, openai_service
+from app.services.db_client_service import set_client
+from app.services.llm_service import StubBackend, llm_client
+from app.services.metrics_service import Histogram
+from app.services.task_batch_service import ExtractionBatcher, trivial_prefilter
+from benchmarks.fake_supabase import AsyncFakeSupabase
+
+CHATTER = ['哈哈好喔', '中午要吃什麼？', '收到', '晚點再說', '👍', '今天好熱', '誰有充電線', '辛苦了']
+TASKS = ['小明明天下午前把簡報給我', '週五前請業務部整理客戶回饋', '阿華負責準備下週一的會議資料',
+         '報表 6/30 截止，小美處理', '今天下班前更新任務狀態']
+
+def make_messages(count: int, groups: int, task_ratio: float) -> list:
+    rng = random.Random(0)
+    return [
+        (f'C{rng.randrange(groups)}', f'm{i}', rng.choice(TASKS) if rng.random() < task_ratio else rng.choice(CHATTER))
+        for i in range(count)
+    ]
+
+async def per_message(messages: list, rate: float) -> dict:
+    calls_before = llm_client.backend.calls
+    lag = Histogram()
+
+    async def handle(text):
+        started = time.monotonic()
+        result = await openai_service.analyze_message(text)
+        if result:
+            await database_service.save_task({
+                'title': result.get('description', text)[:50],
+                'description': result.get('description'),
+                'due_date': result['due_date'].isoformat() if result.get('due_date') else None
+            })
+        lag.observe(time.monotonic() - started)
+
+    tasks = []
+    for _, _, text in messages:
+        tasks.append(asyncio.create_task(handle(text)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    calls = llm_client.backend.calls - calls_before
+    return {'calls': calls, 'calls_per_1000_messages': calls / len(messages) * 1000, 'lag': lag.snapshot()}
+
+async def batched(messages: list, rate: float, window: float, max_batch: int) -> dict:
+    batcher = ExtractionBatcher(
+        openai_service.analyze_messages, database_service.save_tasks,
+        prefilter=trivial_prefilter, window=window, max_batch=max_batch
+    )
+    for group_id, message_id, text in messages:
+        batcher.add(group_id, message_id, text)
+        await asyncio.sleep(1 / rate)
+    await batcher.close()
+    return batcher.stats()
+
+async def run(count: int, groups: int, rate: float, task_ratio: float, latency: str, window: float, max_batch: int) -> dict:
+    set_client(AsyncFakeSupabase(latency=0.01))
+    llm_client._backend = StubBackend(latency=latency)
+    messages = make_messages(count, groups, task_ratio)
+    return {
+        'messages': count,
+        'groups': groups,
+        'per_message': await per_message(messages, rate),
+        'batched': await batched(messages, rate, window, max_batch)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=50, help='每秒訊息數')
+    parser.add_argument('--task-ratio', type=float, default=0.1, help='含任務訊息的比例')
+    parser.add_argument('--latency', default='lognormal:0.8,0.5', help='LLM 替身的延遲分佈')
+    parser.add_argument('--window', type=float, default=5.0)
+    parser.add_argument('--max-batch', type=int, default=20)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.messages, args.groups, args.rate, args.task_ratio,
+                             args.latency, args.window, args.max_batch))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
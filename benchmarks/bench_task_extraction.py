@@ -0,0 +1,79 @@
+"""
+比較任務提取參數的解析方式：舊版 eval、json + 編譯後的結構驗證、orjson（若已安裝）
+
+語料為常見的群組訊息與模型回傳的函式呼叫參數：
+
+    python -m benchmarks.bench_task_extraction --repeat 2000
+"""
+import argparse
+import json
+import time
+
+from app.services import extraction_service
+from app.services.extraction_service import TASK_SCHEMA, compile_schema, parse_due_date
+
+# (訊息, 模型回傳的 extract_task 參數)
+CORPUS = [
+    ("小明明天下午前把季度簡報初稿給我",
+     '{"is_task": true, "description": "季度簡報初稿", "assignee": "小明", "due_date": "明天下午", "priority": "中"}'),
+    ("週五前請業務部整理客戶回饋",
+     '{"is_task": true, "description": "整理客戶回饋", "assignee": "業務部", "due_date": "週五", "priority": "高"}'),
+    ("下週一上午10點開專案檢討會，阿華負責準備資料",
+     '{"is_task": true, "description": "準備專案檢討會資料", "assignee": "阿華", "due_date": "下週一上午10點", "priority": "中"}'),
+    ("預算表 2024-07-01 要交",
+     '{"is_task": true, "description": "交預算表", "due_date": "2024-07-01", "priority": "高"}'),
+    ("中午要吃什麼？", '{"is_task": false}'),
+    ("哈哈好喔", '{"is_task": false, "description": null}'),
+    ("報表 6/30 截止，小美處理",
+     '{"is_task": true, "description": "報表", "assignee": "小美", "due_date": "6/30", "priority": "low"}'),
+    ("今天下班前更新任務狀態",
+     '{"is_task": true, "description": "更新任務狀態", "assignee": "", "due_date": "今天下班前"}'),
+    # 格式錯誤的輸出
+    ("請把這個做掉", '{"is_task": true, "description": "這個", "priority": "緊急"}'),
+    ("???", '{"is_task": true, "description": "截斷'),
+]
+
+def legacy(raw: str):
+    """舊版做法：直接 eval，遇到 true/false/null 會失敗"""
+    return eval(raw)
+
+def bench(parse, repeat: int, field: int = 1) -> dict:
+    inputs = [item[field] for item in CORPUS]
+    ok = failed = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for raw in inputs:
+            try:
+                parse(raw)
+                ok += 1
+            except Exception:
+                failed += 1
+    elapsed = time.perf_counter() - started
+    total = ok + failed
+    return {
+        'messages_per_second': total / elapsed,
+        'microseconds_per_message': elapsed / total * 1e6,
+        'parsed': ok // repeat,
+        'rejected': failed // repeat
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    validate = compile_schema(TASK_SCHEMA)
+    results = {
+        'corpus': len(CORPUS),
+        'orjson': extraction_service._loads is not json.loads,
+        'eval': bench(legacy, args.repeat),
+        'json_only': bench(json.loads, args.repeat),
+        'json_validated': bench(lambda raw: validate(json.loads(raw), '$'), args.repeat),
+        'parse_task_arguments': bench(extraction_service.parse_task_arguments, args.repeat),
+        # 直接以訊息原文測試截止時間解析
+        'due_date_from_message': bench(parse_due_date, args.repeat, field=0)
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+比較逐筆寫入與批次建立任務流程的耗時
+
+    python -m benchmarks.bench_task_flow --tasks 50 --steps 10 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services import database_service
+from app.services.db_client_service import set_client
+from benchmarks.fake_supabase import AsyncFakeSupabase
+
+async def legacy_create(client, task_info, flow_steps, user_id):
+    """舊版流程：任務、每個步驟與日誌各自一次請求"""
+    task = database_service._task_row(task_info)
+    task_id = (await client.table('tasks').insert(task).execute()).data[0]['id']
+    for row in database_service._flow_rows(task_id, flow_steps):
+        await client.table('task_flows').insert(row).execute()
+    await client.table('task_logs').insert({
+        'task_id': task_id, 'user_id': user_id, 'action': '建立任務', 'timestamp': time.time()
+    }).execute()
+    return task_id
+
+async def run(tasks: int, steps: int, latency: float) -> dict:
+    task_info = {'title': '準備季度簡報', 'department': '行銷', 'priority': 'high'}
+    flow_steps = [{'department': f'部門{i}', 'handler_id': f'U{i}'} for i in range(steps)]
+    results = {}
+
+    client = AsyncFakeSupabase(latency=latency)
+    started = time.perf_counter()
+    for _ in range(tasks):
+        await legacy_create(client, task_info, flow_steps, 'U0')
+    results['loop'] = {
+        'seconds_per_task': (time.perf_counter() - started) / tasks,
+        'requests_per_task': client.requests / tasks
+    }
+
+    for mode in ('batch', 'rpc'):
+        client = AsyncFakeSupabase(latency=latency)
+        set_client(client)
+        database_service.TASK_CREATE_MODE = mode
+        started = time.perf_counter()
+        for _ in range(tasks):
+            await database_service.create_task_with_flow(task_info, flow_steps, 'U0')
+        results[mode] = {
+            'seconds_per_task': (time.perf_counter() - started) / tasks,
+            'requests_per_task': client.requests / tasks
+        }
+
+    results['batch_timings'] = database_service.get_batch_stats()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02, help='每次請求的模擬延遲（秒）')
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.tasks, args.steps, args.latency)), indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+比較任務關鍵字查詢：逐筆子字串掃描（等同前置萬用字元的 ilike）與 CJK bigram 全文索引
+
+以合成的任務標題與描述建立索引，量測建立時間、增量更新與查詢延遲：
+
+    python -m benchmarks.bench_task_search --tasks 100000 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from app.services.search_service import TaskSearchIndex
+
+DEPARTMENTS = ['行銷', '業務', '研發', '財務', '人資', '客服', '法務', '採購', '設計', '營運']
+SUBJECTS = ['季度報表', '行銷簡報', '客戶回饋', '官網改版', '預算表', '年度計畫', '招募流程', '合約審閱',
+            '產品規格', '活動企劃', '教育訓練', '庫存盤點', '系統升級', '市場調查', '供應商評估', '品牌手冊',
+            '新人訓練', '會議記錄', '專案檢討', '出貨排程', '退款流程', '資安稽核', '社群貼文', '展覽攤位']
+ACTIONS = ['整理', '更新', '完成', '審核', '撰寫', '確認', '準備', '提交', '修改', '彙整']
+EXTRAS = ['請在週五前', '下週一會議要用', '主管交辦', '客戶急件', '配合 Q3 目標', '需附上數據',
+          '與設計部確認版面', '參考去年版本', '記得更新 KPI', '需要法務簽核']
+
+QUERIES = {
+    'common_term': '報表',
+    'specific_phrase': '行銷簡報',
+    'department_subject': '財務預算表',
+    'ascii_prefix': 'kp',
+    'single_char_prefix': '簡',
+    'no_match': '尾牙抽獎'
+}
+
+def make_tasks(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(count):
+        department, subject = rng.choice(DEPARTMENTS), rng.choice(SUBJECTS)
+        tasks.append({
+            'id': f't{i}',
+            'title': f'{department}{subject}',
+            'description': f'{rng.choice(ACTIONS)}{department}部的{subject}，{rng.choice(EXTRAS)}',
+            'status': rng.choice(['pending', 'pending', 'completed'])
+        })
+    return tasks
+
+def scan(tasks: list, keyword: str) -> list:
+    """舊版做法：沒有 limit 的 ilike 需逐筆比對整張表，結果沒有排序"""
+    keyword = keyword.lower()
+    return [task['id'] for task in tasks if keyword in (task['title'] + task['description']).lower()]
+
+def timed(func, repeat: int) -> dict:
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        'p50_ms': samples[len(samples) // 2] * 1000,
+        'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+        'results': len(result)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.tasks)
+    index = TaskSearchIndex(limit=args.limit)
+
+    async def loader():
+        for start in range(0, len(tasks), 1000):
+            yield tasks[start:start + 1000]
+
+    # 先量測記憶體，再以正式的索引量測重建時間
+    tracemalloc.start()
+    asyncio.run(TaskSearchIndex().rebuild(loader))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    asyncio.run(index.rebuild(loader))
+
+    # 增量更新：新增與狀態變更
+    extra = make_tasks(1000, seed=1)
+    started = time.perf_counter()
+    for task in extra:
+        index.record_created({**task, 'id': 'new-' + task['id']})
+    insert_us = (time.perf_counter() - started) / len(extra) * 1e6
+    started = time.perf_counter()
+    for task in extra:
+        index.record_status('new-' + task['id'], 'completed')
+    status_us = (time.perf_counter() - started) / len(extra) * 1e6
+
+    titles = {task['id']: task['title'] for task in tasks}
+    titles.update({'new-' + task['id']: task['title'] for task in extra})
+    queries = {}
+    for name, query in QUERIES.items():
+        queries[name] = {
+            'query': query,
+            'scan': timed(lambda: scan(tasks, query), max(1, args.repeat // 20)),
+            'index': timed(lambda: index.search(query), args.repeat),
+            'top': [titles[task_id] for task_id, _ in index.search(query, limit=3)]
+        }
+
+    results = {
+        'tasks': args.tasks,
+        'build_peak_mb': peak / 1e6,
+        'insert_us': insert_us,
+        'status_update_us': status_us,
+        'index': index.stats(),
+        'queries': queries
+    }
+    results['index'].pop('query_latency')
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+比較 /status 與週報以全表掃描計數和讀取增量聚合的耗時
+
+    python -m benchmarks.bench_task_stats --tasks 100000 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.services import database_service
+from app.services.db_client_service import set_client
+from app.services.task_stats_service import task_aggregates
+from benchmarks.fake_supabase import AsyncFakeSupabase, FakeRequestBuilder
+
+STATUSES = ('pending', 'pending', 'in_progress', 'completed', 'completed', 'completed')
+
+def populate(client: AsyncFakeSupabase, count: int) -> None:
+    """直接寫入替身資料庫，不計入模擬延遲"""
+    now = datetime.now()
+    rows = [
+        {
+            'id': f'task-{i}',
+            'title': f'任務 {i}',
+            'status': random.choice(STATUSES),
+            'assignee': f'U{random.randrange(500)}',
+            'department': f'部門{random.randrange(20)}',
+            'created_at': (now - timedelta(minutes=random.randrange(60 * 24 * 60))).isoformat()
+        }
+        for i in range(count)
+    ]
+    client.run(FakeRequestBuilder(client, 'tasks').insert(rows))
+    client.create_index('tasks', 'created_at')
+
+async def timed(repeat: int, func) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (time.perf_counter() - started) / repeat
+
+async def run(tasks: int, latency: float, repeat: int) -> dict:
+    client = AsyncFakeSupabase(latency=latency)
+    populate(client, tasks)
+    set_client(client)
+
+    async def scan_status():
+        rows = await database_service.get_user_tasks()
+        return sum(1 for row in rows if row['status'] == 'completed')
+
+    async def scan_weekly():
+        rows = await database_service.get_weekly_tasks()
+        return sum(1 for row in rows if row['status'] == 'completed')
+
+    async def aggregate_status():
+        return task_aggregates.status_counts().get('completed', 0)
+
+    async def aggregate_weekly():
+        return task_aggregates.created_since(days=7).get('completed', 0)
+
+    await task_aggregates.reconcile(database_service.task_stat_pages)
+    assert await scan_status() == await aggregate_status()
+
+    return {
+        'tasks': tasks,
+        'latency': latency,
+        'reconcile_seconds': task_aggregates.reconcile_seconds,
+        'status': {
+            'scan_seconds': await timed(repeat, scan_status),
+            'aggregate_seconds': await timed(repeat * 1000, aggregate_status)
+        },
+        'weekly': {
+            'scan_seconds': await timed(repeat, scan_weekly),
+            'aggregate_seconds': await timed(repeat * 1000, aggregate_weekly)
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--latency', type=float, default=0.02, help='每次請求的模擬延遲（秒）')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.tasks, args.latency, args.repeat)), indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
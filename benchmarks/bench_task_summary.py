@@ -0,0 +1,71 @@
+"""
+比較將整份任務列表放進單一提示與 map-reduce 摘要流程的 token 數與耗時
+
+模型以固定延遲加上每個 token 的生成時間模擬：
+
+    python -m benchmarks.bench_task_summary --tasks 500 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.services.summary_service import TaskSummarizer, estimate_tokens
+
+STATUSES = ('pending', 'in_progress', 'completed', 'completed')
+
+def make_tasks(count: int) -> list:
+    now = datetime.now()
+    return [
+        {
+            'id': f'6f1c2e0a-{i:04d}-4b7e-9a51-0c8d2f3e{i:04d}',
+            'title': f'準備第 {i} 號專案的季度簡報與預算表',
+            'description': '整理各部門提供的資料，彙整後交給主管審核',
+            'status': random.choice(STATUSES),
+            'priority': random.choice(('high', 'medium', 'low')),
+            'assignee': f'U{random.randrange(40):032x}',
+            'department': f'部門{random.randrange(8)}',
+            'due_date': (now + timedelta(days=random.randrange(-10, 20))).isoformat(),
+            'created_at': (now - timedelta(days=random.randrange(7))).isoformat(),
+            'updated_at': now.isoformat()
+        }
+        for i in range(count)
+    ]
+
+def fake_model(latency: float, per_token: float, output_tokens: int):
+    async def complete(prompt: str):
+        prompt_tokens = estimate_tokens(prompt)
+        await asyncio.sleep(latency + prompt_tokens * per_token / 10 + output_tokens * per_token)
+        return '摘要' * (output_tokens // 3), prompt_tokens, output_tokens
+    return complete
+
+async def run(count: int, latency: float, per_token: float, output_tokens: int) -> dict:
+    tasks = make_tasks(count)
+    complete = fake_model(latency, per_token, output_tokens)
+
+    naive_prompt = f"請根據以下任務列表生成一份摘要報告：\n\n{tasks}"
+    started = time.perf_counter()
+    await complete(naive_prompt)
+    naive = {'seconds': time.perf_counter() - started, 'prompt_tokens': estimate_tokens(naive_prompt)}
+
+    summarizer = TaskSummarizer()
+    started = time.perf_counter()
+    await summarizer.summarize(tasks, complete)
+    pipeline = {'seconds': time.perf_counter() - started, **summarizer.stats()}
+
+    return {'tasks': count, 'naive': naive, 'map_reduce': pipeline}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.5, help='每次呼叫的固定延遲（秒）')
+    parser.add_argument('--per-token', type=float, default=0.002, help='每個生成 token 的時間（秒）')
+    parser.add_argument('--output-tokens', type=int, default=300)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.tasks, args.latency, args.per_token, args.output_tokens))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+Webhook 端到端壓力測試：以測試用 channel secret 簽名的 LINE 事件打進 FastAPI app
+
+LINE、LLM 與 Supabase 皆為本機替身（延遲可調），量測每秒請求數、從送出 Webhook
+到收到回覆的 p50/p99，以及同一用戶的回覆順序是否與送出順序一致。結果存成 JSON，
+可用 --baseline 與前一次的結果比較：
+
+    python -m benchmarks.bench_webhook --users 200 --messages 10 --output webhook.json
+    python -m benchmarks.bench_webhook --baseline webhook.json
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.fake_line import FakeLineBotApi
+from benchmarks.fake_supabase import AsyncFakeSupabase
+
+CHANNEL_SECRET = 'bench-channel-secret'
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+CHAT = ['哈哈好喔', '中午要吃什麼？', '收到，我晚點看一下', '今天好熱，有人要喝飲料嗎', '👍', '辛苦了大家']
+PROJECT = ['這週的專案進度如何？', '幫我整理行銷簡報的待辦事項', '預算表現在是誰負責？',
+           '下週的會議需要準備哪些資料', '官網改版還差哪些任務', '請問季度報表的截止日是什麼時候']
+COMMANDS = ['/status', '/tasks', '/help', '/settings']
+GROUP_TASKS = ['請小明週五前完成季度報表', '行銷簡報交給業務部處理', '明天下午三點前請完成預算表',
+               '官網改版的文案請設計部負責', '客戶回饋整理好後交給我']
+
+def sign(body: bytes, secret: str = CHANNEL_SECRET) -> str:
+    """與 LINE 相同的 X-Line-Signature：HMAC-SHA256 後 base64"""
+    return base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+
+def text_event(user_id: str, seq: int, text: str, group_id: Optional[str] = None) -> Dict[str, Any]:
+    """reply token 以「用戶:序號」編碼，收到回覆時可還原送出順序"""
+    if group_id:
+        source = {'type': 'group', 'groupId': group_id, 'userId': user_id}
+    else:
+        source = {'type': 'user', 'userId': user_id}
+    return {
+        'type': 'message',
+        'mode': 'active',
+        'timestamp': int(time.time() * 1000),
+        'source': source,
+        'webhookEventId': f'01BENCH{user_id[1:]}{seq:06d}',
+        'deliveryContext': {'isRedelivery': False},
+        'replyToken': f'{user_id}:{seq}',
+        'message': {'id': f'{int(user_id[1:], 16) % 10 ** 9}{seq:06d}', 'type': 'text', 'text': text}
+    }
+
+def build_requests(args, rng: random.Random) -> List[List[Dict[str, Any]]]:
+    """
+    依時間順序交錯各用戶的訊息，再切成 1 到 batch 個事件一批的 Webhook 請求；
+    部分請求之後會以 isRedelivery 重送
+    """
+    users = [f'U{i:032x}' for i in range(args.users)]
+    groups = [f'C{i:032x}' for i in range(max(1, args.groups))]
+    remaining = {user: args.messages for user in users}
+    sequence = {user: 0 for user in users}
+    timeline = []
+    active = list(users)
+    while active:
+        index = rng.randrange(len(active))
+        user = active[index]
+        if args.groups and rng.random() < args.group_ratio:
+            group_id = groups[int(user[1:], 16) % len(groups)]
+            text = rng.choice(GROUP_TASKS + CHAT)
+        else:
+            group_id = None
+            text = rng.choice(CHAT + PROJECT * 2 + COMMANDS)
+        timeline.append(text_event(user, sequence[user], text, group_id))
+        sequence[user] += 1
+        remaining[user] -= 1
+        if not remaining[user]:
+            active[index] = active[-1]
+            active.pop()
+
+    requests: List[List[Dict[str, Any]]] = []
+    position = 0
+    while position < len(timeline):
+        size = rng.randint(1, args.batch)
+        requests.append(timeline[position:position + size])
+        position += size
+
+    # 重送：同一批事件、相同 webhookEventId，插在稍後的位置
+    for index in range(len(requests) - 1, -1, -1):
+        if rng.random() < args.redelivery_rate:
+            copy = [{**event, 'deliveryContext': {'isRedelivery': True}} for event in requests[index]]
+            requests.insert(min(len(requests), index + rng.randint(1, 20)), copy)
+    return requests
+
+def load_app(path: str, line_bot_api: Optional[FakeLineBotApi] = None):
+    """
+    以檔案路徑載入 app.py（與 app/ 套件同名，無法直接 import），
+    並將客戶端登錄表中的 LINE 客戶端換成本機替身
+    """
+    from app.services.client_service import clients
+    if line_bot_api is not None:
+        clients.override('line_bot_api', line_bot_api)
+    spec = importlib.util.spec_from_file_location('linebot_app', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['linebot_app'] = module
+    spec.loader.exec_module(module)
+    return module
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {'count': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+    return {'count': len(samples), 'p50_ms': pick(0.50), 'p95_ms': pick(0.95),
+            'p99_ms': pick(0.99), 'max_ms': samples[-1] * 1000}
+
+def ordering_violations(reply_at: Dict[str, float]) -> Tuple[int, int]:
+    """同一用戶依回覆時間排序後，序號比先前已回覆者小的次數與受影響的用戶數"""
+    by_user: Dict[str, List[Tuple[float, int]]] = {}
+    for token, at in reply_at.items():
+        user, _, seq = token.rpartition(':')
+        by_user.setdefault(user, []).append((at, int(seq)))
+    violations = 0
+    users = 0
+    for replies in by_user.values():
+        replies.sort()
+        highest = -1
+        affected = False
+        for _, seq in replies:
+            if seq < highest:
+                violations += 1
+                affected = True
+            highest = max(highest, seq)
+        users += affected
+    return violations, users
+
+async def drive(module, line_bot_api: FakeLineBotApi, requests, args) -> Dict[str, Any]:
+    import httpx
+
+    tokens = {event['replyToken'] for events in requests for event in events}
+    sent_at: Dict[str, float] = {}
+    http_latency: List[float] = []
+    statuses: Counter = Counter()
+    retries = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    loop = asyncio.get_running_loop()
+    # 同一用戶的請求依序送出（等前一個請求回應後才送下一個），不同用戶並行
+    previous: Dict[str, asyncio.Future] = {}
+
+    transport = httpx.ASGITransport(app=module.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def send(events, waits, done):
+            nonlocal retries
+            try:
+                if waits:
+                    await asyncio.gather(*waits)
+                body = json.dumps({'destination': 'Ubench', 'events': events}, ensure_ascii=False).encode()
+                headers = {'X-Line-Signature': sign(body), 'Content-Type': 'application/json'}
+                for attempt in range(args.max_retries + 1):
+                    async with semaphore:
+                        started = time.monotonic()
+                        for event in events:
+                            sent_at.setdefault(event['replyToken'], started)
+                        response = await client.post('/webhook', content=body, headers=headers)
+                        http_latency.append(time.monotonic() - started)
+                    statuses[response.status_code] += 1
+                    if response.status_code != 503 or attempt == args.max_retries:
+                        break
+                    # 佇列已滿時與 LINE 一樣稍後重送
+                    retries += 1
+                    await asyncio.sleep(args.retry_delay)
+            finally:
+                done.set_result(None)
+
+        started = time.monotonic()
+        tasks = []
+        for events in requests:
+            users = {event['source']['userId'] for event in events}
+            waits = [previous[user] for user in users if user in previous]
+            done = loop.create_future()
+            for user in users:
+                previous[user] = done
+            tasks.append(asyncio.create_task(send(events, waits, done)))
+        await asyncio.gather(*tasks)
+        sent = time.monotonic()
+
+        deadline = sent + args.drain_timeout
+        while len(line_bot_api.reply_at) < len(tokens) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        finished = max(line_bot_api.reply_at.values(), default=sent)
+
+    reply_at = {token: at for token, at in line_bot_api.reply_at.items() if token in sent_at}
+    end_to_end = [reply_at[token] - sent_at[token] for token in reply_at]
+    violations, affected_users = ordering_violations(reply_at)
+    elapsed = max(finished, sent) - started
+    return {
+        'requests': len(requests),
+        'events': sum(len(events) for events in requests),
+        'unique_events': len(tokens),
+        'seconds': elapsed,
+        'send_seconds': sent - started,
+        'requests_per_second': len(requests) / (sent - started) if sent > started else 0.0,
+        'events_per_second': len(reply_at) / elapsed if elapsed else 0.0,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'retries': retries,
+        'webhook_latency': percentiles(http_latency),
+        'end_to_end_latency': percentiles(end_to_end),
+        'replies': len(reply_at),
+        'missing_replies': len(tokens) - len(reply_at),
+        'duplicate_replies': sum(1 for token in reply_at if len(line_bot_api.replies[token]) > 1),
+        'ordering_violations': violations,
+        'users_with_violations': affected_users
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """與前一次結果比較主要指標，change 為相對變化"""
+    metrics = {
+        'requests_per_second': lambda r: r['requests_per_second'],
+        'events_per_second': lambda r: r['events_per_second'],
+        'end_to_end_p50_ms': lambda r: r['end_to_end_latency']['p50_ms'],
+        'end_to_end_p99_ms': lambda r: r['end_to_end_latency']['p99_ms'],
+        'webhook_p99_ms': lambda r: r['webhook_latency']['p99_ms'],
+        'ordering_violations': lambda r: r['ordering_violations']
+    }
+    result = {'baseline_commit': baseline.get('commit')}
+    for name, get in metrics.items():
+        before, after = get(baseline), get(current)
+        result[name] = {'baseline': before, 'current': after,
+                        'change': (after - before) / before if before else None}
+    return result
+
+async def run(args) -> Dict[str, Any]:
+    from app.services.db_client_service import set_client
+    from app.services.metrics_service import metrics
+
+    line_bot_api = FakeLineBotApi(latency=args.line_latency)
+    set_client(AsyncFakeSupabase(latency=args.db_latency))
+    module = load_app(args.app, line_bot_api)
+    requests = build_requests(args, random.Random(args.seed))
+
+    await module.startup_event()
+    try:
+        results = await drive(module, line_bot_api, requests, args)
+    finally:
+        await module.shutdown_event()
+        set_client(None)
+    results['app'] = {
+        'event_queue': module.event_queue.stats(),
+        'webhook_dedup': module.event_dedup.stats(),
+        'stages': metrics.snapshot()
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', default=APP_PATH, help='app.py 的路徑')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--group-ratio', type=float, default=0.3, help='群組訊息的比例')
+    parser.add_argument('--messages', type=int, default=10, help='每位用戶送出的訊息數')
+    parser.add_argument('--batch', type=int, default=5, help='每個 Webhook 請求最多幾個事件')
+    parser.add_argument('--redelivery-rate', type=float, default=0.02, help='以 isRedelivery 重送的請求比例')
+    parser.add_argument('--concurrency', type=int, default=50, help='同時進行的 Webhook 請求數')
+    parser.add_argument('--max-retries', type=int, default=5, help='收到 503 時的重送次數')
+    parser.add_argument('--retry-delay', type=float, default=0.2)
+    parser.add_argument('--llm-latency', default='lognormal:0.3,0.5', help='LLM 替身延遲分佈，格式同 LLM_STUB_LATENCY')
+    parser.add_argument('--line-latency', type=float, default=0.02, help='LINE API 替身每次請求的延遲（秒）')
+    parser.add_argument('--db-latency', type=float, default=0.005, help='Supabase 替身每次查詢的延遲（秒）')
+    parser.add_argument('--streaming', action='store_true', help='開啟串流回覆（預設每則訊息一次 reply）')
+    parser.add_argument('--drain-timeout', type=float, default=60.0, help='送完後等待回覆的最長秒數')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='結果寫入的 JSON 檔')
+    parser.add_argument('--baseline', help='前一次的結果 JSON，輸出主要指標的變化')
+    args = parser.parse_args()
+
+    # 載入 app 前設定環境，模組層級的元件在載入時讀取
+    state_dir = tempfile.mkdtemp(prefix='bench_webhook_')
+    os.environ.update({
+        'LINE_CHANNEL_SECRET': CHANNEL_SECRET,
+        'LINE_CHANNEL_ACCESS_TOKEN': 'bench-access-token',
+        'SUPABASE_URL': 'http://supabase.invalid',
+        'SUPABASE_KEY': 'bench-key',
+        'LLM_BACKEND': 'stub',
+        'LLM_STUB_LATENCY': args.llm_latency,
+        'LLM_STUB_SEED': str(args.seed),
+        'LLM_STREAMING_ENABLED': 'true' if args.streaming else 'false',
+        'SCHEDULER_LOCK_PATH': os.path.join(state_dir, 'scheduler.lock'),
+        'SCHEDULER_STATE_PATH': os.path.join(state_dir, 'scheduler_state.json'),
+        'MESSAGE_LOG_SPILL_DIR': os.path.join(state_dir, 'message_spill'),
+        'CONTEXT_BACKEND': 'memory',
+        'WEBHOOK_DEDUP_BACKEND': 'memory'
+    })
+
+    results = {
+        'commit': git_commit(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'app')},
+        **asyncio.run(run(args))
+    }
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            results['compare'] = compare(results, json.load(f))
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+本機模擬的 LINE Messaging API 客戶端，介面與 linebot.LineBotApi 相同
+
+可設定每次請求的延遲與每秒請求上限，超過上限時回傳 429 與 Retry-After。
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+class FakeLineBotApiError(Exception):
+    def __init__(self, status_code: int, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"LINE API error {status_code}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+class FakeLineBotApi:
+    def __init__(self, latency: float = 0.0, rate_limit: Optional[int] = None, retry_after: float = 1.0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.requests = 0
+        self.rejected = 0
+        # 每位收件人收到的訊息
+        self.inbox: Dict[str, List[str]] = defaultdict(list)
+        self.replies: Dict[str, List[str]] = defaultdict(list)
+        # 每個 reply token 第一次回覆的時間
+        self.reply_at: Dict[str, float] = {}
+        self.sent_at: List[float] = []
+
+    def _request(self) -> None:
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            if self.rate_limit and self.window_count > self.rate_limit:
+                self.rejected += 1
+                raise FakeLineBotApiError(429, {'Retry-After': str(self.retry_after)})
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _texts(messages: Any) -> List[str]:
+        if not isinstance(messages, (list, tuple)):
+            messages = [messages]
+        return [getattr(m, 'text', str(m)) for m in messages]
+
+    def _deliver(self, to: str, messages: Any) -> None:
+        with self.lock:
+            self.inbox[to].extend(self._texts(messages))
+            self.sent_at.append(time.monotonic())
+
+    def push_message(self, to: str, messages: Any, **kwargs) -> None:
+        self._request()
+        self._deliver(to, messages)
+
+    def multicast(self, to: List[str], messages: Any, **kwargs) -> None:
+        self._request()
+        for recipient in to:
+            self._deliver(recipient, messages)
+
+    def broadcast(self, messages: Any, **kwargs) -> None:
+        self._request()
+        self._deliver('*', messages)
+
+    def reply_message(self, reply_token: str, messages: Any, **kwargs) -> None:
+        self._request()
+        with self.lock:
+            now = time.monotonic()
+            self.replies[reply_token].extend(self._texts(messages))
+            self.reply_at.setdefault(reply_token, now)
+            self.sent_at.append(now)
@@ -0,0 +1,32 @@
+"""
+本機模擬的串流 LLM：首個 token 前有固定延遲，之後以固定速度逐段輸出
+"""
+import asyncio
+from typing import AsyncIterator
+
+SAMPLE_ANSWER = (
+    "好的，以下是本週專案的建議安排。\n"
+    "首先，行銷部需要在週三前完成季度簡報的初稿，並交由主管審核。"
+    "其次，業務部應整理客戶回饋，找出三個最常見的問題。"
+    "第三，工程部需要確認新版本的上線時程，若有延遲請提早通知。\n"
+    "另外，請各部門在週五下班前更新任務狀態，方便產生週報。"
+    "如果有任何任務需要重新分配，請在群組中提出，我會協助調整。\n"
+)
+
+class FakeStreamingLLM:
+    def __init__(self, ttft: float = 0.5, tokens_per_second: float = 30.0, chars_per_token: int = 2):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.chars_per_token = chars_per_token
+
+    async def stream(self, answer: str = SAMPLE_ANSWER, repeat: int = 1) -> AsyncIterator[str]:
+        """以串流方式逐段輸出回覆"""
+        text = answer * repeat
+        await asyncio.sleep(self.ttft)
+        for i in range(0, len(text), self.chars_per_token):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield text[i:i + self.chars_per_token]
+
+    async def complete(self, answer: str = SAMPLE_ANSWER, repeat: int = 1) -> str:
+        """等待完整回覆"""
+        return ''.join([delta async for delta in self.stream(answer, repeat)])
@@ -0,0 +1,379 @@
+"""
+以 SQLite 模擬 Supabase (PostgREST) 客戶端，供本機基準測試使用
+
+只提供固定版本 postgrest (0.13) 查詢建構類別上存在的方法，並可設定每次請求的網路延遲。
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+class FakeResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+class FakeParams:
+    """
+    模擬 httpx.QueryParams 的 add()：回傳加上參數後的新物件
+    """
+
+    def __init__(self, items: tuple = ()):
+        self.items = items
+
+    def add(self, key: str, value: Any) -> 'FakeParams':
+        return FakeParams(self.items + ((key, str(value)),))
+
+class FakeQuery:
+    """
+    對應 postgrest 0.13 的 AsyncQueryRequestBuilder：只能 execute()
+
+    查詢建構類別的階層與方法與固定版本的 postgrest 相同（insert/upsert 之後
+    不能再加篩選，order/limit 只在 select 之後可用），不支援的呼叫在基準測試中
+    同樣會失敗。
+    """
+
+    def __init__(self, client: 'FakeSupabase', table: str, operation: str,
+                 columns: str = '*', payload: Any = None, count_mode: Optional[str] = None):
+        self.client = client
+        self.table = table
+        self.operation = operation
+        self.columns = columns
+        self.payload = payload
+        self.count_mode = count_mode
+        self.filters: List[tuple] = []
+        self.orders: List[tuple] = []
+        self.limit_count: Optional[int] = None
+        self.params = FakeParams()
+
+    def _logic_filters(self) -> List[tuple]:
+        """把直接加在查詢參數上的 or=(...)／and=(...) 轉成篩選條件"""
+        filters = []
+        for key, value in self.params.items:
+            if key not in ('or', 'and') or not (value.startswith('(') and value.endswith(')')):
+                raise ValueError(f"unsupported query parameter {key}={value}")
+            filters.append(('', 'or', (key, _parse_logic(value[1:-1]))))
+        return filters
+
+    def execute(self) -> FakeResponse:
+        self.client.simulate_latency()
+        return self.client.run(self)
+
+class FakeFilterQuery(FakeQuery):
+    """對應 AsyncFilterRequestBuilder：update、delete 與 select 可用的篩選"""
+
+    def _filter(self, column: str, op: str, value: Any) -> 'FakeFilterQuery':
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column: str, value: Any) -> 'FakeFilterQuery':
+        return self._filter(column, '=', value)
+
+    def neq(self, column: str, value: Any) -> 'FakeFilterQuery':
+        return self._filter(column, '!=', value)
+
+    def gt(self, column: str, value: Any) -> 'FakeFilterQuery':
+        return self._filter(column, '>', value)
+
+    def gte(self, column: str, value: Any) -> 'FakeFilterQuery':
+        return self._filter(column, '>=', value)
+
+    def lt(self, column: str, value: Any) -> 'FakeFilterQuery':
+        return self._filter(column, '<', value)
+
+    def lte(self, column: str, value: Any) -> 'FakeFilterQuery':
+        return self._filter(column, '<=', value)
+
+    def ilike(self, column: str, pattern: str) -> 'FakeFilterQuery':
+        return self._filter(column, 'like', pattern)
+
+    def in_(self, column: str, values: List[Any]) -> 'FakeFilterQuery':
+        return self._filter(column, 'in', list(values))
+
+    def is_(self, column: str, value: Any) -> 'FakeFilterQuery':
+        return self._filter(column, 'is', None if value in (None, 'null') else value)
+
+class FakeSelectQuery(FakeFilterQuery):
+    """對應 AsyncSelectRequestBuilder：另外支援排序與筆數限制"""
+
+    def order(self, column: str, *, desc: bool = False) -> 'FakeSelectQuery':
+        # 與 postgrest 相同，column 可以是以逗號分隔的多個欄位，desc 只套用在最後一個
+        columns = [c.strip() for c in column.split(',')]
+        self.orders.extend((c, desc and i == len(columns) - 1) for i, c in enumerate(columns))
+        return self
+
+    def limit(self, size: int) -> 'FakeSelectQuery':
+        self.limit_count = size
+        return self
+
+class FakeRequestBuilder:
+    """對應 AsyncRequestBuilder（client.table(name) 的回傳值）"""
+    query_class = FakeQuery
+    filter_class = FakeFilterQuery
+    select_class = FakeSelectQuery
+
+    def __init__(self, client: 'FakeSupabase', table: str):
+        self.client = client
+        self.table = table
+
+    def select(self, *columns: str, count: Optional[str] = None) -> FakeSelectQuery:
+        return self.select_class(self.client, self.table, 'select', ','.join(columns) or '*', count_mode=count)
+
+    def insert(self, json: Any, *, count: Optional[str] = None, upsert: bool = False) -> FakeQuery:
+        return self.query_class(self.client, self.table, 'upsert' if upsert else 'insert', payload=json)
+
+    def upsert(self, json: Any, *, count: Optional[str] = None, on_conflict: str = '') -> FakeQuery:
+        return self.query_class(self.client, self.table, 'upsert', payload=json)
+
+    def update(self, json: Dict[str, Any], *, count: Optional[str] = None) -> FakeFilterQuery:
+        return self.filter_class(self.client, self.table, 'update', payload=json)
+
+    def delete(self, *, count: Optional[str] = None) -> FakeFilterQuery:
+        return self.filter_class(self.client, self.table, 'delete')
+
+class AsyncFakeQuery(FakeQuery):
+    async def execute(self) -> FakeResponse:
+        await self.client.simulate_latency_async()
+        return self.client.run(self)
+
+class AsyncFakeFilterQuery(AsyncFakeQuery, FakeFilterQuery):
+    pass
+
+class AsyncFakeSelectQuery(AsyncFakeQuery, FakeSelectQuery):
+    pass
+
+class AsyncFakeRequestBuilder(FakeRequestBuilder):
+    query_class = AsyncFakeQuery
+    filter_class = AsyncFakeFilterQuery
+    select_class = AsyncFakeSelectQuery
+
+class FakeRPC:
+    def __init__(self, client: 'FakeSupabase', name: str, params: Dict[str, Any]):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self) -> FakeResponse:
+        self.client.simulate_latency()
+        handler = self.client.functions.get(self.name)
+        if handler is None:
+            raise RuntimeError(f"function {self.name} does not exist")
+        with self.client.lock:
+            return FakeResponse(handler(self.client, **self.params))
+
+class AsyncFakeRPC(FakeRPC):
+    async def execute(self) -> FakeResponse:
+        await self.client.simulate_latency_async()
+        handler = self.client.functions.get(self.name)
+        if handler is None:
+            raise RuntimeError(f"function {self.name} does not exist")
+        with self.client.lock:
+            return FakeResponse(handler(self.client, **self.params))
+
+class FakeSupabase:
+    """
+    SQLite 版的 Supabase 客戶端替身
+    """
+
+    def __init__(self, latency: float = 0.0, path: str = ':memory:'):
+        self.latency = latency
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.RLock()
+        self.columns: Dict[str, List[str]] = {}
+        self.requests = 0
+        self.functions = {'create_task_with_flow': _create_task_with_flow}
+
+    def table(self, name: str) -> FakeRequestBuilder:
+        return FakeRequestBuilder(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRPC:
+        return FakeRPC(self, name, params)
+
+    def simulate_latency(self) -> None:
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def simulate_latency_async(self) -> None:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    # 資料表管理
+    def _ensure_columns(self, table: str, keys) -> None:
+        known = self.columns.get(table)
+        if known is None:
+            self.conn.execute(f'create table if not exists "{table}" (id text primary key)')
+            self.conn.execute(f'create index if not exists "idx_{table}_id" on "{table}"(id)')
+            # 以檔案開啟既有資料庫時沿用已有的欄位
+            known = [row[1] for row in self.conn.execute(f'pragma table_info("{table}")')]
+            self.columns[table] = known
+        for key in keys:
+            if key not in known:
+                self.conn.execute(f'alter table "{table}" add column "{key}"')
+                known.append(key)
+
+    def create_index(self, table: str, *columns: str) -> None:
+        """建立索引，模擬資料庫端的 btree 索引"""
+        self._ensure_columns(table, columns)
+        name = f"idx_{table}_{'_'.join(columns)}"
+        cols = ', '.join(f'"{c}"' for c in columns)
+        self.conn.execute(f'create index if not exists "{name}" on "{table}"({cols})')
+
+    @staticmethod
+    def _encode(value: Any) -> Any:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    def _logic(self, node: tuple, params: List[Any]) -> str:
+        if node[0] in ('and', 'or'):
+            return '(' + f' {node[0]} '.join(self._logic(child, params) for child in node[1]) + ')'
+        column, op, value = node
+        params.append(value)
+        return f'"{column}" {_LOGIC_OPS[op]} ?'
+
+    def _where(self, query: FakeQuery):
+        clauses, params = [], []
+        for column, op, value in query.filters + query._logic_filters():
+            if op == 'or':
+                clauses.append(self._logic(value, params))
+            elif op == 'in':
+                clauses.append(f'"{column}" in ({", ".join("?" for _ in value)})')
+                params.extend(value)
+            elif op == 'is':
+                clauses.append(f'"{column}" is null' if value is None else f'"{column}" is ?')
+                if value is not None:
+                    params.append(value)
+            else:
+                clauses.append(f'"{column}" {op} ?')
+                params.append(self._encode(value))
+        return (' where ' + ' and '.join(clauses)) if clauses else '', params
+
+    def run(self, query: FakeQuery) -> FakeResponse:
+        with self.lock:
+            table = query.table
+            if query.operation in ('insert', 'upsert'):
+                rows = query.payload if isinstance(query.payload, list) else [query.payload]
+                inserted = []
+                for row in rows:
+                    row = dict(row)
+                    row.setdefault('id', uuid.uuid4().hex)
+                    if table not in ('settings', 'users'):
+                        row.setdefault('created_at', datetime.now().isoformat())
+                    self._ensure_columns(table, row)
+                    keys = list(row)
+                    verb = 'insert or replace' if query.operation == 'upsert' else 'insert'
+                    self.conn.execute(
+                        f'{verb} into "{table}" ({", ".join(chr(34) + k + chr(34) for k in keys)}) '
+                        f'values ({", ".join("?" for _ in keys)})',
+                        [self._encode(row[k]) for k in keys]
+                    )
+                    inserted.append(row)
+                return FakeResponse(inserted)
+
+            self._ensure_columns(table, [c for c, _, _ in query.filters if c])
+            where, params = self._where(query)
+            if query.operation == 'update':
+                self._ensure_columns(table, query.payload)
+                keys = list(query.payload)
+                sets = ', '.join(f'"{k}" = ?' for k in keys)
+                # 與 PostgREST 相同，回傳更新後的資料列
+                cursor = self.conn.execute(
+                    f'update "{table}" set {sets}{where} returning *',
+                    [self._encode(query.payload[k]) for k in keys] + params
+                )
+                names = [d[0] for d in cursor.description]
+                return FakeResponse([dict(zip(names, row)) for row in cursor.fetchall()])
+            if query.operation == 'delete':
+                self.conn.execute(f'delete from "{table}"{where}', params)
+                return FakeResponse([])
+
+            columns = '*' if query.columns.strip() == '*' else \
+                ', '.join(f'"{c.strip()}"' for c in query.columns.split(','))
+            if columns != '*':
+                self._ensure_columns(table, [c.strip() for c in query.columns.split(',')])
+            sql = f'select {columns} from "{table}"{where}'
+            if query.orders:
+                sql += ' order by ' + ', '.join(f'"{c}" {"desc" if d else "asc"}' for c, d in query.orders)
+            if query.limit_count is not None:
+                sql += f' limit {int(query.limit_count)}'
+            cursor = self.conn.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            data = [dict(zip(names, row)) for row in cursor.fetchall()]
+            count = None
+            if query.count_mode:
+                count = self.conn.execute(f'select count(*) from "{table}"{where}', params).fetchone()[0]
+            return FakeResponse(data, count)
+
+class AsyncFakeSupabase(FakeSupabase):
+    """
+    async 版替身，介面與 PooledPostgrestClient 相同
+    """
+
+    def table(self, name: str) -> AsyncFakeRequestBuilder:
+        return AsyncFakeRequestBuilder(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> AsyncFakeRPC:
+        return AsyncFakeRPC(self, name, params)
+
+    async def aclose(self) -> None:
+        self.conn.close()
+
+_LOGIC_OPS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<=', 'like': 'like', 'ilike': 'like'}
+
+def _split_top(text: str) -> List[str]:
+    """依最外層的逗號切開，略過括號與雙引號內的逗號"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+def _parse_logic(text: str) -> List[tuple]:
+    """解析 PostgREST 邏輯條件字串"""
+    nodes = []
+    for part in _split_top(text):
+        part = part.strip()
+        for op in ('and', 'or'):
+            if part.startswith(op + '(') and part.endswith(')'):
+                nodes.append((op, _parse_logic(part[len(op) + 1:-1])))
+                break
+        else:
+            column, op, value = part.split('.', 2)
+            if len(value) >= 2 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+            elif op in ('like', 'ilike'):
+                value = value.replace('*', '%')
+            nodes.append((column, op, value))
+    return nodes
+
+def _create_task_with_flow(client: FakeSupabase, task: Dict[str, Any], flow_steps: List[Dict[str, Any]], log: Dict[str, Any]) -> str:
+    """模擬資料庫端的 create_task_with_flow 函式（單一交易）"""
+    client.conn.execute('begin')
+    try:
+        task_id = client.run(FakeRequestBuilder(client, 'tasks').insert(task)).data[0]['id']
+        if flow_steps:
+            client.run(FakeRequestBuilder(client, 'task_flows').insert([{**step, 'task_id': task_id} for step in flow_steps]))
+        client.run(FakeRequestBuilder(client, 'task_logs').insert({**log, 'task_id': task_id}))
+        client.conn.execute('commit')
+    except Exception:
+        client.conn.execute('rollback')
+        raise
+    return task_id
@@ -0,0 +1,151 @@
+"""
+冷啟動報告：app.py 的匯入時間分解與從行程啟動到第一個 Webhook 回覆的時間
+
+各項量測在獨立的子行程中執行，確保模組都尚未載入：
+
+    python -m benchmarks.profile_startup --top 15 --output startup.json
+
+- import：以 python -X importtime 載入 app.py，依頂層套件彙總並列出最慢的模組
+- cold：不暖機，startup 完成後立即送出第一個 Webhook
+- warm：startup 後等待客戶端暖機完成再送出第一個 Webhook
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+# 子行程啟動後的第一個時間點
+PROCESS_STARTED = time.perf_counter()
+
+MODES = ('cold', 'warm')
+_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def bench_environment(state_dir: str, warmup: bool) -> dict:
+    return {
+        'LINE_CHANNEL_SECRET': 'bench-channel-secret',
+        'LINE_CHANNEL_ACCESS_TOKEN': 'bench-access-token',
+        'SUPABASE_URL': 'http://supabase.invalid',
+        'SUPABASE_KEY': 'bench-key',
+        'LLM_BACKEND': 'stub',
+        'LLM_STUB_LATENCY': 'fixed:0',
+        'LLM_STREAMING_ENABLED': 'false',
+        'CLIENT_WARMUP': 'true' if warmup else 'false',
+        'SCHEDULER_LOCK_PATH': os.path.join(state_dir, 'scheduler.lock'),
+        'SCHEDULER_STATE_PATH': os.path.join(state_dir, 'scheduler_state.json'),
+        'MESSAGE_LOG_SPILL_DIR': os.path.join(state_dir, 'message_spill')
+    }
+
+def run_import(app_path: str) -> dict:
+    """子行程：只載入 app.py"""
+    import importlib.util
+    started = time.perf_counter()
+    spec = importlib.util.spec_from_file_location('linebot_app', app_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['linebot_app'] = module
+    spec.loader.exec_module(module)
+    from app.services.client_service import startup_profile
+    return {'import_seconds': time.perf_counter() - started, **startup_profile.report()}
+
+async def first_request(app_path: str, warm: bool) -> dict:
+    """子行程：載入 app、執行 startup 後送出一個簽名的 Webhook，等到收到回覆"""
+    import httpx
+    from app.services.db_client_service import set_client
+    from benchmarks.bench_webhook import load_app, sign, text_event
+    from benchmarks.fake_line import FakeLineBotApi
+    from benchmarks.fake_supabase import AsyncFakeSupabase
+
+    line_bot_api = FakeLineBotApi()
+    set_client(AsyncFakeSupabase())
+    started = time.perf_counter()
+    module = load_app(app_path, line_bot_api)
+    imported = time.perf_counter()
+    await module.startup_event()
+    if warm and module.warmup_task is not None:
+        await module.warmup_task
+    ready = time.perf_counter()
+
+    event = text_event('U' + '0' * 32, 0, '這週的專案進度如何？')
+    body = json.dumps({'destination': 'Ubench', 'events': [event]}, ensure_ascii=False).encode()
+    transport = httpx.ASGITransport(app=module.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        response = await client.post('/webhook', content=body, headers={'X-Line-Signature': sign(body)})
+        accepted = time.perf_counter()
+        while event['replyToken'] not in line_bot_api.reply_at and time.perf_counter() - accepted < 30:
+            await asyncio.sleep(0.001)
+    replied = time.perf_counter()
+    await module.shutdown_event()
+    return {
+        'status_code': response.status_code,
+        'interpreter_to_app_seconds': started - PROCESS_STARTED,
+        'import_seconds': imported - started,
+        'startup_seconds': ready - imported,
+        'first_response_seconds': accepted - ready,
+        'first_reply_seconds': replied - ready,
+        'time_to_first_reply_seconds': replied - PROCESS_STARTED,
+        **module.startup_profile.report()
+    }
+
+def summarize_importtime(stderr: str, top: int) -> dict:
+    """彙總 -X importtime 的輸出：頂層套件的自身時間總和與累計時間最長的模組"""
+    packages = {}
+    modules = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        packages[name.split('.')[0]] = packages.get(name.split('.')[0], 0) + own
+        modules.append((cumulative, own, len(indent) // 2, name))
+    total = sum(packages.values())
+    return {
+        'total_ms': total / 1000,
+        'modules': len(modules),
+        'packages_ms': {
+            name: own / 1000 for name, own in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        },
+        'slowest_ms': [
+            {'module': name, 'cumulative': cumulative / 1000, 'self': own / 1000, 'depth': depth}
+            for cumulative, own, depth, name in sorted(modules, reverse=True)[:top]
+        ]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py'))
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--mode', choices=('import',) + MODES, help='只執行單一量測（由主行程呼叫）')
+    parser.add_argument('--output', help='結果寫入的 JSON 檔')
+    args = parser.parse_args()
+
+    if args.mode == 'import':
+        print(json.dumps(run_import(args.app)))
+        return
+    if args.mode:
+        print(json.dumps(asyncio.run(first_request(args.app, warm=args.mode == 'warm'))))
+        return
+
+    state_dir = tempfile.mkdtemp(prefix='profile_startup_')
+    results = {}
+    for mode in ('import',) + MODES:
+        environment = {**os.environ, **bench_environment(state_dir, warmup=mode == 'warm')}
+        flags = ['-X', 'importtime'] if mode == 'import' else []
+        completed = subprocess.run(
+            [sys.executable, *flags, '-m', 'benchmarks.profile_startup', '--app', args.app, '--mode', mode],
+            check=True, capture_output=True, text=True, env=environment
+        )
+        results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+        if mode == 'import':
+            results[mode]['importtime'] = summarize_importtime(completed.stderr, args.top)
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+if __name__ == '__main__':
+    main()
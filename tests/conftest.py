@@ -0,0 +1,12 @@
+import pytest
+
+from app.services.db_client_service import set_client
+from benchmarks.fake_supabase import AsyncFakeSupabase
+
+@pytest.fixture
+def fake_db():
+    """以 SQLite 替身取代資料庫客戶端，測試結束後還原"""
+    client = AsyncFakeSupabase()
+    set_client(client)
+    yield client
+    set_client(None)
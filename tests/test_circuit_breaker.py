@@ -0,0 +1,198 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.llm_service import CircuitBreaker, CircuitOpenError, LLMClient, LLMError, LLMResult
+
+class BadRequest(Exception):
+    status_code = 400
+
+class FlakyBackend:
+    """依序拋出 errors 中的錯誤，用完後正常回覆"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def complete(self, messages, **params):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return LLMResult(text='ok')
+
+    async def stream(self, messages, **params):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        yield 'ok'
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, recovery_time=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    # 成功後重新計算連續失敗
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert breaker.trips == 1
+
+def test_half_open_allows_one_probe():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+
+    # 試探失敗重新開啟冷卻，不算新的一次跳脫
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    assert breaker.trips == 1
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() and breaker.allow()
+    assert breaker.failures == 0
+
+def make_client(backend):
+    return LLMClient(backend, timeout=5, max_retries=0, failure_threshold=2, recovery_time=0.05)
+
+def test_client_degrades_while_open():
+    backend = FlakyBackend(ConnectionError('reset'), ConnectionError('reset'))
+    client = make_client(backend)
+
+    async def main():
+        for _ in range(2):
+            result = await client.complete([], fallback='稍後再試')
+            assert result.degraded
+        assert client.breaker.state == 'open'
+        # 斷路中不呼叫上游：有 fallback 時降級，沒有時拋出 CircuitOpenError
+        assert (await client.complete([], fallback='稍後再試')).text == '稍後再試'
+        with pytest.raises(CircuitOpenError):
+            await client.complete([])
+        assert backend.calls == 2
+
+        await asyncio.sleep(0.06)
+        assert (await client.complete([])).text == 'ok'
+        assert client.breaker.state == 'closed'
+
+    asyncio.run(main())
+    assert client.stats()['breaker']['trips'] == 1
+    assert client.counters['chat']['degraded'] == 3
+
+def test_bad_requests_do_not_trip():
+    """請求本身有誤（4xx）不代表上游異常"""
+    backend = FlakyBackend(*[BadRequest('invalid') for _ in range(4)])
+    client = make_client(backend)
+
+    async def main():
+        for _ in range(4):
+            assert (await client.complete([], fallback='')).degraded
+        chunks = [chunk async for chunk in client.stream([], fallback='')]
+        assert chunks == ['ok']
+
+    asyncio.run(main())
+    assert client.breaker.state == 'closed'
+    assert client.breaker.trips == 0
+
+def test_stream_failures_trip_and_bad_requests_do_not():
+    async def drain(client):
+        return [chunk async for chunk in client.stream([], fallback='稍後再試')]
+
+    client = make_client(FlakyBackend(BadRequest('invalid'), BadRequest('invalid')))
+    assert asyncio.run(drain(client)) == ['稍後再試']
+    assert asyncio.run(drain(client)) == ['稍後再試']
+    assert client.breaker.state == 'closed'
+
+    client = make_client(FlakyBackend(ConnectionError('reset'), ConnectionError('reset')))
+    asyncio.run(drain(client))
+    asyncio.run(drain(client))
+    assert client.breaker.state == 'open'
+    assert asyncio.run(drain(client)) == ['稍後再試']
+    assert client._backend.calls == 2
+
+def test_stream_setup_errors_are_counted_and_degraded():
+    """建立串流時的錯誤（例如連線錯誤）也計入失敗並回覆預設內容"""
+    class BrokenBackend:
+        def stream(self, messages, **params):
+            raise ConnectionError('connection refused')
+
+    client = make_client(BrokenBackend())
+
+    async def drain():
+        return [chunk async for chunk in client.stream([], fallback='稍後再試')]
+
+    assert asyncio.run(drain()) == ['稍後再試']
+    assert client.counters['chat']['failures'] == 1
+    assert client.breaker.failures == 1
+
+class MidStreamBackend:
+    """先送出一個片段，之後依 mode 停住、斷線或慢慢送完"""
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    async def stream(self, messages, **params):
+        yield '第一段'
+        if self.mode == 'stall':
+            await asyncio.sleep(3600)
+        if self.mode == 'reset':
+            raise ConnectionError('connection reset')
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+            yield '。'
+
+def stream_client(mode, **settings):
+    client = make_client(MidStreamBackend(mode))
+    client.chunk_timeout = settings.get('chunk_timeout', 0.05)
+    client.stream_deadline = settings.get('stream_deadline', 5)
+    return client
+
+def collect_stream(client):
+    chunks = []
+
+    async def main():
+        async for chunk in client.stream([], fallback='稍後再試'):
+            chunks.append(chunk)
+
+    try:
+        asyncio.run(main())
+    except LLMError as e:
+        return chunks, e
+    return chunks, None
+
+def test_stalled_stream_times_out_and_counts_against_breaker():
+    client = stream_client('stall')
+    chunks, error = collect_stream(client)
+    assert chunks == ['第一段'] and error is not None
+    assert client.counters['chat']['timeouts'] == 1
+    assert client.breaker.failures == 1
+
+def test_mid_stream_resets_trip_the_breaker():
+    client = stream_client('reset')
+    for _ in range(2):
+        chunks, error = collect_stream(client)
+        assert chunks == ['第一段'] and isinstance(error.__cause__, ConnectionError)
+    assert client.breaker.state == 'open'
+    assert collect_stream(client) == (['稍後再試'], None)
+
+def test_total_stream_deadline():
+    client = stream_client('slow', stream_deadline=0.05)
+    chunks, error = collect_stream(client)
+    assert error is not None and 1 < len(chunks) < 21
+    assert client.breaker.failures == 1
+
+def test_completed_stream_resets_failures():
+    client = stream_client('slow')
+    client.breaker.record_failure()
+    chunks, error = collect_stream(client)
+    assert error is None and len(chunks) == 21
+    assert client.breaker.failures == 0
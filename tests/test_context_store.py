@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.context_service import ContextStore, without_history
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path, monkeypatch):
+    monkeypatch.setenv('CONTEXT_SQLITE_PATH', str(tmp_path / 'contexts.db'))
+    monkeypatch.setenv('CONTEXT_MAX_TURNS', '10')
+    return ContextStore(request.param)
+
+def test_logged_context_has_no_history(store):
+    """訊息紀錄只附上一段對話，與舊版 user_contexts 相同"""
+    async def main():
+        for i in range(12):
+            await store.append_turn('U1', f'問題{i}', f'回覆{i}')
+        return await store.get('U1')
+
+    context = asyncio.run(main())
+    assert len(context['history']) == 10
+    logged = without_history(context)
+    assert set(logged) == {'last_message', 'last_response', 'timestamp'}
+    assert (logged['last_message'], logged['last_response']) == ('問題11', '回覆11')
+    assert without_history({}) == {}
+
+def test_reads_refresh_idle_ttl(store):
+    """只讀取上下文的用戶也不會因閒置而過期"""
+    store.backend.idle_ttl = 0.2
+
+    async def main():
+        await store.append_turn('U1', '問題', '回覆')
+        for _ in range(3):
+            await asyncio.sleep(0.1)
+            assert (await store.get('U1'))['last_message'] == '問題'
+        store.backend._evict()
+        assert await store.get('U1')
+        await asyncio.sleep(0.25)
+        return await store.get('U1')
+
+    assert asyncio.run(main()) == {}
+    assert store.stats()['expirations'] == 1
+
+def test_sqlite_calls_run_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setenv('CONTEXT_SQLITE_PATH', str(tmp_path / 'contexts.db'))
+    store = ContextStore('sqlite')
+    threads = []
+    for name in ('get', 'append'):
+        method = getattr(store.backend, name)
+
+        def wrapped(*args, method=method):
+            threads.append(threading.get_ident())
+            return method(*args)
+        setattr(store.backend, name, wrapped)
+
+    async def main():
+        await store.append_turn('U1', '問題', '回覆')
+        await store.get('U1')
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert len(threads) == 2 and loop_thread not in threads
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.dedup_service import COALESCED, DUPLICATE, NEW, EventDeduplicator
+
+def webhook_event(event_id, redelivery=False):
+    return SimpleNamespace(webhook_event_id=event_id, delivery_context=SimpleNamespace(is_redelivery=redelivery))
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def dedup(request, tmp_path, monkeypatch):
+    monkeypatch.setenv('WEBHOOK_DEDUP_SQLITE_PATH', str(tmp_path / 'webhook_events.db'))
+    return EventDeduplicator(request.param)
+
+def test_claim_complete_and_redelivery(dedup):
+    event = webhook_event('E1')
+    assert dedup.claim(event) == NEW
+    # 處理中收到重送時併入原本的處理
+    assert dedup.claim(webhook_event('E1', redelivery=True)) == COALESCED
+    dedup.complete(event)
+    assert dedup.claim(webhook_event('E1', redelivery=True)) == DUPLICATE
+    assert dedup.claim(webhook_event('E2')) == NEW
+
+    stats = dedup.stats()
+    assert (stats['accepted'], stats['coalesced'], stats['duplicates'], stats['redeliveries']) == (2, 1, 1, 2)
+    assert stats['entries'] == 2
+
+def test_release_lets_redelivery_through(dedup):
+    event = webhook_event('E1')
+    assert dedup.claim(event) == NEW
+    dedup.release(event)
+    assert dedup.claim(webhook_event('E1', redelivery=True)) == NEW
+    assert dedup.stats()['released'] == 1
+
+def test_expired_claims_are_reclaimed(dedup):
+    dedup.in_flight_ttl = 0
+    event = webhook_event('E1')
+    assert dedup.claim(event) == NEW
+    assert dedup.claim(event) == NEW
+    dedup.ttl = 0
+    dedup.complete(event)
+    assert dedup.claim(event) == NEW
+
+def test_events_without_id_are_always_processed(dedup):
+    event = SimpleNamespace()
+    assert dedup.claim(event) == NEW
+    assert dedup.claim(event) == NEW
+    dedup.complete(event)
+    assert dedup.stats()['missing_id'] == 2
+
+def test_disabled(dedup):
+    dedup.enabled = False
+    event = webhook_event('E1')
+    assert dedup.claim(event) == NEW
+    dedup.complete(event)
+    assert dedup.claim(event) == NEW
+
+def test_sqlite_backend_is_shared_between_workers(tmp_path, monkeypatch):
+    """同一個 SQLite 檔案的兩個實例（模擬兩個 worker）只有一個能取得處理權"""
+    monkeypatch.setenv('WEBHOOK_DEDUP_SQLITE_PATH', str(tmp_path / 'webhook_events.db'))
+    first, second = EventDeduplicator('sqlite'), EventDeduplicator('sqlite')
+    event = webhook_event('E1')
+    assert first.claim(event) == NEW
+    assert second.claim(event) == COALESCED
+    first.complete(event)
+    assert second.claim(event) == DUPLICATE
+
+def test_memory_backend_evicts_oldest(monkeypatch):
+    monkeypatch.setenv('WEBHOOK_DEDUP_MAX_ENTRIES', '3')
+    dedup = EventDeduplicator('memory')
+    for i in range(5):
+        dedup.complete(webhook_event(f'E{i}'))
+    assert dedup.stats()['entries'] == 3
+    assert dedup.stats()['evictions'] == 2
+    assert dedup.claim(webhook_event('E0')) == NEW
+    assert dedup.claim(webhook_event('E4')) == DUPLICATE
+
+def test_backend_errors_fail_open(dedup):
+    """去重失敗時寧可重複處理，也不要漏掉事件"""
+    def broken(*args):
+        raise RuntimeError('database is locked')
+    dedup.backend.claim = broken
+    dedup.backend.mark = broken
+    event = webhook_event('E1')
+    assert dedup.claim(event) == NEW
+    dedup.complete(event)
+    assert dedup.stats()['errors'] == 2
+
+def test_sqlite_backend_evicts_every_hundred_writes(tmp_path, monkeypatch):
+    monkeypatch.setenv('WEBHOOK_DEDUP_SQLITE_PATH', str(tmp_path / 'webhook_events.db'))
+    monkeypatch.setenv('WEBHOOK_DEDUP_MAX_ENTRIES', '10')
+    dedup = EventDeduplicator('sqlite')
+    for i in range(99):
+        dedup.complete(webhook_event(f'E{i}'))
+    assert dedup.stats()['entries'] == 99
+    dedup.complete(webhook_event('E99'))
+    assert dedup.stats()['entries'] == 10
+    assert dedup.stats()['evictions'] == 90
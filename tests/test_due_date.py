@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.extraction_service import parse_due_date
+
+NOW = datetime(2024, 6, 12, 14, 30)  # 週三
+
+@pytest.mark.parametrize('text', [
+    '2024-06-30', '2024-06-30T18:00:00', '2024-06-30T10:00:00+00:00', '2024-06-30T10:00:00Z',
+    '明天下午', '週五', '下週一上午10點', '3天後', '6/30', '6月30日', '晚上8點'
+])
+def test_every_format_returns_an_aware_local_datetime(text):
+    due = parse_due_date(text, NOW)
+    assert due is not None and due.tzinfo is not None
+    # 已是本地時區：換算成本地時間不改變時差
+    assert due.utcoffset() == due.astimezone().utcoffset()
+
+def test_results_are_comparable_and_converted_to_local_time():
+    offset = parse_due_date('2024-06-30T10:00:00+00:00', NOW)
+    local = parse_due_date('2024-06-30', NOW)
+    assert offset == datetime(2024, 6, 30, 10, tzinfo=timezone.utc)
+    # 不同寫法的結果可以直接比較
+    assert (offset < local) == (offset.timestamp() < local.timestamp())
+    assert local.replace(tzinfo=None) == datetime(2024, 6, 30, 18, 0)
+
+def test_relative_dates_use_local_now():
+    assert parse_due_date('明天下午', NOW).date() == NOW.date() + timedelta(days=1)
+    aware_now = NOW.astimezone()
+    assert parse_due_date('週五', aware_now) == parse_due_date('週五', NOW)
@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.event_queue_service import EventQueue, conversation_keys, user_keys
+
+def message(user_id, group_id=None, seq=0):
+    source = SimpleNamespace(user_id=user_id, group_id=group_id)
+    return SimpleNamespace(source=source, user=user_id, conversation=group_id or user_id, seq=seq)
+
+def run_queue(events, workers=4, delay=0.001, **kwargs):
+    """依序放入事件並執行到結束，回傳 (開始/結束紀錄, 佇列)"""
+    log = []
+
+    async def handler(event):
+        log.append(('start', event))
+        await asyncio.sleep(delay)
+        log.append(('end', event))
+
+    async def main():
+        queue = EventQueue(handler, workers=workers, **kwargs)
+        await queue.start()
+        accepted = [queue.put_nowait(event) for event in events]
+        await queue.drain(timeout=10)
+        return accepted, queue
+
+    accepted, queue = asyncio.run(main())
+    return log, accepted, queue
+
+def max_concurrency(log, key):
+    running, peak = {}, {}
+    for kind, event in log:
+        value = key(event)
+        running[value] = running.get(value, 0) + (1 if kind == 'start' else -1)
+        peak[value] = max(peak.get(value, 0), running[value])
+    return peak
+
+def test_keys_cover_conversation_and_sender():
+    assert conversation_keys(message('U1', 'C1')) == ('C1', 'U1')
+    assert conversation_keys(message('U1')) == ('U1',)
+    assert user_keys(message('U1', 'C1')) == ('U1',)
+
+def test_orders_per_conversation_and_per_user():
+    """同一群組依序處理，同一用戶在群組與一對一的訊息也依放入順序處理"""
+    events = []
+    for i in range(30):
+        events.append(message(f'U{i % 3}', 'C1', seq=i))
+        events.append(message(f'U{i % 3}', seq=i))
+        events.append(message(f'V{i}', seq=i))
+    log, accepted, queue = run_queue(events, keys=conversation_keys)
+    assert all(accepted)
+    assert queue.processed == len(events)
+
+    position = {id(event): index for index, event in enumerate(events)}
+    started = [event for kind, event in log if kind == 'start']
+    for key in ('conversation', 'user'):
+        order = {}
+        for event in started:
+            order.setdefault(getattr(event, key), []).append(position[id(event)])
+        assert all(indexes == sorted(indexes) for indexes in order.values())
+        assert max(max_concurrency(log, lambda e: getattr(e, key)).values()) == 1
+
+def test_unrelated_conversations_run_in_parallel():
+    events = [message(f'U{i}') for i in range(8)]
+    log, _, _ = run_queue(events, workers=8, delay=0.01)
+    # 八則不同用戶的訊息全部開始後才有第一則結束
+    assert [kind for kind, _ in log[:8]] == ['start'] * 8
+
+def test_busy_key_does_not_starve_other_keys():
+    """訊息很多的群組每處理一則就排到最後"""
+    events = [message('U1', 'C1', seq=i) for i in range(20)] + [message('U2')]
+    log, _, _ = run_queue(events, workers=1, keys=lambda event: (event.conversation,))
+    started = [event for kind, event in log if kind == 'start']
+    assert started.index(events[-1]) == 1
+
+def test_backpressure_rejects_when_full():
+    async def main():
+        queue = EventQueue(lambda event: asyncio.sleep(0), maxsize=5, workers=1, key_maxsize=3)
+        assert not queue.put_nowait(message('U0'))  # 尚未啟動
+        await queue.start()
+        assert [queue.put_nowait(message('U1', 'C1')) for _ in range(4)] == [True, True, True, False]
+        assert queue.rejected_key_full == 1
+        # 同一用戶在一對一聊天中也受該用戶佇列上限限制
+        assert not queue.put_nowait(message('U1'))
+        assert queue.put_nowait(message('U2'))
+        assert queue.put_nowait(message('U3'))
+        assert not queue.has_capacity()
+        assert not queue.put_nowait(message('U4'))
+        assert queue.rejected == 4
+        await queue.drain(timeout=5)
+        assert queue.processed == 5
+        assert not queue.put_nowait(message('U5'))
+    asyncio.run(main())
+
+def test_failed_event_does_not_block_its_keys():
+    async def main():
+        handled = []
+
+        async def handler(event):
+            if event.seq == 0:
+                raise RuntimeError('boom')
+            handled.append(event.seq)
+
+        queue = EventQueue(handler, workers=2)
+        await queue.start()
+        for i in range(3):
+            queue.put_nowait(message('U1', 'C1', seq=i))
+        await queue.drain(timeout=5)
+        return queue, handled
+
+    queue, handled = asyncio.run(main())
+    assert handled == [1, 2]
+    assert queue.failed == 1
+    assert queue.depth == 0
+
+def test_stats_do_not_expose_raw_ids():
+    async def main():
+        queue = EventQueue(lambda event: asyncio.sleep(0.01), workers=1)
+        await queue.start()
+        for _ in range(3):
+            queue.put_nowait(message('Uabcdef0123456789', 'Cfedcba9876543210'))
+        stats = queue.stats()
+        await queue.drain(timeout=5)
+        return stats
+
+    stats = asyncio.run(main())
+    keys = [key for key, _ in stats['busiest_keys']]
+    assert keys and all('0123456789' not in key and '9876543210' not in key for key in keys)
+    assert {key[0] for key in keys} == {'C', 'U'}
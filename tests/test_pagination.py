@@ -0,0 +1,77 @@
+import asyncio
+import urllib.parse
+
+import pytest
+
+from app.services import database_service
+from app.services.db_client_service import set_client
+
+def seed(client, rows):
+    client.run(client.table('tasks').insert(rows))
+
+def collect(pages):
+    async def run():
+        return [page async for page in pages]
+    return asyncio.run(run())
+
+def test_iter_pages_crosses_pages_with_equal_created_at(fake_db):
+    """同一個 created_at 的資料跨越分頁邊界時不重複也不遺漏"""
+    seed(fake_db, [
+        {'id': f'{i:03d}', 'status': 'pending', 'created_at': '2024-01-01T00:00:00+08:00' if i < 7 else f'2024-01-02T00:00:{i:02d}+08:00'}
+        for i in range(11)
+    ])
+    pages = collect(database_service.iter_pages('tasks.select_page', 'tasks', 'id,status', page_size=3))
+    assert [len(page) for page in pages] == [3, 3, 3, 2]
+    assert [row['id'] for page in pages for row in page] == [f'{i:03d}' for i in range(11)]
+    assert fake_db.requests == 4
+
+def test_iter_pages_exact_multiple_and_filters(fake_db):
+    """筆數剛好是頁大小的倍數時多讀一頁空結果即停止，篩選條件套用在每一頁"""
+    seed(fake_db, [
+        {'id': f'{i:03d}', 'status': 'done' if i % 2 else 'pending', 'created_at': f'2024-01-01T00:00:{i:02d}'}
+        for i in range(12)
+    ])
+    build = database_service._task_filters(status='done')
+    pages = collect(database_service.iter_pages('tasks.select_page', 'tasks', 'id', build, page_size=3))
+    assert [row['id'] for page in pages for row in page] == [f'{i:03d}' for i in range(1, 12, 2)]
+    assert all(set(row) == {'id', 'created_at'} for page in pages for row in page)
+
+def test_fake_rejects_builder_methods_missing_from_postgrest(fake_db):
+    """替身只提供固定版本 postgrest 有的方法"""
+    with pytest.raises(AttributeError):
+        fake_db.table('tasks').select('id').or_('id.gt.1')
+    with pytest.raises(AttributeError):
+        fake_db.table('tasks').insert({'id': '1'}).eq('id', '1')
+
+def test_iter_pages_builds_valid_postgrest_requests():
+    """以真實的 postgrest 查詢建構器產生請求：邏輯條件與排序都是單一參數"""
+    httpx = pytest.importorskip('httpx')
+    postgrest = pytest.importorskip('postgrest')
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        page = len(requests)
+        rows = [
+            {'id': f'{page}{i}', 'created_at': '2024-01-01T00:00:00+08:00'}
+            for i in range(2 if page < 3 else 1)
+        ]
+        return httpx.Response(200, json=rows)
+
+    client = postgrest.AsyncPostgrestClient('http://postgrest/rest/v1')
+    client.session = httpx.AsyncClient(base_url='http://postgrest/rest/v1', transport=httpx.MockTransport(handler))
+    set_client(client)
+    try:
+        pages = collect(database_service.iter_pages('tasks.select_page', 'tasks', 'id', page_size=2))
+    finally:
+        set_client(None)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    params = [urllib.parse.parse_qs(request.url.query.decode()) for request in requests]
+    assert all(query['order'] == ['created_at,id'] for query in params)
+    assert 'or' not in params[0]
+    assert params[2]['created_at'] == ['gte.2024-01-01T00:00:00+08:00']
+    assert params[2]['or'] == [
+        '(created_at.gt."2024-01-01T00:00:00+08:00",'
+        'and(created_at.eq."2024-01-01T00:00:00+08:00",id.gt."21"))'
+    ]
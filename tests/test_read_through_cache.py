@@ -0,0 +1,70 @@
+import asyncio
+
+from app.services.cache_service import ReadThroughCache
+
+class Settings:
+    """模擬資料庫中的用戶設定，每次讀取需要一段時間"""
+
+    def __init__(self):
+        self.value = 'old'
+        self.loads = 0
+
+    async def load(self):
+        self.loads += 1
+        value = self.value
+        await asyncio.sleep(0.02)
+        return value
+
+def test_concurrent_reads_share_one_load():
+    settings = Settings()
+    cache = ReadThroughCache('settings', ttl=60, negative_ttl=5)
+
+    async def main():
+        return await asyncio.gather(*(cache.get('U1', settings.load) for _ in range(5)))
+
+    assert asyncio.run(main()) == ['old'] * 5
+    assert settings.loads == 1
+    assert cache.stats()['coalesced'] == 4
+
+def test_waiters_reload_after_invalidation():
+    """載入期間更新設定並失效，等待中與之後的請求都拿到新值"""
+    settings = Settings()
+    cache = ReadThroughCache('settings', ttl=60, negative_ttl=5)
+
+    async def main():
+        first = asyncio.ensure_future(cache.get('U1', settings.load))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get('U1', settings.load))
+        await asyncio.sleep(0.005)
+        # update_user_settings：寫入後失效
+        settings.value = 'new'
+        cache.invalidate('U1')
+        after = asyncio.ensure_future(cache.get('U1', settings.load))
+        return await asyncio.gather(first, waiter, after), await cache.get('U1', settings.load)
+
+    (first, waiter, after), cached = asyncio.run(main())
+    # 失效前開始的載入結果只回給發起者，不寫入快取
+    assert first == 'old'
+    assert (waiter, after, cached) == ('new', 'new', 'new')
+    assert settings.loads == 2
+    assert cache.stats()['reloads'] == 1
+
+def test_failed_load_is_not_cached():
+    cache = ReadThroughCache('settings', ttl=60, negative_ttl=5)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('timeout')
+        return 'ok'
+
+    async def main():
+        try:
+            await cache.get('U1', loader)
+        except RuntimeError:
+            pass
+        return await cache.get('U1', loader)
+
+    assert asyncio.run(main()) == 'ok'
+    assert len(calls) == 2
@@ -0,0 +1,48 @@
+from app.services.relevance_service import RelevanceFilter
+
+def test_decide_does_not_count_towards_stats():
+    """任務提取的預先過濾不重複計入節省的 LLM 呼叫次數"""
+    relevance = RelevanceFilter(enabled=True)
+    messages = ['/status', '哈哈', '明天下午三點前完成報表', '嗯']
+    decisions = [relevance.classify(message) for message in messages]
+    assert [relevance.decide(message) for message in messages] == decisions
+
+    stats = relevance.stats()
+    assert stats['local_yes'] + stats['local_no'] + stats['llm_calls'] == len(messages)
+
+def test_decide_defers_when_disabled():
+    relevance = RelevanceFilter(enabled=False)
+    assert relevance.decide('/status') is None
+    assert relevance.classify('/status') is None
+    assert relevance.stats()['llm_calls'] == 1
+
+# 標記過的工作訊息與閒聊（不在種子語料中）
+WORK_MESSAGES = (
+    '週末要加班趕報告', '明天下午三點前完成報表', '合約下週一要給客戶', '設計稿改好了嗎',
+    '小王負責這次的提案', '請在週五前交企劃書', '客戶說預算要再砍', '會議改到下午兩點',
+    '測試環境又掛了', '這個bug誰在修', '下週要上線新版本', '記得把發票寄給會計',
+    '季報數據我整理好了', '簡報再改一版', '報價單寄了沒', '這案子的需求變更了',
+    '老闆說月底要看成果', '明天跟廠商開會', '規格書更新了', '產品 demo 延到下週',
+    '幫我排一下下週的工作', '文件上傳到雲端了', '請大家填工時', '採購單核准了嗎',
+    '周三前把訪談紀錄整理給我', 'deadline 提前到週四', 'can you review the PR',
+    '上線時間確定了嗎', '我來接行銷活動', '進度有點落後'
+)
+CHAT_MESSAGES = (
+    '哈哈哈好好笑', '今天中午吃什麼', '晚上要不要去看電影', '早安大家', '晚安好夢',
+    '今天天氣真好', '週末去哪裡玩', '生日快樂', '謝謝你喔', '好喔', '這家餐廳好吃嗎',
+    '下班一起喝飲料', '我好累想睡覺', '有人要訂便當嗎', '貼圖', 'lol', '哈', '嗯嗯',
+    '午安', '新年快樂大家'
+)
+
+def test_no_local_rejection_of_work_messages():
+    """本地判定為無關需要近乎確定，工作訊息最多交給 LLM，不會被直接略過"""
+    relevance = RelevanceFilter(enabled=True)
+    rejected = [message for message in WORK_MESSAGES if relevance.decide(message) is False]
+    assert rejected == []
+    # 多數工作訊息可直接在本地判定
+    assert sum(relevance.decide(message) is True for message in WORK_MESSAGES) >= len(WORK_MESSAGES) // 2
+
+def test_chit_chat_is_never_accepted_locally():
+    relevance = RelevanceFilter(enabled=True)
+    assert not any(relevance.decide(message) for message in CHAT_MESSAGES)
+    assert sum(relevance.decide(message) is False for message in CHAT_MESSAGES) >= 5
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import database_service
+from app.services.reminder_service import REMINDER_TEXT, ReminderScheduler
+
+def due_in(hours):
+    return (datetime.now().astimezone() + timedelta(hours=hours)).isoformat()
+
+@pytest.fixture
+def due_tasks(fake_db):
+    fake_db.run(fake_db.table('tasks').insert([
+        {'id': 'T1', 'title': '季度報表', 'assignee': 'U1', 'status': 'pending', 'due_date': due_in(2), 'reminder_sent_at': None},
+        {'id': 'T2', 'title': '預算', 'assignee': 'U2', 'status': 'pending', 'due_date': due_in(48), 'reminder_sent_at': None},
+        {'id': 'T3', 'title': '已完成', 'assignee': 'U3', 'status': 'done', 'due_date': due_in(1), 'reminder_sent_at': None}
+    ]))
+    return fake_db
+
+async def run_schedulers(count, send, claim=database_service.claim_task_reminders, seconds=0.1):
+    schedulers = [ReminderScheduler() for _ in range(count)]
+    for scheduler in schedulers:
+        await scheduler.start(database_service.get_due_tasks, claim, send)
+    await asyncio.sleep(seconds)
+    for scheduler in schedulers:
+        await scheduler.stop()
+    return schedulers
+
+def test_claim_then_send_once_across_workers(due_tasks):
+    """兩個 worker 同時載入到期任務，只有認領成功的一個發送"""
+    sent = []
+
+    async def send(notifications):
+        sent.extend(notifications)
+
+    schedulers = asyncio.run(run_schedulers(2, send))
+    assert sent == [('U1', REMINDER_TEXT.format(title='季度報表'))]
+    assert sorted(s.fired for s in schedulers) == [0, 1]
+    assert sorted(s.skipped for s in schedulers) == [0, 1]
+    # T2 還沒到提醒時間，仍在排程中
+    assert all(s.stats()['pending'] == 1 for s in schedulers)
+
+    # 重新啟動後不會再載入已提醒的任務
+    sent.clear()
+    asyncio.run(run_schedulers(1, send))
+    assert sent == []
+
+def test_claim_failure_is_retried_later(due_tasks):
+    sent = []
+
+    async def send(notifications):
+        sent.extend(notifications)
+
+    async def claim(task_ids):
+        raise database_service.DatabaseError('timeout')
+
+    scheduler, = asyncio.run(run_schedulers(1, send, claim=claim))
+    assert sent == []
+    assert scheduler.failures == 1
+    # 稍後重試：提醒仍在排程中，資料庫中也尚未標記
+    assert scheduler.stats()['pending'] == 2
+    assert 50 < scheduler.stats()['next_fire_in'] <= 60
+    rows = due_tasks.run(due_tasks.table('tasks').select('id').is_('reminder_sent_at', 'null')).data
+    assert {row['id'] for row in rows} == {'T1', 'T2', 'T3'}
+
+def test_send_failure_does_not_resend_or_stop_scheduler(due_tasks):
+    attempts = []
+
+    async def send(notifications):
+        attempts.append(notifications)
+        raise RuntimeError('LINE API error')
+
+    scheduler, = asyncio.run(run_schedulers(1, send))
+    assert len(attempts) == 1
+    assert (scheduler.fired, scheduler.failures) == (0, 1)
+    assert scheduler._task is None and scheduler.stats()['pending'] == 1
+
+def test_track_updates_and_cancels(due_tasks):
+    sent = []
+
+    async def send(notifications):
+        sent.extend(notifications)
+
+    async def main():
+        scheduler = ReminderScheduler()
+        await scheduler.start(database_service.get_due_tasks, database_service.claim_task_reminders, send)
+        # 完成的任務取消提醒，截止時間提前的任務立即提醒
+        scheduler.track({'id': 'T1', 'title': '季度報表', 'assignee': 'U1', 'status': 'done', 'due_date': due_in(2)})
+        scheduler.track({'id': 'T2', 'title': '預算', 'assignee': 'U2', 'status': 'pending', 'due_date': due_in(3)})
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+    asyncio.run(main())
+    assert sent == [('U2', REMINDER_TEXT.format(title='預算'))]
@@ -0,0 +1,29 @@
+from app.services.cache_service import ResponseCache
+
+PARAMS = {'model': 'gpt-4o-mini', 'temperature': 0.3}
+
+def test_near_duplicate_matching_is_off_by_default(monkeypatch):
+    """預設不做近似比對：意思相反的短句不共用快取"""
+    monkeypatch.delenv('RESPONSE_CACHE_SIMHASH_DISTANCE', raising=False)
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', 'true')
+    cache = ResponseCache()
+    cache.set('專案進度如何', PARAMS, '進度正常')
+    assert cache.get('專案進度不如何', PARAMS) is None
+    # 標點與全半形不同仍視為相同的提示詞
+    assert cache.get('專案進度如何？', PARAMS) == '進度正常'
+
+def test_short_prompts_require_exact_match_when_enabled(monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', 'true')
+    cache = ResponseCache(max_distance=6, min_length=40)
+    cache.set('專案進度如何', PARAMS, '進度正常')
+    assert cache.get('專案進度不如何', PARAMS) is None
+    assert cache.near_hits == 0
+
+def test_long_prompts_use_near_duplicate_matching_when_enabled(monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', 'true')
+    cache = ResponseCache(max_distance=6, min_length=10)
+    prompt = '請整理本週行銷部門的專案進度，列出已完成與尚未完成的任務以及負責人，並標示需要主管協助的項目'
+    cache.set(prompt, PARAMS, '摘要')
+    assert cache.get(prompt + '。', PARAMS) == '摘要'
+    assert cache.get(prompt.replace('本週', '這週'), PARAMS) == '摘要'
+    assert cache.near_hits == 1
@@ -0,0 +1,39 @@
+import inspect
+
+import pytest
+
+from app.services.router_service import Intent, Router
+
+def test_slots_and_priority():
+    router = Router([
+        Intent('report_status', ['{keyword}交了沒']),
+        Intent('specific_task', ['說的{keyword}是誰接的', '昨天說的{keyword}']),
+        Intent('my_tasks', ['我的任務'], priority=10),
+        Intent('help', ['/help'], command=True)
+    ])
+    assert router.match('@AI 預算表交了沒？').args == {'keyword': '預算表'}
+    match = router.match('昨天說的行銷簡報是誰接的？')
+    assert (match.intent.name, match.args) == ('specific_task', {'keyword': '行銷簡報'})
+    assert router.match('我的任務交了沒').intent.name == 'my_tasks'
+    assert router.match('/help me').args == {'args': 'me'}
+    assert router.match('請看/help') is None
+
+@pytest.fixture
+def line_router():
+    pytest.importorskip('linebot')
+    from app.services import line_service
+    return line_service
+
+def test_legacy_marketing_deck_phrase_routes_to_specific_task(line_router):
+    """舊版支援、說明文字也列出的「昨天說的行銷簡報」"""
+    for text in ('昨天說的行銷簡報', '@AI 昨天說的行銷簡報', '昨天說的行銷簡報是誰接的？'):
+        match = line_router.router.match(text)
+        assert match.intent.name == 'specific_task'
+        assert match.args == {'keyword': '行銷簡報'}
+
+def test_every_handler_accepts_captured_slots(line_router):
+    """所有處理函式都接受多餘的參數欄位"""
+    for intent in line_router.router.intents:
+        parameters = inspect.signature(intent.handler).parameters.values()
+        assert any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters), intent.name
+        inspect.signature(intent.handler).bind(None, None, None, keyword='x', department='y')
@@ -0,0 +1,61 @@
+import pytest
+from datetime import datetime
+
+from app.services.scheduler_service import CronTrigger, JobEngine
+
+async def noop():
+    pass
+
+def test_jitter_offsets_each_run_by_a_fixed_delay():
+    """同一 worker 每次都延後相同秒數，執行間隔仍為一小時"""
+    engine = JobEngine(lock_path='', state_path='')
+    job = engine.add_job('refresh', noop, CronTrigger(minute='0'), leader_only=False, jitter=1800)
+    assert 0 <= job.offset <= 1800
+    job.offset = 600
+
+    first = job.next_after(datetime(2024, 1, 1, 10, 5))
+    assert first == datetime(2024, 1, 1, 10, 10)
+    assert job.next_after(first) == datetime(2024, 1, 1, 11, 10)
+    assert job.next_after(datetime(2024, 1, 1, 10, 11)) == datetime(2024, 1, 1, 11, 10)
+
+def test_no_jitter_keeps_cron_times():
+    engine = JobEngine(lock_path='', state_path='')
+    job = engine.add_job('report', noop, CronTrigger(minute='0', hour='9'))
+    assert job.offset == 0.0
+    assert job.next_after(datetime(2024, 1, 1, 9, 0)) == datetime(2024, 1, 2, 9, 0)
+
+def test_day_of_week_names_and_ranges():
+    trigger = CronTrigger(minute='30', hour='9', day_of_week='mon-fri')
+    # 2024-06-14 為週五，下一次是週一
+    assert trigger.next_fire(datetime(2024, 6, 14, 9, 30)) == datetime(2024, 6, 17, 9, 30)
+    assert trigger.next_fire(datetime(2024, 6, 14, 9, 29)) == datetime(2024, 6, 14, 9, 30)
+    assert CronTrigger(minute='0', hour='9', day_of_week='sun').next_fire(datetime(2024, 6, 12)) == datetime(2024, 6, 16, 9, 0)
+
+def test_day_of_month_skips_short_months():
+    trigger = CronTrigger(minute='0', hour='0', day='31')
+    assert trigger.next_fire(datetime(2024, 1, 31, 0, 0)) == datetime(2024, 3, 31, 0, 0)
+    assert trigger.next_fire(datetime(2024, 4, 1)) == datetime(2024, 5, 31, 0, 0)
+
+def test_leap_day_fires_every_four_years():
+    trigger = CronTrigger(minute='0', hour='0', day='29', month='2')
+    assert trigger.next_fire(datetime(2024, 3, 1)) == datetime(2028, 2, 29, 0, 0)
+
+def test_day_and_day_of_week_must_both_match():
+    """與 APScheduler 相同，日期與星期同時指定時兩者都要符合（每月第一個週一）"""
+    trigger = CronTrigger(minute='0', hour='9', day='1-7', day_of_week='mon')
+    assert trigger.next_fire(datetime(2024, 6, 4)) == datetime(2024, 7, 1, 9, 0)
+    assert trigger.next_fire(datetime(2024, 7, 1, 9, 0)) == datetime(2024, 8, 5, 9, 0)
+
+def test_steps_and_lists():
+    trigger = CronTrigger(minute='*/15', hour='8,18')
+    assert trigger.next_fire(datetime(2024, 6, 12, 8, 50)) == datetime(2024, 6, 12, 18, 0)
+    assert trigger.next_fire(datetime(2024, 6, 12, 18, 0)) == datetime(2024, 6, 12, 18, 15)
+    assert CronTrigger(minute='10/20').minutes == {10, 30, 50}
+
+def test_invalid_expressions():
+    with pytest.raises(ValueError):
+        CronTrigger(minute='60')
+    with pytest.raises(ValueError):
+        CronTrigger(day_of_week='mon-xyz')
+    with pytest.raises(ValueError):
+        CronTrigger(day='30', month='2').next_fire(datetime(2024, 1, 1))
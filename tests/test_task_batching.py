@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime
+
+from app.services.task_batch_service import ExtractionBatcher, trivial_prefilter
+
+def test_trivial_prefilter_only_drops_empty_or_tiny_messages():
+    assert [trivial_prefilter(text) for text in ('', '  ', '👍👍', '好！', 'ok', '哈哈')] == [False] * 6
+    assert trivial_prefilter('明天交') is None
+    assert trivial_prefilter('哈哈哈好好笑') is None
+
+def test_task_message_with_due_date_reaches_extraction():
+    """含截止時間的任務訊息一定送去提取並寫入任務，只有極短的訊息被略過"""
+    message = '週末要加班趕報告，週一早上十點前交給小王'
+    extracted, saved = [], []
+
+    async def analyze_messages(messages):
+        extracted.extend(messages)
+        return [
+            {'description': text, 'assignee': '小王', 'due_date': datetime(2024, 6, 17, 10, 0).astimezone(), 'priority': '高'}
+            if '交給' in text else None
+            for text in messages
+        ]
+
+    async def save_tasks(tasks):
+        saved.extend(tasks)
+        return [str(i) for i in range(len(tasks))]
+
+    async def main():
+        batcher = ExtractionBatcher(analyze_messages, save_tasks, prefilter=trivial_prefilter, window=0.01)
+        for i, text in enumerate(('哈哈', message, '👍')):
+            batcher.add('C1', f'M{i}', text)
+        await batcher.close()
+        return batcher.stats()
+
+    stats = asyncio.run(main())
+    assert extracted == [message]
+    assert stats['filtered'] == 2
+    assert len(saved) == 1
+    assert saved[0]['assignee'] == '小王'
+    assert saved[0]['due_date'].startswith('2024-06-17T10:00:00')
+    assert saved[0]['priority'] == 'high'
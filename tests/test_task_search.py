@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from app.services import database_service
+from app.services.search_service import TaskSearchIndex
+
+@pytest.fixture
+def search_db(fake_db, monkeypatch):
+    """80 筆含「報表」的任務：前 60 筆標題較短（分數較高），後 20 筆屬於 alice 且較舊"""
+    rows = []
+    for i in range(80):
+        low_rank = i >= 60
+        rows.append({
+            'id': f'T{i:03d}',
+            'title': '季度報表' if not low_rank else '季度報表與其他許多附帶說明的項目整理',
+            'description': None if not low_rank else '包含會議紀錄、預算、人力規劃與行銷簡報的附件',
+            'status': 'done' if i % 2 else 'pending',
+            'assignee': 'alice' if low_rank else 'bob',
+            'department': '財務部' if low_rank else '營運部',
+            'created_at': f'2024-01-{1 if low_rank else 10:02d}T09:00:{i % 60:02d}'
+        })
+    fake_db.run(fake_db.table('tasks').insert(rows))
+
+    index = TaskSearchIndex(limit=50)
+    asyncio.run(index.rebuild(database_service.task_search_pages))
+    monkeypatch.setattr(database_service, 'task_search', index)
+    monkeypatch.setattr(database_service, 'ID_BATCH_SIZE', 30)
+    return index
+
+def test_keyword_without_limit_returns_all_matches(search_db, fake_db):
+    """未指定 limit 時不受 TASK_SEARCH_LIMIT 限制，ID 分批查詢"""
+    fake_db.requests = 0
+    tasks = asyncio.run(database_service.get_user_tasks(keyword='報表'))
+    assert len(tasks) == 80
+    assert fake_db.requests == 3
+    # 依相關度排序：標題較短的任務在前
+    assert {task['id'] for task in tasks[:60]} == {f'T{i:03d}' for i in range(60)}
+
+def test_filters_apply_before_ranking(search_db):
+    """相關度排在前 limit 名之外、但符合篩選條件的任務不會被截掉"""
+    tasks = asyncio.run(database_service.get_user_tasks(keyword='報表', assignee='alice', limit=5))
+    assert len(tasks) == 5
+    assert all(task['assignee'] == 'alice' for task in tasks)
+
+    tasks = asyncio.run(database_service.get_user_tasks(keyword='報表', department='財務部', status='done'))
+    assert sorted(task['id'] for task in tasks) == [f'T{i:03d}' for i in range(61, 80, 2)]
+
+def test_created_after_filter(search_db):
+    tasks = asyncio.run(database_service.get_user_tasks(keyword='報表', created_after='2024-01-05T00:00:00'))
+    assert len(tasks) == 60
+    assert all(task['assignee'] == 'bob' for task in tasks)
+
+def test_search_limit_default_and_unlimited(search_db):
+    assert len(search_db.search('報表')) == 50
+    assert len(search_db.search('報表', limit=0)) == 80
+    assert len(search_db.search('報表', limit=10, assignee='alice')) == 10
@@ -0,0 +1,34 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from app.services import openai_service
+from app.services.cache_service import ResponseCache
+
+def test_cached_summary_expires_when_a_task_becomes_overdue(monkeypatch):
+    """任務跨過截止時間後不沿用快取中「未逾期」的摘要"""
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', 'true')
+    monkeypatch.setattr(openai_service, 'response_cache', ResponseCache())
+    prompts = []
+
+    async def complete(prompt):
+        prompts.append(prompt)
+        return f'摘要 {len(prompts)}', 0, 0
+
+    monkeypatch.setattr(openai_service, '_complete_summary', complete)
+    due = datetime.now().astimezone() + timedelta(seconds=1)
+    tasks = [
+        {'id': '1', 'title': '季度報表', 'status': 'pending', 'assignee': 'alice', 'due_date': due.isoformat()},
+        {'id': '2', 'title': '預算', 'status': 'completed', 'assignee': 'bob', 'due_date': None}
+    ]
+
+    first = asyncio.run(openai_service.summarize_tasks(tasks))
+    assert '七天內到期（1）' in first and '逾期' not in first.replace('七天內到期', '')
+    # 截止前再次查詢直接使用快取
+    assert asyncio.run(openai_service.summarize_tasks(tasks)) == first
+    assert len(prompts) == 1
+
+    time.sleep(max(0.0, (due - datetime.now().astimezone()).total_seconds()) + 0.05)
+    second = asyncio.run(openai_service.summarize_tasks(tasks))
+    assert len(prompts) == 2
+    assert second.startswith('總任務數：2') and '逾期（1）' in second and '七天內到期' not in second